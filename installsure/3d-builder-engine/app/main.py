@@ -1,9 +1,19 @@
-from fastapi import FastAPI, Body, HTTPException
+from fastapi import FastAPI, Body, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 
+from httpmetrics import instrument
+from idempotency import IdempotencyCache, idempotent
+from replay import install_capture
+
 app = FastAPI(title="3D Builder Engine", version="0.1.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+http_metrics = instrument(app, "3d-builder-engine")
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
+
+# Job-starting requests by Idempotency-Key, so a retried request returns the first job
+idempotency_cache = IdempotencyCache()
 
 @app.get("/healthz")
 def healthz():
@@ -15,19 +25,21 @@ def readyz():
 
 @app.get("/metrics")
 def metrics():
-    return {"latency_p95_ms": 100, "error_rate": 0.0}
+    return http_metrics.summary()
 
 @app.post("/v1/projects")
 def create_project(body: dict = Body(...)):
     return {"id": str(uuid.uuid4()), "name": body.get("name","Untitled")}
 
 @app.post("/v1/import/blueprints")
-def import_blueprints(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4()), "status": "ACCEPTED"}
+async def import_blueprints(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: {"job_id": str(uuid.uuid4()), "status": "ACCEPTED"})
 
 @app.post("/v1/build/model")
-def build_model(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4()), "status": "QUEUED"}
+async def build_model(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: {"job_id": str(uuid.uuid4()), "status": "QUEUED"})
 
 @app.get("/v1/projects/{pid}/artifacts")
 def artifacts(pid: str):
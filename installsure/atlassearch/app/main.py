@@ -2,8 +2,14 @@ from fastapi import FastAPI, Body, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 
+from httpmetrics import instrument
+from replay import install_capture
+
 app = FastAPI(title="AtlasSearch", version="0.1.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+http_metrics = instrument(app, "atlassearch")
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
 
 @app.get("/healthz")
 def healthz():
@@ -15,7 +21,7 @@ def readyz():
 
 @app.get("/metrics")
 def metrics():
-    return {"latency_p95_ms": 100, "error_rate": 0.0}
+    return http_metrics.summary()
 
 RESEARCH = {}
 
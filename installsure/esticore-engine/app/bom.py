@@ -0,0 +1,133 @@
+"""
+Streaming readers for a job's BOM store (bom.csv written by the QTO workers).
+
+Everything here is a generator over bounded chunks, so serving a BOM costs
+the same memory whether it has ten rows or ten million.
+"""
+import csv
+import json
+import re
+import zlib
+from typing import Iterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a Range header that does not overlap the file."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single 'bytes=start-end' range into an inclusive (start, end) pair."""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Multi-range and malformed headers are ignored; the full body is served
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(f"bytes */{size}")
+    return start, end
+
+
+def accepts_gzip(header: Optional[str]) -> bool:
+    """Whether an Accept-Encoding header gives gzip (or x-gzip, or *) a non-zero q-value."""
+    if not header:
+        return False
+    qualities = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        coding = coding.lower()
+        qualities[coding] = max(q, qualities.get(coding, 0.0))
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def iter_csv(path: str, start: int = 0, end: Optional[int] = None,
+             chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the stored CSV bytes from start to end (inclusive)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def iter_csv_rows(path: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the CSV header plus data rows from row `offset` on."""
+    with open(path, newline="") as f:
+        # Skip through the csv reader so quoted multi-line cells count as one row
+        reader = csv.reader(f)
+        yield f.readline().encode()
+        for _ in zip(range(offset), reader):
+            pass
+        while True:
+            # readlines(hint) stops at a line boundary just past the hint
+            lines = f.readlines(chunk_size)
+            if not lines:
+                return
+            yield "".join(lines).encode()
+
+
+def iter_ndjson(path: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield one JSON object per BOM row, shaped like estimate() output."""
+    buffer, buffered = [], 0
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for i, row in enumerate(reader):
+            if i < offset:
+                continue
+            line = (json.dumps(_decode_row(row)) + "\n").encode()
+            buffer.append(line)
+            buffered += len(line)
+            if buffered >= chunk_size:
+                yield b"".join(buffer)
+                buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 1) -> Iterator[bytes]:
+    """Compress a byte stream into a gzip member on the fly (level 1 favours throughput)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _decode_row(row: dict) -> dict:
+    if row.get("error"):
+        return {"group_id": row["group_id"], "error": row["error"]}
+    decoded = {"group_id": row["group_id"], "parameter_count": int(row["parameter_count"])}
+    base = row["base_estimate"]
+    # Integer params keep an integer base estimate, as in estimate()
+    decoded["base_estimate"] = int(base) if base.lstrip("-").isdigit() else float(base)
+    for key in ("overhead", "total"):
+        decoded[key] = float(row[key])
+    return decoded
@@ -0,0 +1,129 @@
+"""
+Content-addressed memoization of per-group estimates.
+
+Each parameter group is keyed by a SHA-256 of its sorted params, under a
+namespace of estimator name and generation, so estimator_old and
+estimator_new results never mix and bumping a generation invalidates
+everything cached for that estimator. Lookups go through an in-process
+LRU first, then a SQLite store shared by all workers. The store keeps at
+most max_rows results; inserts past that drop the oldest inserted.
+"""
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+# SQLite's default host parameter limit is 999; stay well below it
+_LOOKUP_CHUNK = 500
+
+
+def group_digest(params: Dict) -> str:
+    """Stable hash of a params dict, independent of key order."""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class EstimateCache:
+    """LRU in front of an on-disk store of estimate() results."""
+
+    def __init__(self, path: str, max_entries: int = 100_000, max_rows: int = 1_000_000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._lru: "OrderedDict[str, Dict]" = OrderedDict()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # Rowids follow insertion order (INSERT OR REPLACE takes a new one), so
+        # the oldest results can be pruned by rowid without counting the table
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS estimates ("
+            "namespace TEXT NOT NULL, digest TEXT NOT NULL, result TEXT NOT NULL, "
+            "UNIQUE (namespace, digest))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "estimator TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+
+    def namespace(self, estimator: str) -> str:
+        row = self._db.execute(
+            "SELECT generation FROM generations WHERE estimator = ?", (estimator,)
+        ).fetchone()
+        return f"{estimator}:{row[0] if row else 0}"
+
+    def get_many(self, namespace: str, digests: Iterable[str]) -> Dict[str, Dict]:
+        """Return cached results for whichever digests are known."""
+        found: Dict[str, Dict] = {}
+        missing = []
+        for digest in set(digests):
+            key = f"{namespace}/{digest}"
+            result = self._lru.get(key)
+            if result is None:
+                missing.append(digest)
+            else:
+                self._lru.move_to_end(key)
+                found[digest] = result
+
+        for i in range(0, len(missing), _LOOKUP_CHUNK):
+            chunk = missing[i:i + _LOOKUP_CHUNK]
+            rows = self._db.execute(
+                f"SELECT digest, result FROM estimates WHERE namespace = ? "
+                f"AND digest IN ({','.join('?' * len(chunk))})",
+                (namespace, *chunk)
+            )
+            for digest, result in rows:
+                found[digest] = json.loads(result)
+                self._remember(f"{namespace}/{digest}", found[digest])
+        return found
+
+    def put_many(self, namespace: str, results: Dict[str, Dict]) -> None:
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO estimates (namespace, digest, result) VALUES (?, ?, ?)",
+                ((namespace, digest, json.dumps(result)) for digest, result in results.items())
+            )
+            self._db.execute(
+                "DELETE FROM estimates WHERE rowid <= (SELECT MAX(rowid) FROM estimates) - ?",
+                (self.max_rows,)
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        for digest, result in results.items():
+            self._remember(f"{namespace}/{digest}", result)
+
+    def invalidate(self, estimator: str) -> int:
+        """Start a new generation for an estimator and drop its stored results."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "INSERT INTO generations (estimator, generation) VALUES (?, 1) "
+                "ON CONFLICT(estimator) DO UPDATE SET generation = generation + 1",
+                (estimator,)
+            )
+            self._db.execute("DELETE FROM estimates WHERE namespace LIKE ?", (f"{estimator}:%",))
+            generation = self._db.execute(
+                "SELECT generation FROM generations WHERE estimator = ?", (estimator,)
+            ).fetchone()[0]
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        self._lru.clear()
+        return generation
+
+    def __len__(self) -> int:
+        """Results in the on-disk store"""
+        return self._db.execute("SELECT COUNT(*) FROM estimates").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _remember(self, key: str, result: Dict) -> None:
+        self._lru[key] = result
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
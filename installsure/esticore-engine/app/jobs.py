@@ -0,0 +1,312 @@
+"""
+EstiCore QTO job engine.
+
+Submissions go into a bounded queue; a dispatcher thread hands them to a
+process pool (one free worker per dispatched job) so estimate runs are
+not serialized by the GIL. Workers report progress over a multiprocessing
+queue and write their BOM/QTO output under the results directory.
+Per-group results are memoized (see cache.py), so a resubmitted takeoff
+only re-estimates the groups whose params changed. State and progress
+changes are published to an optional JobEventBus for push subscribers.
+Finished jobs and their output are kept for job_ttl seconds, and at most
+max_finished of them, then forgotten oldest first.
+"""
+import csv
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+from jobevents import JobEventBus
+
+from .cache import EstimateCache, group_digest
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+
+ESTIMATOR_VERSIONS = ("old", "new")
+BOM_FIELDS = ["group_id", "parameter_count", "base_estimate", "overhead", "total", "error"]
+CACHE_FILE = "estimate-cache.sqlite3"
+
+
+class QueueFull(Exception):
+    """Raised when the submission queue is at capacity."""
+
+
+@dataclass
+class QtoJob:
+    id: str
+    state: str
+    submitted: datetime
+    progress: int = 0
+    started: Optional[datetime] = None
+    completed: Optional[datetime] = None
+    results: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.state in (COMPLETED, FAILED)
+
+    def status(self) -> Dict:
+        """State as reported by /v1/qto/{job_id}/status and pushed to subscribers."""
+        status = {"state": self.state, "progress": self.progress}
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+# Set in each worker process by _init_worker
+_progress_queue = None
+_cache: Optional[EstimateCache] = None
+
+
+def _init_worker(progress_queue, cache_path, cache_size, cache_rows):
+    global _progress_queue, _cache
+    _progress_queue = progress_queue
+    _cache = EstimateCache(cache_path, cache_size, cache_rows)
+
+
+def run_qto(job_id: str, body: Dict, results_dir: str) -> Dict:
+    """Estimate every parameter group of a QTO request and write bom.csv / qto.json."""
+    version = body.get("estimator", "new")
+    estimate = importlib.import_module(f"estimator_{version}").estimate
+    groups = body.get("groups") or []
+    params = [group.get("params") or {} for group in groups]
+
+    digests, known, fresh = [], {}, {}
+    if _cache is not None:
+        namespace = _cache.namespace(version)
+        digests = [group_digest(p) for p in params]
+        known = _cache.get_many(namespace, digests)
+
+    job_dir = os.path.join(results_dir, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    bom_path = os.path.join(job_dir, "bom.csv")
+    qto_path = os.path.join(job_dir, "qto.json")
+
+    totals = {"base_estimate": 0, "overhead": 0.0, "total": 0.0}
+    errors = hits = 0
+    step = max(1, len(groups) // 100)
+    with open(bom_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BOM_FIELDS)
+        writer.writeheader()
+        for i, group in enumerate(groups):
+            result = known.get(digests[i]) if digests else None
+            if result is None:
+                result = estimate(params[i])
+                if digests:
+                    known[digests[i]] = fresh[digests[i]] = result
+            else:
+                hits += 1
+            row = {"group_id": group.get("id", i), **result}
+            if "error" in result:
+                errors += 1
+            else:
+                for key in totals:
+                    totals[key] += result[key]
+            writer.writerow(row)
+            if _progress_queue is not None and (i + 1) % step == 0:
+                _progress_queue.put((job_id, (i + 1) * 100 // len(groups)))
+
+    if fresh:
+        _cache.put_many(namespace, fresh)
+
+    with open(qto_path, "w") as f:
+        json.dump({
+            "job_id": job_id,
+            "project_id": body.get("project_id"),
+            "estimator": version,
+            "groups": len(groups),
+            "errors": errors,
+            "recomputed": len(groups) - hits,
+            **totals
+        }, f)
+
+    return {
+        "files": {"bom_csv": bom_path, "qto_json": qto_path},
+        "cache_hits": hits,
+        "cache_misses": len(groups) - hits if _cache is not None else 0
+    }
+
+
+class QtoJobEngine:
+    """Bounded QTO job queue backed by a process pool."""
+
+    def __init__(self, results_dir: str, workers: Optional[int] = None, max_queue: int = 1024,
+                 cache_size: int = 100_000, cache_rows: int = 1_000_000,
+                 events: Optional[JobEventBus] = None,
+                 job_ttl: float = 24 * 3600, max_finished: int = 10_000, clock=time.monotonic):
+        self.results_dir = results_dir
+        self.events = events
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+        self._clock = clock
+        self._finished: "deque" = deque()  # (finish time, job id), oldest first
+        self.cache_path = os.path.join(results_dir, CACHE_FILE)
+        self.cache_size = cache_size
+        self.cache_rows = cache_rows
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.workers = workers or os.cpu_count() or 1
+        self._jobs: Dict[str, QtoJob] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress = None
+        self._threads = []
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            os.makedirs(self.results_dir, exist_ok=True)
+            ctx = multiprocessing.get_context("spawn")
+            self._progress = ctx.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self._progress, self.cache_path, self.cache_size, self.cache_rows)
+            )
+            self._threads = [
+                threading.Thread(target=self._dispatch, name="qto-dispatch", daemon=True),
+                threading.Thread(target=self._track_progress, name="qto-progress", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                return
+            executor, self._executor = self._executor, None
+        # Cancelling pending futures frees any slot the dispatcher waits on;
+        # it then sees the executor is gone and exits.
+        executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._progress.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def submit(self, body: Dict) -> QtoJob:
+        """Validate and enqueue a QTO request; raises ValueError or QueueFull."""
+        if body.get("estimator", "new") not in ESTIMATOR_VERSIONS:
+            raise ValueError(f"estimator must be one of {', '.join(ESTIMATOR_VERSIONS)}")
+        if not isinstance(body.get("groups", []), list):
+            raise ValueError("groups must be a list")
+        # A no-op once the service's startup hook has started the engine
+        self.start()
+
+        job = QtoJob(id=str(uuid.uuid4()), state=QUEUED, submitted=datetime.utcnow())
+        self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job.id, body))
+        except queue.Full:
+            del self._jobs[job.id]
+            raise QueueFull("QTO queue is full")
+        return job
+
+    def get(self, job_id: str) -> Optional[QtoJob]:
+        return self._jobs.get(job_id)
+
+    def invalidate_cache(self, estimator: str) -> int:
+        """Drop memoized results for one estimator; returns its new generation."""
+        if estimator not in ESTIMATOR_VERSIONS:
+            raise ValueError(f"estimator must be one of {', '.join(ESTIMATOR_VERSIONS)}")
+        os.makedirs(self.results_dir, exist_ok=True)
+        cache = EstimateCache(self.cache_path, max_entries=0)
+        try:
+            return cache.invalidate(estimator)
+        finally:
+            cache.close()
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, body = item
+            # Eviction deletes result directories, so it runs here and in
+            # _finish, never on the caller's (the event loop's) thread
+            self._evict()
+            self._slots.acquire()
+            executor = self._executor
+            if executor is None:
+                return
+            job = self._jobs[job_id]
+            job.started = datetime.utcnow()
+            job.state = RUNNING
+            try:
+                future = executor.submit(run_qto, job_id, body, self.results_dir)
+            except RuntimeError as e:  # executor shut down underneath us
+                self._slots.release()
+                job.state, job.error = FAILED, str(e)
+                self._publish(job)
+                return
+            self._publish(job)
+            future.add_done_callback(lambda f, job=job: self._finish(job, f))
+
+    def _finish(self, job: QtoJob, future) -> None:
+        self._slots.release()
+        # Older jobs are evicted before this one is seen to finish
+        with self._lock:
+            self._finished.append((self._clock(), job.id))
+        self._evict()
+        job.completed = datetime.utcnow()
+        if future.cancelled():
+            job.state, job.error = FAILED, "cancelled"
+        elif future.exception() is not None:
+            job.state, job.error = FAILED, str(future.exception())
+        else:
+            outcome = future.result()
+            with self._lock:
+                self.cache_hits += outcome["cache_hits"]
+                self.cache_misses += outcome["cache_misses"]
+            job.results = outcome["files"]
+            job.progress = 100
+            job.state = COMPLETED
+        self._publish(job)
+
+    def _evict(self) -> None:
+        """Forget finished jobs past job_ttl or beyond max_finished, and delete their output"""
+        with self._lock:
+            now = self._clock()
+            expired = []
+            while self._finished and (self._finished[0][0] + self.job_ttl <= now
+                                      or len(self._finished) > self.max_finished):
+                expired.append(self._finished.popleft()[1])
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+        for job_id in expired:
+            shutil.rmtree(os.path.join(self.results_dir, job_id), ignore_errors=True)
+
+    def _publish(self, job: QtoJob) -> None:
+        if self.events is not None and self.events.watching(job.id):
+            self.events.publish(job.id, job.status())
+
+    def _track_progress(self) -> None:
+        while True:
+            item = self._progress.get()
+            if item is None:
+                return
+            job_id, progress = item
+            job = self._jobs.get(job_id)
+            if job is not None and job.state == RUNNING:
+                job.progress = progress
+                self._publish(job)
@@ -1,9 +1,64 @@
-from fastapi import FastAPI, Body, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Body, Depends, Header, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-import uuid
+from fastapi.responses import StreamingResponse
+from pathlib import Path
+from typing import Optional
+import hmac
+import os
+import tempfile
 
-app = FastAPI(title="EstiCore Engine", version="0.1.0")
+from httpmetrics import instrument
+from idempotency import IdempotencyCache, idempotent
+from jobevents import SSE_HEADERS, JobEventBus, sse_events, stream_websocket
+from profiling import install_profiling
+from replay import install_capture
+
+from .bom import RangeNotSatisfiable, accepts_gzip, gzip_chunks, iter_csv, iter_csv_rows, iter_ndjson, parse_range
+from .jobs import QtoJobEngine, QueueFull, COMPLETED, FAILED
+
+RESULTS_DIR = os.environ.get("ESTICORE_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "esticore"))
+WORKERS = int(os.environ.get("ESTICORE_WORKERS", "0")) or None
+QUEUE_SIZE = int(os.environ.get("ESTICORE_QUEUE_SIZE", "1024"))
+CACHE_SIZE = int(os.environ.get("ESTICORE_CACHE_SIZE", "100000"))
+# Estimates kept in the on-disk cache; the oldest are pruned past this
+CACHE_ROWS = int(os.environ.get("ESTICORE_CACHE_ROWS", "1000000"))
+IDEMPOTENCY_KEYS = int(os.environ.get("ESTICORE_IDEMPOTENCY_KEYS", "10000"))
+IDEMPOTENCY_TTL = float(os.environ.get("ESTICORE_IDEMPOTENCY_TTL", "86400"))
+# Finished jobs and their BOM/QTO files are kept this long, and at most this many
+JOB_TTL = float(os.environ.get("ESTICORE_JOB_TTL", "86400"))
+MAX_FINISHED_JOBS = int(os.environ.get("ESTICORE_MAX_FINISHED_JOBS", "10000"))
+# Bearer token for the /admin routes; they are refused while it is unset
+ADMIN_TOKEN = os.environ.get("ESTICORE_ADMIN_TOKEN", "")
+
+events = JobEventBus()
+engine = QtoJobEngine(RESULTS_DIR, workers=WORKERS, max_queue=QUEUE_SIZE, cache_size=CACHE_SIZE,
+                      cache_rows=CACHE_ROWS, events=events, job_ttl=JOB_TTL, max_finished=MAX_FINISHED_JOBS)
+idempotency_cache = IdempotencyCache(max_entries=IDEMPOTENCY_KEYS, ttl=IDEMPOTENCY_TTL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Before serving, so the first /v1/qto/run does not create the pool on the event loop
+    engine.start()
+    yield
+    engine.shutdown()
+
+app = FastAPI(title="EstiCore Engine", version="0.1.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+http_metrics = instrument(app, "esticore-engine")
+
+def verify_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Bearer ESTICORE_ADMIN_TOKEN; admin routes are refused while no token is configured"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+# Off unless PROFILING_ENABLED or PROFILING_SAMPLE_RATE is set; X-Profile: 1 also needs PROFILING_HEADER_ENABLED
+profiler = install_profiling(app, dependencies=[Depends(verify_admin)])
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
 
 @app.get("/healthz")
 def healthz():
@@ -15,17 +70,119 @@ def readyz():
 
 @app.get("/metrics")
 def metrics():
-    return {"latency_p95_ms": 100, "error_rate": 0.0}
+    lookups = engine.cache_hits + engine.cache_misses
+    return {
+        **http_metrics.summary(),
+        "cache_hits": engine.cache_hits,
+        "cache_misses": engine.cache_misses,
+        "cache_hit_rate": engine.cache_hits / lookups if lookups else 0.0,
+        "event_subscribers": events.subscribers,
+        "idempotent_replays": idempotency_cache.replayed + idempotency_cache.coalesced
+    }
+
+def _get_job(job_id: str):
+    job = engine.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-@app.post("/v1/qto/run")
-def qto_run(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4()), "status":"QUEUED"}
+@app.post("/v1/qto/run", status_code=202)
+async def qto_run(request: Request, response: Response, body: dict = Body(...)):
+    """Queue a QTO job; a retry with the same Idempotency-Key gets the first job back"""
+    def submit():
+        try:
+            job = engine.submit(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        return {"job_id": job.id, "status": job.state}
+    return await idempotent(idempotency_cache, request, response, submit)
 
 @app.get("/v1/qto/{job_id}/status")
-def qto_status(job_id: str):
-    return {"state":"COMPLETED","progress":100}
+async def qto_status(job_id: str):
+    return _get_job(job_id).status()
+
+def _status_snapshot(job_id: str):
+    def snapshot():
+        job = engine.get(job_id)
+        return job.status() if job else None
+    return snapshot
+
+def _terminal(status: dict) -> bool:
+    return status["state"] in (COMPLETED, FAILED)
+
+@app.get("/v1/qto/{job_id}/events")
+async def qto_events(job_id: str):
+    """Server-sent events: the job's status now and after every change, until it finishes"""
+    _get_job(job_id)
+    return StreamingResponse(sse_events(events, job_id, _status_snapshot(job_id), _terminal),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.websocket("/v1/qto/{job_id}/ws")
+async def qto_events_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket push of the job's status, as /v1/qto/{job_id}/events"""
+    if engine.get(job_id) is None:
+        await websocket.close(code=1008, reason="Job not found")
+        return
+    await websocket.accept()
+    await stream_websocket(websocket, events, job_id, _status_snapshot(job_id), _terminal)
+
+BOM_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
 
 @app.get("/v1/qto/{job_id}/results")
-def qto_results(job_id: str):
-    return {"bom_csv_url":"s3://bucket/bom.csv","qto_json_url":"s3://bucket/qto.json","cost_pdf_url":"s3://bucket/cost.pdf"}
+async def qto_results(
+    job_id: str,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    offset: int = Query(0, ge=0, description="Resume the BOM stream from this data row")
+):
+    job = _get_job(job_id)
+    if job.state != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}")
+    if format is None:
+        return {
+            "bom_csv_url": Path(job.results["bom_csv"]).as_uri(),
+            "qto_json_url": Path(job.results["qto_json"]).as_uri(),
+            "cost_pdf_url": None
+        }
+    return _stream_bom(job.results["bom_csv"], format, offset, request)
+
+def _stream_bom(path: str, format: str, offset: int, request: Request) -> StreamingResponse:
+    """Stream the BOM as CSV or NDJSON, honouring byte ranges and gzip."""
+    headers = {"Accept-Ranges": "bytes" if format == "csv" else "none"}
+    if format == "csv" and offset == 0:
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable as e:
+            raise HTTPException(status_code=416, detail="Range not satisfiable",
+                                headers={"Content-Range": str(e)})
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            # Byte ranges address the stored representation, never a gzip re-encoding
+            return StreamingResponse(iter_csv(path, start, end), status_code=206,
+                                     media_type=BOM_MEDIA_TYPES[format], headers=headers)
+        headers["Content-Length"] = str(size)
+        chunks = iter_csv(path)
+    elif format == "csv":
+        chunks = iter_csv_rows(path, offset)
+    else:
+        chunks = iter_ndjson(path, offset)
+
+    headers["Vary"] = "Accept-Encoding"
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        headers.pop("Content-Length", None)
+        headers["Content-Encoding"] = "gzip"
+        chunks = gzip_chunks(chunks)
+    return StreamingResponse(chunks, media_type=BOM_MEDIA_TYPES[format], headers=headers)
 
+@app.post("/v1/cache/invalidate")
+def cache_invalidate(body: dict = Body(...)):
+    try:
+        generation = engine.invalidate_cache(body.get("estimator", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"estimator": body["estimator"], "generation": generation}
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory and throughput of BOM streaming as the row count grows.
+Usage: python bench_bom_stream.py [--rows 10000 100000 1000000 10000000]
+
+Each row count runs in a fresh process, so the reported peak RSS belongs to
+that tier alone.
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.bom import gzip_chunks, iter_csv, iter_ndjson
+from app.jobs import BOM_FIELDS
+
+MODES = {
+    "csv": lambda path: iter_csv(path),
+    "csv+gzip": lambda path: gzip_chunks(iter_csv(path)),
+    "ndjson": lambda path: iter_ndjson(path),
+    "ndjson+gzip": lambda path: gzip_chunks(iter_ndjson(path)),
+}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_bom(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BOM_FIELDS)
+        writer.writeheader()
+        for i in range(rows):
+            base = i % 997
+            writer.writerow({"group_id": f"item-{i}", "parameter_count": 4, "base_estimate": base,
+                             "overhead": base * 0.1, "total": base + base * 0.1})
+
+
+def child(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bom.csv")
+        write_bom(path, rows)
+        size_mb = os.path.getsize(path) / 1e6
+        baseline = peak_rss_mb()
+        for mode, stream in MODES.items():
+            start = time.perf_counter()
+            sent = sum(len(chunk) for chunk in stream(path))
+            elapsed = time.perf_counter() - start
+            print(f"{rows:>11,} {mode:<12} {size_mb:9.1f} MB in {elapsed:7.2f} s "
+                  f"({size_mb / elapsed:7.1f} MB/s, {sent / 1e6:9.1f} MB out)  "
+                  f"peak RSS {peak_rss_mb():6.1f} MB (+{peak_rss_mb() - baseline:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        child(args.child)
+        return
+    for rows in args.rows:
+        subprocess.run([sys.executable, __file__, "--child", str(rows)], check=True)
+
+
+if __name__ == "__main__":
+    main()
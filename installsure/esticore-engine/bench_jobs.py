@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: QTO submission rate and status lookup latency, through the HTTP API
+(in-process TestClient, which adds its own per-request cost) and against the
+engine directly.
+Usage: ESTICORE_QUEUE_SIZE=10000 python bench_jobs.py [--jobs 2000] [--groups 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "shared", "lib", "python"))
+
+from fastapi.testclient import TestClient
+from app.main import app, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    body = {
+        "project_id": "bench",
+        "groups": [{"id": f"g{i}", "params": {"a": i, "b": 2 * i}} for i in range(args.groups)]
+    }
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        job_ids = []
+        for _ in range(args.jobs):
+            response = client.post("/v1/qto/run", json=body)
+            if response.status_code != 202:
+                sys.exit(f"submission rejected: {response.status_code} {response.text}")
+            job_ids.append(response.json()["job_id"])
+        submit_s = time.perf_counter() - start
+
+        latencies = []
+        for i in range(args.lookups):
+            start = time.perf_counter()
+            client.get(f"/v1/qto/{job_ids[i % len(job_ids)]}/status")
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        start = time.perf_counter()
+        direct_ids = [engine.submit(body).id for _ in range(args.jobs)]
+        direct_submit_s = time.perf_counter() - start
+        direct = []
+        for i in range(args.lookups):
+            start = time.perf_counter()
+            engine.get(direct_ids[i % len(direct_ids)])
+            direct.append((time.perf_counter() - start) * 1e6)
+        direct.sort()
+        job_ids += direct_ids
+
+        start = time.perf_counter()
+        while any(engine.get(j).state not in ("COMPLETED", "FAILED") for j in job_ids[-10:]):
+            time.sleep(0.05)
+        drain_s = time.perf_counter() - start + submit_s + direct_submit_s
+
+    print(f"{args.jobs} jobs x {args.groups} groups per pass, {engine.workers} workers")
+    print(f"  HTTP submission     {args.jobs / submit_s:10,.0f} jobs/s")
+    print(f"  HTTP status p50     {statistics.median(latencies):10.3f} ms")
+    print(f"  HTTP status p95     {latencies[int(len(latencies) * 0.95)]:10.3f} ms")
+    print(f"  engine submission   {args.jobs / direct_submit_s:10,.0f} jobs/s")
+    print(f"  engine lookup p95   {direct[int(len(direct) * 0.95)]:10.3f} us")
+    print(f"  completion          {len(job_ids) / drain_s:10,.0f} jobs/s (first submit to last finished)")
+
+
+if __name__ == "__main__":
+    main()
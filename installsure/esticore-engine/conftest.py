@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The estimators live in the repository-level shared library, the job event bus,
+# idempotency cache, request metrics and profiler in installsure/shared (all on PYTHONPATH in the image)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "shared", "lib", "python")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python")))
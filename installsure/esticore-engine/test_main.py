@@ -0,0 +1,335 @@
+"""
+Test suite for InstallSure EstiCore FastAPI application
+Covers the QTO job lifecycle end to end through the process pool
+"""
+
+import csv
+import json
+import time
+from urllib.parse import urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+import app.main as main
+from app.main import app
+from app.cache import EstimateCache
+from app.jobs import QtoJobEngine
+
+client = TestClient(app)
+
+def wait_for(job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/v1/qto/{job_id}/status").json()
+        if status["state"] in ("COMPLETED", "FAILED"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+class TestHealthEndpoints:
+    """Test health check endpoints"""
+    
+    def test_healthz_endpoint(self):
+        """Test /healthz endpoint"""
+        response = client.get("/healthz")
+        assert response.status_code == 200
+        assert response.json()["service"] == "EstiCore Engine"
+
+class TestAdminRoutes:
+    """The /admin profiling routes need the admin token"""
+
+    def test_refused_without_a_configured_token(self, monkeypatch):
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+        assert client.get("/admin/profiles").status_code == 403
+        assert client.get("/admin/profiles", headers={"Authorization": "Bearer "}).status_code == 403
+
+    def test_token_checked(self, monkeypatch):
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "admin-token-123")
+        assert client.get("/admin/profiles").status_code == 401
+        assert client.get("/admin/profiles/routes", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        # Authorized, then 404 because profiling is off in the tests
+        response = client.get("/admin/profiles", headers={"Authorization": "Bearer admin-token-123"})
+        assert response.status_code == 404
+
+class TestQtoJobs:
+    """Test QTO job submission, status and results"""
+    
+    def test_run_completes_with_results(self):
+        """A submitted job runs and writes BOM/QTO files"""
+        body = {
+            "project_id": "demo",
+            "estimator": "old",
+            "groups": [
+                {"id": "wall-01", "params": {"studs": 40, "plates": 6}},
+                {"id": "slab-01", "params": {"concrete": 12}},
+                {"id": "empty", "params": {}}
+            ]
+        }
+        response = client.post("/v1/qto/run", json=body)
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "QUEUED"
+        
+        status = wait_for(data["job_id"])
+        assert status == {"state": "COMPLETED", "progress": 100}
+        
+        results = client.get(f"/v1/qto/{data['job_id']}/results").json()
+        with open(urlparse(results["bom_csv_url"]).path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["group_id"] for r in rows] == ["wall-01", "slab-01", "empty"]
+        assert rows[0]["base_estimate"] == "46"
+        assert rows[2]["error"] == "No parameters provided"
+        
+        with open(urlparse(results["qto_json_url"]).path) as f:
+            qto = json.load(f)
+        assert qto["base_estimate"] == 58
+        assert qto["errors"] == 1
+    
+    def test_results_not_ready(self, tmp_path, monkeypatch):
+        """Results of an unfinished job are a conflict, not fake URLs"""
+        engine = QtoJobEngine(str(tmp_path), workers=1, events=main.events)
+        monkeypatch.setattr(main, "engine", engine)
+        engine.start()
+        # With its only worker slot taken, the dispatcher holds the job in the queue
+        engine._slots.acquire()
+        try:
+            job_id = client.post("/v1/qto/run", json={"groups": []}).json()["job_id"]
+            response = client.get(f"/v1/qto/{job_id}/results")
+            assert response.status_code == 409
+            assert response.json()["detail"] == "Job is QUEUED"
+        finally:
+            engine._slots.release()
+        wait_for(job_id)
+        assert client.get(f"/v1/qto/{job_id}/results").status_code == 200
+        engine.shutdown()
+    
+    def test_engine_starts_with_the_service(self, tmp_path, monkeypatch):
+        """The pool is created by the startup hook, not by the first request"""
+        engine = QtoJobEngine(str(tmp_path), workers=1)
+        monkeypatch.setattr(main, "engine", engine)
+        with TestClient(app) as started:
+            assert engine._executor is not None
+            job_id = started.post("/v1/qto/run", json={"groups": []}).json()["job_id"]
+            assert engine.get(job_id) is not None
+        assert engine._executor is None
+
+    def test_finished_jobs_are_evicted(self, tmp_path):
+        """Finished jobs and their files are dropped past the TTL or the cap"""
+        now = [0.0]
+        engine = QtoJobEngine(str(tmp_path), workers=1, job_ttl=60, max_finished=2, clock=lambda: now[0])
+        
+        def run():
+            job = engine.submit({"groups": [{"id": "g", "params": {"a": 1}}]})
+            deadline = time.time() + 30
+            while not job.terminal and time.time() < deadline:
+                time.sleep(0.02)
+            assert job.state == "COMPLETED"
+            return job.id
+        try:
+            first, second, third = run(), run(), run()
+            assert engine.get(first) is None and not (tmp_path / first).exists()
+            assert engine.get(second) is not None and (tmp_path / third).exists()
+            now[0] = 61
+            # The dispatcher evicts before it runs the next job
+            fourth = run()
+            assert engine.get(second) is None and engine.get(third) is None
+            assert not (tmp_path / third).exists() and engine.get(fourth) is not None
+        finally:
+            engine.shutdown()
+    
+    def test_unknown_job(self):
+        """Unknown job IDs return 404"""
+        assert client.get("/v1/qto/does-not-exist/status").status_code == 404
+        assert client.get("/v1/qto/does-not-exist/results").status_code == 404
+    
+    def test_invalid_estimator(self):
+        """Only the old/new estimators are accepted"""
+        response = client.post("/v1/qto/run", json={"estimator": "v3", "groups": []})
+        assert response.status_code == 400
+    
+    def test_idempotency_key(self):
+        """A retried submission with the same key returns the first job"""
+        body = {"groups": [{"id": "g", "params": {"a": 1}}]}
+        headers = {"Idempotency-Key": "qto-retry-1"}
+        first = client.post("/v1/qto/run", json=body, headers=headers)
+        again = client.post("/v1/qto/run", json=body, headers=headers)
+        assert again.status_code == 202
+        assert again.json()["job_id"] == first.json()["job_id"]
+        assert again.headers["Idempotent-Replayed"] == "true"
+        assert client.post("/v1/qto/run", json={"groups": []}, headers=headers).status_code == 422
+        assert client.post("/v1/qto/run", json=body).json()["job_id"] != first.json()["job_id"]
+        wait_for(first.json()["job_id"])
+
+def sse_statuses(text):
+    return [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+
+class TestStatusPush:
+    """Job status pushed over server-sent events and WebSockets"""
+    
+    def test_sse_stream_ends_with_completion(self):
+        groups = [{"id": f"g{i}", "params": {"a": i}} for i in range(300)]
+        job_id = client.post("/v1/qto/run", json={"groups": groups}).json()["job_id"]
+        response = client.get(f"/v1/qto/{job_id}/events")
+        assert response.headers["content-type"].startswith("text/event-stream")
+        statuses = sse_statuses(response.text)
+        assert statuses[-1] == {"state": "COMPLETED", "progress": 100}
+        progress = [s["progress"] for s in statuses]
+        assert progress == sorted(progress)
+    
+    def test_websocket_pushes_until_finished(self):
+        job_id = client.post("/v1/qto/run", json={"groups": [{"id": "w", "params": {"studs": 4}}]}).json()["job_id"]
+        messages = []
+        with client.websocket_connect(f"/v1/qto/{job_id}/ws") as ws:
+            while not messages or messages[-1]["state"] not in ("COMPLETED", "FAILED"):
+                messages.append(ws.receive_json())
+        assert messages[-1]["type"] == "status"
+        assert messages[-1]["state"] == "COMPLETED"
+        assert client.get("/metrics").json()["event_subscribers"] == 0
+    
+    def test_unknown_job(self):
+        assert client.get("/v1/qto/does-not-exist/events").status_code == 404
+
+@pytest.fixture(scope="module")
+def job():
+    """A completed 501-row job and its stored BOM bytes"""
+    groups = [{"id": f"row-{i}", "params": {"a": i, "b": 1}} for i in range(500)]
+    groups.append({"id": "empty", "params": {}})
+    job_id = client.post("/v1/qto/run", json={"groups": groups}).json()["job_id"]
+    wait_for(job_id)
+    path = urlparse(client.get(f"/v1/qto/{job_id}/results").json()["bom_csv_url"]).path
+    with open(path, "rb") as f:
+        return job_id, f.read()
+
+class TestBomStreaming:
+    """Test streamed BOM output"""
+    
+    def test_csv_stream_matches_store(self, job):
+        """CSV streaming returns the stored BOM byte for byte"""
+        job_id, stored = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv",
+                              headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.content == stored
+    
+    def test_gzip_on_the_fly(self, job):
+        """Clients that accept gzip get a compressed stream"""
+        job_id, stored = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv",
+                              headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == stored  # httpx decodes transparently
+    
+    @pytest.mark.parametrize("accept_encoding", ["gzip;q=0", "GZIP; q=0.0, identity", "deflate, br",
+                                                 "gzip-foo", "*;q=0", "br, *;q=0"])
+    def test_gzip_refused(self, job, accept_encoding):
+        """Encodings are matched by name and a zero q-value refuses them"""
+        job_id, stored = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv",
+                              headers={"Accept-Encoding": accept_encoding})
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-length"] == str(len(stored))
+        assert response.content == stored
+    
+    @pytest.mark.parametrize("accept_encoding", ["br;q=1.0, GZIP;q=0.5", "x-gzip", "*", "deflate, *;q=0.1"])
+    def test_gzip_accepted(self, job, accept_encoding):
+        """gzip is chosen when named, aliased or covered by * with a non-zero q-value"""
+        job_id, stored = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv",
+                              headers={"Accept-Encoding": accept_encoding})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == stored
+    
+    def test_byte_range_resume(self, job):
+        """Range requests return 206 with the requested slice"""
+        job_id, stored = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv", headers={"Range": "bytes=100-"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 100-{len(stored) - 1}/{len(stored)}"
+        assert response.content == stored[100:]
+        
+        response = client.get(f"/v1/qto/{job_id}/results?format=csv",
+                              headers={"Range": f"bytes={len(stored)}-"})
+        assert response.status_code == 416
+    
+    def test_ndjson_rows(self, job):
+        """NDJSON rows carry estimate() shaped objects and resume by row offset"""
+        job_id, _ = job
+        response = client.get(f"/v1/qto/{job_id}/results?format=ndjson&offset=499")
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows == [
+            {"group_id": "row-499", "parameter_count": 2, "base_estimate": 500,
+             "overhead": 50.0, "total": 550.0},
+            {"group_id": "empty", "error": "No parameters provided"}
+        ]
+    
+    def test_csv_row_offset(self, job):
+        """CSV resumes by row offset keep the header"""
+        job_id, stored = job
+        lines = client.get(f"/v1/qto/{job_id}/results?format=csv&offset=500").text.splitlines()
+        assert lines == [stored.decode().splitlines()[0], "empty,,,,,No parameters provided"]
+
+class TestIncrementalEstimation:
+    """Test per-group memoization across resubmitted takeoffs"""
+    
+    @pytest.fixture(autouse=True)
+    def engine(self, tmp_path, monkeypatch):
+        """A fresh engine, so its cache starts empty"""
+        engine = QtoJobEngine(str(tmp_path), workers=1, events=main.events)
+        monkeypatch.setattr(main, "engine", engine)
+        engine.start()
+        yield engine
+        engine.shutdown()
+    
+    def test_resubmission_only_recomputes_changed_groups(self):
+        """Unchanged groups are served from the cache, changed ones recomputed"""
+        groups = [{"id": f"item-{i}", "params": {"value": i, "qty": 3}} for i in range(20)]
+        first = client.post("/v1/qto/run", json={"estimator": "new", "groups": groups}).json()
+        wait_for(first["job_id"])
+        before = client.get("/metrics").json()
+        
+        groups[5] = {"id": "item-5", "params": {"value": 5, "qty": 4}}
+        second = client.post("/v1/qto/run", json={"estimator": "new", "groups": groups}).json()
+        wait_for(second["job_id"])
+        after = client.get("/metrics").json()
+        
+        assert after["cache_hits"] - before["cache_hits"] == 19
+        assert after["cache_misses"] - before["cache_misses"] == 1
+        results = client.get(f"/v1/qto/{second['job_id']}/results").json()
+        with open(urlparse(results["qto_json_url"]).path) as f:
+            qto = json.load(f)
+        assert qto["recomputed"] == 1
+        assert qto["base_estimate"] == sum(range(20)) + 3 * 19 + 4
+    
+    def test_invalidate_by_estimator(self):
+        """Invalidating an estimator forces its groups to be recomputed"""
+        body = {"estimator": "old", "groups": [{"id": "x", "params": {"value": 1}}]}
+        wait_for(client.post("/v1/qto/run", json=body).json()["job_id"])
+        
+        response = client.post("/v1/cache/invalidate", json={"estimator": "old"})
+        assert response.status_code == 200
+        before = client.get("/metrics").json()
+        wait_for(client.post("/v1/qto/run", json=body).json()["job_id"])
+        after = client.get("/metrics").json()
+        assert after["cache_misses"] - before["cache_misses"] == 1
+        
+        assert client.post("/v1/cache/invalidate", json={"estimator": "v3"}).status_code == 400
+    
+    def test_disk_store_keeps_the_newest_rows(self, tmp_path):
+        """Past max_rows the oldest stored results are pruned"""
+        cache = EstimateCache(str(tmp_path / "cache.sqlite3"), max_entries=0, max_rows=10)
+        namespace = cache.namespace("new")
+        for start in range(0, 25, 5):
+            cache.put_many(namespace, {f"d{i}": {"value": i} for i in range(start, start + 5)})
+        assert len(cache) == 10
+        assert set(cache.get_many(namespace, [f"d{i}" for i in range(25)])) == {f"d{i}" for i in range(15, 25)}
+        
+        # Re-storing a result makes it the newest
+        cache.put_many(namespace, {"d15": {"value": 15}})
+        cache.put_many(namespace, {"d25": {"value": 25}})
+        assert set(cache.get_many(namespace, ["d15", "d16"])) == {"d15"}
+        cache.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,386 @@
+"""
+Search indexes over JarvisOps memory entries.
+
+BM25Index is an inverted index maintained incrementally as entries are
+appended: each term keeps compact arrays of (document, term frequency)
+postings, and a query only touches the postings of its own terms. With
+NumPy available, scoring runs vectorized over those arrays in place;
+without it, a plain loop gives the same ranking.
+
+VectorIndex is an exact (brute force) cosine-similarity index over
+caller-supplied embeddings, held in one growing float32 matrix. Its
+add/search interface is what an IVF or HNSW index would implement once
+scopes outgrow a full scan.
+
+Every document carries a sequence number, and searches take a floor below
+which documents no longer count, so retention can drop old entries from
+results at once; the indexes are rebuilt without them once they make up
+most of an index.
+"""
+import heapq
+import logging
+import math
+import queue
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def vector_search_available() -> bool:
+    return _numpy() is not None
+
+
+class BM25Index:
+    """Okapi BM25 over documents added one at a time"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs: List[Any] = []
+        self._seqs = array("Q")
+        self._lengths = array("I")
+        self._total_length = 0
+        # term -> (document numbers, term frequencies), both in insertion order
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, doc: Any, text: str, seq: Optional[int] = None) -> None:
+        self.add_many([doc], [text], None if seq is None else [seq])
+
+    def add_many(self, docs: Sequence[Any], texts: Sequence[str],
+                 seqs: Optional[Sequence[int]] = None) -> None:
+        """Index several documents, tokenizing before the lock is taken.
+
+        Sequence numbers default to the order documents were added in.
+        """
+        counted = [(Counter(tokenize(text)), doc) for doc, text in zip(docs, texts)]
+        with self._lock:
+            postings_map, lengths = self._postings, self._lengths
+            number = len(self._docs)
+            self._seqs.extend(range(number, number + len(docs)) if seqs is None else seqs)
+            for counts, doc in counted:
+                self._docs.append(doc)
+                length = sum(counts.values())
+                lengths.append(length)
+                self._total_length += length
+                for term, tf in counts.items():
+                    postings = postings_map.get(term)
+                    if postings is None:
+                        postings = postings_map[term] = (array("I"), array("I"))
+                    postings[0].append(number)
+                    postings[1].append(tf)
+                number += 1
+
+    def dead(self, floor: int) -> int:
+        """Number of documents with a sequence number below `floor`."""
+        with self._lock:
+            return _count_below(self._seqs, floor)
+
+    def compacted(self, floor: int, text_of) -> "BM25Index":
+        """A new index holding only the documents at or above `floor`."""
+        with self._lock:
+            live = [(doc, seq) for doc, seq in zip(self._docs, self._seqs) if seq >= floor]
+        index = BM25Index(self.k1, self.b)
+        index.add_many([doc for doc, _ in live], [text_of(doc) for doc, _ in live],
+                       [seq for _, seq in live])
+        return index
+
+    def search(self, query: str, k: int = 10, floor: int = 0) -> List[Tuple[float, Any]]:
+        """Top-k (score, document) pairs, best first, ignoring documents below `floor`."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+            avgdl = self._total_length / n
+            matched = [(self._idf(len(p[0]), n), p) for p in map(self._postings.get, terms) if p]
+            if not matched:
+                return []
+            np = _numpy()
+            if np is not None:
+                top = self._score_numpy(np, matched, avgdl, k, floor)
+            else:
+                top = self._score_python(matched, avgdl, k, floor)
+            return [(score, self._docs[number]) for score, number in top]
+
+    def _idf(self, df: int, n: int) -> float:
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _score_python(self, matched, avgdl: float, k: int, floor: int) -> List[Tuple[float, int]]:
+        k1, b, lengths, seqs = self.k1, self.b, self._lengths, self._seqs
+        scores: Dict[int, float] = {}
+        for idf, (docs, tfs) in matched:
+            for number, tf in zip(docs, tfs):
+                if floor and seqs[number] < floor:
+                    continue
+                norm = k1 * (1.0 - b + b * lengths[number] / avgdl)
+                scores[number] = scores.get(number, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        # Ties go to the earlier entry, as in _score_numpy
+        return heapq.nlargest(k, ((score, number) for number, score in scores.items()),
+                              key=lambda item: (item[0], -item[1]))
+
+    def _score_numpy(self, np, matched, avgdl: float, k: int, floor: int) -> List[Tuple[float, int]]:
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        if len(matched) == 1:
+            idf, (docs, tfs) = matched[0]
+            numbers = np.frombuffer(docs, dtype=np.uint32)
+            scores = self._term_scores(np, idf, numbers, tfs, lengths, avgdl)
+        else:
+            # Sum per document across terms: sort all postings by document once
+            parts = [(np.frombuffer(docs, dtype=np.uint32),
+                      self._term_scores(np, idf, np.frombuffer(docs, dtype=np.uint32), tfs, lengths, avgdl))
+                     for idf, (docs, tfs) in matched]
+            all_numbers = np.concatenate([p[0] for p in parts])
+            all_scores = np.concatenate([p[1] for p in parts])
+            numbers, inverse = np.unique(all_numbers, return_inverse=True)
+            scores = np.bincount(inverse, weights=all_scores)
+        if floor:
+            live = np.frombuffer(self._seqs, dtype=np.uint64)[numbers] >= floor
+            numbers, scores = numbers[live], scores[live]
+        if not len(scores):
+            return []
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        # Best score first, ties to the earlier entry
+        best = best[np.lexsort((numbers[best], -scores[best]))]
+        return [(float(scores[i]), int(numbers[i])) for i in best]
+
+    def _term_scores(self, np, idf, numbers, tfs, lengths, avgdl):
+        tf = np.frombuffer(tfs, dtype=np.uint32).astype(np.float64)
+        norm = self.k1 * (1.0 - self.b + self.b * lengths[numbers] / avgdl)
+        return idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+
+class VectorIndex:
+    """Exact cosine-similarity search over fixed-dimension embeddings (needs NumPy)"""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        np = _numpy()
+        if np is None:
+            raise RuntimeError("vector search needs numpy installed")
+        self._np = np
+        self.dim = dim
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        self._docs: List[Any] = []
+        self._seqs = array("Q")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, doc: Any, vector: Sequence[float], seq: Optional[int] = None) -> None:
+        row = self._unit(vector)
+        with self._lock:
+            n = len(self._docs)
+            if n == len(self._matrix):
+                grown = self._np.empty((2 * n, self.dim), dtype=self._np.float32)
+                grown[:n] = self._matrix
+                self._matrix = grown
+            self._matrix[n] = row
+            self._docs.append(doc)
+            self._seqs.append(n if seq is None else seq)
+
+    def dead(self, floor: int) -> int:
+        """Number of vectors with a sequence number below `floor`."""
+        with self._lock:
+            return _count_below(self._seqs, floor)
+
+    def compacted(self, floor: int) -> "VectorIndex":
+        """A new index holding only the vectors at or above `floor`."""
+        np = self._np
+        with self._lock:
+            n = len(self._docs)
+            live = np.flatnonzero(np.frombuffer(self._seqs, dtype=np.uint64) >= floor)
+            index = VectorIndex(self.dim, max(len(live), 1024))
+            index._matrix[:len(live)] = self._matrix[:n][live]
+            index._docs = [self._docs[i] for i in live]
+            index._seqs = array("Q", (self._seqs[i] for i in live))
+        return index
+
+    def search(self, vector: Sequence[float], k: int = 10, floor: int = 0) -> List[Tuple[float, Any]]:
+        """Top-k (cosine similarity, document) pairs, best first, ignoring vectors below `floor`."""
+        np = self._np
+        query = self._unit(vector)
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            scores = self._matrix[:n] @ query
+            if floor:
+                live = np.flatnonzero(np.frombuffer(self._seqs, dtype=np.uint64) >= floor)
+                scores = scores[live]
+            else:
+                live = np.arange(n)
+            m = len(scores)
+            best = np.argpartition(-scores, k - 1)[:k] if m > k else np.arange(m)
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [(float(scores[i]), self._docs[live[i]]) for i in best]
+
+    def _unit(self, vector: Sequence[float]):
+        row = self._np.asarray(vector, dtype=self._np.float32)
+        if row.shape != (self.dim,):
+            raise ValueError(f"expected a vector of dimension {self.dim}")
+        norm = float(self._np.linalg.norm(row))
+        return row / norm if norm else row
+
+
+class MemoryIndex:
+    """Per-scope BM25 indexes, plus vector indexes for scopes given embeddings
+
+    All indexing happens on one background thread: add_later() queues a
+    batch and returns an event set once it is searchable, so bulk loads are
+    not held back by tokenizing. discard_before() hides a scope's older
+    entries from searches immediately and has the thread rebuild the
+    scope's indexes once removed entries outnumber the rest.
+    """
+
+    def __init__(self):
+        self._text: Dict[str, BM25Index] = {}
+        self._vectors: Dict[str, VectorIndex] = {}
+        self._floors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.SimpleQueue[Tuple]" = queue.SimpleQueue()
+        self._pending = 0
+        self._compactions = 0
+        self._idle = threading.Condition(self._lock)
+        self._indexer: Optional[threading.Thread] = None
+        self.rebuilds = 0
+
+    def add_later(self, entries: List[Any]) -> threading.Event:
+        """Queue entries (with .scope, .seq, .content, .embedding) for background indexing."""
+        done = threading.Event()
+        if not entries:
+            done.set()
+            return done
+        # Fix the scope's vector dimension now, so validation sees it before indexing
+        first = next((e.embedding for e in entries if e.embedding is not None), None)
+        self._indexes(entries[0].scope, len(first) if first is not None else None)
+        with self._lock:
+            self._pending += len(entries)
+        self._submit(("add", entries, done))
+        return done
+
+    def discard_before(self, scope: str, floor: int) -> None:
+        """Drop a scope's entries with sequence numbers below `floor` from searches."""
+        with self._lock:
+            if floor <= self._floors.get(scope, 0):
+                return
+            self._floors[scope] = floor
+            self._compactions += 1
+        self._submit(("compact", scope))
+
+    @property
+    def pending(self) -> int:
+        """Entries queued by add_later() and not yet searchable."""
+        return self._pending
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued entries are searchable and rebuilds done; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0 and self._compactions == 0, timeout)
+
+    def search_text(self, scope: str, query: str, k: int = 10) -> List[Tuple[float, Any]]:
+        index = self._text.get(scope)
+        return index.search(query, k, self._floors.get(scope, 0)) if index else []
+
+    def search_vector(self, scope: str, vector: Sequence[float], k: int = 10) -> List[Tuple[float, Any]]:
+        index = self._vectors.get(scope)
+        return index.search(vector, k, self._floors.get(scope, 0)) if index else []
+
+    def vector_dim(self, scope: str) -> Optional[int]:
+        index = self._vectors.get(scope)
+        return index.dim if index else None
+
+    def _indexes(self, scope: str, dim: Optional[int]) -> Tuple[BM25Index, Optional[VectorIndex]]:
+        with self._lock:
+            text = self._text.get(scope)
+            if text is None:
+                text = self._text[scope] = BM25Index()
+            vectors = self._vectors.get(scope)
+            if dim is not None and vectors is None:
+                vectors = self._vectors[scope] = VectorIndex(dim)
+            return text, vectors
+
+    def _submit(self, item: Tuple) -> None:
+        with self._lock:
+            if self._indexer is None:
+                self._indexer = threading.Thread(target=self._index_loop, name="memory-indexer", daemon=True)
+                self._indexer.start()
+        self._queue.put(item)
+
+    def _index_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item[0] == "add":
+                    self._add(item[1])
+                else:
+                    self._compact(item[1])
+            except Exception as e:
+                logger.error(f"Memory indexing error: {e}")
+            if item[0] == "add":
+                item[2].set()
+            with self._idle:
+                if item[0] == "add":
+                    self._pending -= len(item[1])
+                else:
+                    self._compactions -= 1
+                self._idle.notify_all()
+
+    def _add(self, entries: List[Any]) -> None:
+        # Batches come from one append, so they share a scope
+        text, vectors = self._indexes(entries[0].scope, None)
+        text.add_many(entries, [entry.content for entry in entries], [entry.seq for entry in entries])
+        for entry in entries:
+            if entry.embedding is None:
+                continue
+            try:
+                self._indexes(entry.scope, len(entry.embedding))[1].add(entry, entry.embedding, entry.seq)
+            except ValueError as e:
+                # A concurrent first load fixed a different dimension; the text is indexed
+                logger.warning(f"Entry {entry.entry_id} not vector-indexed: {e}")
+
+    def _compact(self, scope: str) -> None:
+        # Only this thread writes to the indexes, so a rebuilt index can
+        # replace the old one without losing concurrent additions
+        floor = self._floors.get(scope, 0)
+        text, vectors = self._text.get(scope), self._vectors.get(scope)
+        if text is not None and 2 * text.dead(floor) > len(text):
+            rebuilt = text.compacted(floor, lambda entry: entry.content)
+            with self._lock:
+                self._text[scope] = rebuilt
+            self.rebuilds += 1
+        if vectors is not None and 2 * vectors.dead(floor) > len(vectors):
+            rebuilt = vectors.compacted(floor)
+            with self._lock:
+                self._vectors[scope] = rebuilt
+
+
+def _count_below(seqs: array, floor: int) -> int:
+    np = _numpy()
+    if np is not None:
+        return int(np.count_nonzero(np.frombuffer(seqs, dtype=np.uint64) < floor))
+    return sum(1 for seq in seqs if seq < floor)
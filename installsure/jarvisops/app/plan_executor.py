@@ -0,0 +1,289 @@
+"""
+Dependency-DAG execution of JarvisOps plans.
+
+A plan is a list of named steps, each naming an action and the steps it
+depends on. validate_plan() checks the graph (unknown dependencies, cycles)
+when the plan is created. PlanExecutor runs a plan in the background on the
+event loop: steps whose dependencies have succeeded are started as soon as a
+slot is free, up to the plan's max_concurrency, and their actions run in a
+process pool so long or CPU-heavy steps do not hold up the server. When a
+step fails, every step that depends on it is skipped. Independent branches
+carry on.
+
+Every step transition (PENDING -> RUNNING -> SUCCEEDED / FAILED / SKIPPED) is
+written to the run's job record, so GET /v1/jobs/{id} and the durable job
+log show progress as it happens.
+
+Runs submitted through submit() wait in a FairScheduler (see scheduler.py)
+for one of its max_running slots; start() bypasses it.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEPS = ["ingest", "curate", "build", "eval"]
+# Plan params come from clients: a simulated step may not hold a worker for long
+MAX_STEP_SECONDS = 1.0
+
+
+def _placeholder(name: str, params: Dict) -> Dict:
+    # Stand-in for the real pipeline stages; `duration_s` simulates a slow step
+    duration = min(float(params.get("duration_s", 0)), MAX_STEP_SECONDS)
+    if duration > 0:
+        time.sleep(duration)
+    return {"step": name, "status": "success"}
+
+
+def ingest(params: Dict) -> Dict:
+    return _placeholder("ingest", params)
+
+
+def curate(params: Dict) -> Dict:
+    return _placeholder("curate", params)
+
+
+def build(params: Dict) -> Dict:
+    return _placeholder("build", params)
+
+
+def evaluate(params: Dict) -> Dict:
+    return _placeholder("eval", params)
+
+
+# Actions run in worker processes, so they must be module-level functions
+ACTIONS: Dict[str, Callable[[Dict], Any]] = {
+    "ingest": ingest,
+    "curate": curate,
+    "build": build,
+    "eval": evaluate,
+}
+
+
+def default_plan() -> List[Dict]:
+    """The fixed pipeline used when a plan names no steps: each stage after the last"""
+    return [{"name": name, "action": name, "depends_on": DEFAULT_STEPS[i - 1:i], "params": {}}
+            for i, name in enumerate(DEFAULT_STEPS)]
+
+
+def validate_plan(steps: List[Dict]) -> List[str]:
+    """Check a plan's steps and return their names in a dependency order.
+
+    Raises ValueError for duplicate names, unknown actions or dependencies,
+    and cycles.
+    """
+    names = [step["name"] for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("step names must be unique")
+    for step in steps:
+        if step["action"] not in ACTIONS:
+            raise ValueError(f"unknown action {step['action']!r} in step {step['name']!r}")
+        for dep in step["depends_on"]:
+            if dep not in names:
+                raise ValueError(f"step {step['name']!r} depends on unknown step {dep!r}")
+    # Kahn's algorithm: anything left unordered sits on a cycle
+    waiting = {step["name"]: len(set(step["depends_on"])) for step in steps}
+    dependents = _dependents(steps)
+    ready = [name for name in names if not waiting[name]]
+    order = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for child in dependents[name]:
+            waiting[child] -= 1
+            if not waiting[child]:
+                ready.append(child)
+    if len(order) != len(steps):
+        cycle = sorted(name for name in names if name not in order)
+        raise ValueError(f"plan has a dependency cycle through {', '.join(cycle)}")
+    return order
+
+
+def _dependents(steps: List[Dict]) -> Dict[str, List[str]]:
+    dependents: Dict[str, List[str]] = {step["name"]: [] for step in steps}
+    for step in steps:
+        for dep in set(step["depends_on"]):
+            dependents[dep].append(step["name"])
+    return dependents
+
+
+def _run_action(action: str, params: Dict) -> Any:
+    return ACTIONS[action](params)
+
+
+class PlanExecutor:
+    """Runs plans as background tasks, recording step progress in job storage
+
+    `jobs` is anything with SecureJobStorage's update_job_state(). The pool
+    is created on first use unless one is given.
+    """
+
+    def __init__(self, jobs, pool: Optional[Executor] = None, workers: Optional[int] = None,
+                 scheduler: Optional[FairScheduler] = None):
+        self.jobs = jobs
+        self.scheduler = scheduler if scheduler is not None else FairScheduler()
+        self._pool = pool
+        self._workers = workers
+        self._tasks: Set[asyncio.Task] = set()
+        self._closing = False
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            # Spawned, not forked: a forked worker would inherit the loop's threads and locks
+            self._pool = ProcessPoolExecutor(max_workers=self._workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    def start(self, run_id: str, plan_id: str, steps: List[Dict], max_concurrency: int) -> asyncio.Task:
+        """Run a plan (whose job is already RUNNING) on the event loop now"""
+        return self._launch(run_id, plan_id, steps, max_concurrency, queued=False)
+
+    def submit(self, run_id: str, plan_id: str, steps: List[Dict], max_concurrency: int,
+               tenant: str, priority: str = "normal", reserved: bool = False) -> None:
+        """Queue a plan (whose job is QUEUED) to run when the scheduler gives it a slot
+
+        Callers check admission first with scheduler.check(tenant), or take
+        a place with scheduler.reserve(tenant) and pass reserved=True.
+        """
+        self.scheduler.push(tenant, priority, (run_id, plan_id, steps, max_concurrency), cost=len(steps),
+                            reserved=reserved)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while not self._closing and len(self._tasks) < self.scheduler.max_running:
+            item = self.scheduler.pop()
+            if item is None:
+                return
+            self._launch(*item, queued=True)
+
+    def _launch(self, run_id: str, plan_id: str, steps: List[Dict], max_concurrency: int,
+                queued: bool) -> asyncio.Task:
+        started = time.monotonic()
+        task = asyncio.get_running_loop().create_task(
+            self._execute(run_id, plan_id, steps, max_concurrency, queued))
+
+        def done(task: asyncio.Task) -> None:
+            # The loop only keeps weak references to tasks, hence the set
+            self._tasks.discard(task)
+            if queued:
+                self.scheduler.finished(time.monotonic() - started)
+                self._dispatch()
+
+        self._tasks.add(task)
+        task.add_done_callback(done)
+        return task
+
+    async def wait(self) -> None:
+        """Wait for every started plan to finish"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        # Queued runs stay QUEUED in the job store; recovery fails them
+        self._closing = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _execute(self, run_id: str, plan_id: str, steps: List[Dict], max_concurrency: int,
+                       queued: bool = False) -> None:
+        loop = asyncio.get_running_loop()
+        by_name = {step["name"]: step for step in steps}
+        dependents = _dependents(steps)
+        waiting = {step["name"]: len(set(step["depends_on"])) for step in steps}
+        status = {name: {"state": "PENDING"} for name in by_name}
+        ready = [step["name"] for step in steps if not waiting[step["name"]]]
+        running: Dict[asyncio.Future, str] = {}
+
+        # A queued run starts now; one from start() is RUNNING with its start time already
+        started = datetime.utcnow() if queued else None
+        last_write: Optional[asyncio.Future] = None
+
+        async def record(job_state: str = "RUNNING", **fields) -> None:
+            nonlocal last_write
+            # Job records are replaced, never mutated: publish a fresh copy each time
+            result = {"plan_id": plan_id, "steps": {name: dict(s) for name, s in status.items()}}
+            last_write = loop.run_in_executor(None, lambda: self.jobs.update_job_state(
+                run_id, job_state, result=result, **fields))
+            # Shielded so a cancelled run still knows when its last write lands
+            await asyncio.shield(last_write)
+
+        async def fail(message: str) -> None:
+            if last_write is not None and not last_write.done():
+                await asyncio.wait({last_write})
+            # FAILED needs a start time even if the run was cancelled before RUNNING was recorded
+            await record("FAILED", error_message=message, started=started)
+
+        try:
+            if queued:
+                await record("RUNNING", started=started)
+            while ready or running:
+                launched = False
+                while ready and len(running) < max_concurrency:
+                    name = ready.pop(0)
+                    step = by_name[name]
+                    status[name] = {"state": "RUNNING", "started": _now()}
+                    future = loop.run_in_executor(self.pool, _run_action, step["action"], step.get("params", {}))
+                    running[future] = name
+                    launched = True
+                # One job update covers every step launched together
+                if launched:
+                    await record()
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    finished = {**status[name], "completed": _now()}
+                    if error is None:
+                        status[name] = {**finished, "state": "SUCCEEDED", "output": future.result()}
+                        for child in dependents[name]:
+                            waiting[child] -= 1
+                            if not waiting[child]:
+                                ready.append(child)
+                    else:
+                        logger.warning(f"Run {run_id} step {name} failed: {error!r}")
+                        status[name] = {**finished, "state": "FAILED", "error": str(error) or type(error).__name__}
+                        self._skip(name, dependents, status)
+                await record()
+            failed = [name for name, s in status.items() if s["state"] == "FAILED"]
+            if failed:
+                await fail(f"steps failed: {', '.join(failed)}")
+            else:
+                await record("COMPLETED", completed=datetime.utcnow())
+            logger.info(f"Run {run_id} for plan {plan_id} finished: {'FAILED' if failed else 'COMPLETED'}")
+        except asyncio.CancelledError:
+            for future in running:
+                future.cancel()
+            await asyncio.shield(fail("run cancelled"))
+            raise
+        except Exception as e:
+            logger.error(f"Run {run_id} executor error: {e}")
+            await fail("executor error")
+
+    @staticmethod
+    def _skip(name: str, dependents: Dict[str, List[str]], status: Dict[str, Dict]) -> None:
+        stack = list(dependents[name])
+        while stack:
+            child = stack.pop()
+            if status[child]["state"] == "PENDING":
+                status[child] = {"state": "SKIPPED", "reason": f"dependency {name} failed"}
+                stack.extend(dependents[child])
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
@@ -0,0 +1,159 @@
+"""
+Fair-share admission for JarvisOps plan runs.
+
+Runs wait in one queue and are started as run slots free up. Each
+(tenant, priority class) pair is a flow, and the queue is ordered by
+start-time fair queuing: a run's start tag is
+
+    max(virtual time, previous finish tag of its flow)
+
+and its finish tag adds cost / weight, where the weight is the priority
+class weight times the tenant's weight. The run with the lowest start tag
+goes next, and virtual time advances to it. A tenant that floods the queue
+only pushes its own tags further out, so a tenant sending a run now and
+then is served within about one run per active flow. Higher classes get
+proportionally more of the slots without starving lower ones.
+
+Queue depth is bounded per tenant and overall; past either bound check()
+raises QueueFull with a retry delay estimated from the depth ahead of the
+caller and the average run time. reserve() takes a place in the queue up
+front for a run that is pushed later, so callers that await in between
+cannot all pass the check and overshoot the bounds.
+"""
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+PRIORITY_WEIGHTS = {"high": 4.0, "normal": 2.0, "low": 1.0}
+WAIT_SAMPLES = 4096
+
+
+class QueueFull(Exception):
+    """The caller's queue (or the whole queue) is at its limit"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def tenant_key(token: str) -> str:
+    """Stable tenant identifier for a bearer token, without keeping the token"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "tenant=weight,tenant=weight" (tenants as given by tenant_key)"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        tenant, _, weight = item.partition("=")
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
+class FairScheduler:
+    """Weighted fair queue of runs with per-tenant and global depth limits
+
+    Not thread-safe: the plan executor drives it from the event loop.
+    """
+
+    def __init__(self, max_running: int = 8, tenant_limit: int = 100, queue_limit: int = 1000,
+                 tenant_weights: Optional[Dict[str, float]] = None, clock=time.monotonic):
+        if max_running < 1:
+            raise ValueError("max_running must be positive")
+        self.max_running = max_running
+        self.tenant_limit = tenant_limit
+        self.queue_limit = queue_limit
+        self.tenant_weights = tenant_weights or {}
+        self._clock = clock
+        self._heap: List[Tuple[float, int, Tuple[str, str], float, Any]] = []
+        self._finish: Dict[Tuple[str, str], float] = {}
+        self._virtual = 0.0
+        self._depth: Counter = Counter()
+        self._reserved: Counter = Counter()  # places taken by reserve() and not yet pushed
+        self._seq = itertools.count()
+        self._run_seconds = 1.0  # moving average of run duration
+        self._waits: Dict[str, Deque[float]] = {name: deque(maxlen=WAIT_SAMPLES) for name in PRIORITY_WEIGHTS}
+        self._dispatched: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def check(self, tenant: str) -> None:
+        """Raise QueueFull if a run from `tenant` cannot be queued now"""
+        depth = self._depth[tenant] + self._reserved[tenant]
+        if depth >= self.tenant_limit:
+            raise QueueFull(self.retry_after(depth), "tenant queue is full")
+        queued = len(self._heap) + sum(self._reserved.values())
+        if queued >= self.queue_limit:
+            raise QueueFull(self.retry_after(queued), "run queue is full")
+
+    def reserve(self, tenant: str) -> None:
+        """Take a place in the queue for a run pushed later with reserved=True; raises QueueFull"""
+        self.check(tenant)
+        self._reserved[tenant] += 1
+
+    def release(self, tenant: str) -> None:
+        """Give back a place taken by reserve() whose run will not be pushed"""
+        self._reserved[tenant] -= 1
+        if not self._reserved[tenant]:
+            del self._reserved[tenant]
+
+    def retry_after(self, depth: int) -> int:
+        """Seconds until about `depth` queued runs have been started"""
+        return max(1, math.ceil(depth * self._run_seconds / self.max_running))
+
+    def push(self, tenant: str, priority: str, item: Any, cost: float = 1.0, reserved: bool = False) -> None:
+        if reserved:
+            self.release(tenant)
+        flow = (tenant, priority)
+        weight = PRIORITY_WEIGHTS[priority] * self.tenant_weights.get(tenant, 1.0)
+        start = max(self._virtual, self._finish.get(flow, 0.0))
+        self._finish[flow] = start + cost / weight
+        self._depth[tenant] += 1
+        heapq.heappush(self._heap, (start, next(self._seq), flow, self._clock(), item))
+
+    def pop(self) -> Optional[Any]:
+        """The next run to start, or None if nothing is queued"""
+        if not self._heap:
+            return None
+        start, seq, flow, enqueued, item = heapq.heappop(self._heap)
+        self._virtual = start
+        tenant, priority = flow
+        self._depth[tenant] -= 1
+        if not self._depth[tenant]:
+            del self._depth[tenant]
+        self._waits[priority].append(self._clock() - enqueued)
+        self._dispatched[priority] += 1
+        if seq % 1024 == 0:
+            # Flows whose last finish tag is behind virtual time carry no credit
+            self._finish = {f: tag for f, tag in self._finish.items() if tag > self._virtual}
+        return item
+
+    def finished(self, seconds: float) -> None:
+        """Report a run's duration, for retry estimates"""
+        self._run_seconds += 0.1 * (seconds - self._run_seconds)
+
+    def depth(self, tenant: str) -> int:
+        return self._depth[tenant]
+
+    def stats(self) -> Dict[str, Any]:
+        classes = {}
+        for name, waits in self._waits.items():
+            ordered = sorted(waits)
+            classes[name] = {
+                "dispatched": self._dispatched[name],
+                "wait_p50_ms": _percentile(ordered, 0.50) * 1000,
+                "wait_p99_ms": _percentile(ordered, 0.99) * 1000,
+            }
+        return {"queued": len(self._heap), "tenants_queued": len(self._depth),
+                "avg_run_seconds": self._run_seconds, "classes": classes}
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -3,19 +3,40 @@
 Secure JarvisOps Service Implementation
 Following MIT 6.102/6.005 representation invariants and Harvard security standards
 """
-from fastapi import FastAPI, Body, HTTPException, Depends, Request
+from fastapi import FastAPI, Body, HTTPException, Depends, Query, Request, Response, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, validator
-from typing import Dict, List, Optional, Set
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from contextlib import ExitStack, asynccontextmanager
+import os
+import threading
 import uuid
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from dataclasses import dataclass, asdict
+import base64
+import bisect
 import hashlib
+import itertools
+import json
 import secrets
 
+from httpmetrics import instrument
+from profiling import install_profiling
+from idempotency import IdempotencyCache, idempotent
+from jobevents import SSE_HEADERS, JobEventBus, sse_events, stream_websocket
+from ratelimit import RateLimiter, make_backend
+from replay import install_capture
+
+from .memory_index import MemoryIndex, vector_search_available
+from .plan_executor import PlanExecutor, default_plan, validate_plan
+from .scheduler import FairScheduler, QueueFull, parse_weights, tenant_key
+from .segment_log import SegmentLog
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,10 +48,46 @@ MAX_REQUEST_SIZE = 1024 * 1024  # 1MB limit
 RATE_LIMIT_REQUESTS = 100
 RATE_LIMIT_WINDOW = 3600  # 1 hour
 
+# Durability: jobs and memory are logged under JARVISOPS_DATA_DIR when it is set
+DATA_DIR = os.environ.get("JARVISOPS_DATA_DIR")
+SNAPSHOT_INTERVAL = float(os.environ.get("JARVISOPS_SNAPSHOT_INTERVAL", "300"))
+MEMORY_PAGE_DEFAULT = 1000
+MEMORY_PAGE_MAX = 10000
+# Memory retention runs every COMPACT_INTERVAL seconds; JARVISOPS_MEMORY_MAX_*
+# set the limits for scopes without their own policy (unset = unlimited)
+COMPACT_INTERVAL = float(os.environ.get("JARVISOPS_COMPACT_INTERVAL", "60"))
+# /v1/memory/append waits up to this long for its entries to become searchable
+INDEX_WAIT_SECONDS = float(os.environ.get("JARVISOPS_INDEX_WAIT_SECONDS", "1"))
+
+def _env_number(name: str, kind):
+    value = os.environ.get(name)
+    return kind(value) if value else None
+
+# Plan steps run in a process pool of STEP_WORKERS processes (default: CPU count)
+STEP_WORKERS = _env_number("JARVISOPS_STEP_WORKERS", int)
+# Runs are admitted fairly across tenants (bearer tokens) into MAX_RUNNING_PLANS slots
+MAX_RUNNING_PLANS = int(os.environ.get("JARVISOPS_MAX_RUNNING_PLANS", "8"))
+TENANT_QUEUE_LIMIT = int(os.environ.get("JARVISOPS_TENANT_QUEUE_LIMIT", "100"))
+RUN_QUEUE_LIMIT = int(os.environ.get("JARVISOPS_RUN_QUEUE_LIMIT", "1000"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop = threading.Event()
+    threading.Thread(target=_compact_loop, args=(stop,), daemon=True).start()
+    if storage_log is not None:
+        threading.Thread(target=_snapshot_loop, args=(stop,), daemon=True).start()
+    yield
+    stop.set()
+    await plan_executor.shutdown()
+    if storage_log is not None:
+        checkpoint(storage_log, job_storage, memory_storage)
+        storage_log.close()
+
 app = FastAPI(
     title="JarvisOps Secure",
     version="1.0.0",
-    description="Secure job orchestration system with MIT/Harvard compliance"
+    description="Secure job orchestration system with MIT/Harvard compliance",
+    lifespan=lifespan
 )
 
 # Secure CORS configuration
@@ -42,15 +99,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_storage: Dict[str, List[float]] = {}
+# Sliding-window rate limiting; set RATE_LIMIT_REDIS_URL to share budgets across replicas
+rate_limiter = RateLimiter(
+    RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW,
+    backend=make_backend(os.environ.get("RATE_LIMIT_REDIS_URL"), RATE_LIMIT_WINDOW)
+)
 
 # Data models following MIT representation invariants
-@dataclass
+@dataclass(slots=True)
 class JobState:
-    """Immutable job state following MIT invariants"""
+    """Immutable job state following MIT invariants (replaced, never mutated)"""
     id: str
-    state: str  # PLANNED, RUNNING, COMPLETED, FAILED
+    state: str  # PLANNED, QUEUED, RUNNING, COMPLETED, FAILED
     created: datetime
     started: Optional[datetime] = None
     completed: Optional[datetime] = None
@@ -59,8 +119,8 @@ class JobState:
     
     def __post_init__(self):
         # Validate job state transitions per MIT invariants
-        if self.state == "PLANNED" and (self.started or self.completed):
-            raise ValueError("PLANNED jobs cannot have started/completed times")
+        if self.state in ("PLANNED", "QUEUED") and (self.started or self.completed):
+            raise ValueError(f"{self.state} jobs cannot have started/completed times")
         if self.state == "RUNNING" and not self.started:
             raise ValueError("RUNNING jobs must have started time")
         if self.state == "COMPLETED" and (not self.started or not self.completed):
@@ -75,6 +135,8 @@ class MemoryEntry:
     timestamp: datetime
     scope: str
     entry_id: str
+    embedding: Optional[List[float]] = None
+    seq: int = 0  # position in the scope, assigned when the entry is committed
     
     def __post_init__(self):
         if not self.content or not self.scope:
@@ -82,31 +144,56 @@ class MemoryEntry:
 
 # Secure storage with proper isolation
 class SecureJobStorage:
-    """Thread-safe job storage with MIT invariant preservation"""
+    """Thread-safe job storage with MIT invariant preservation
+
+    Jobs are hash-partitioned by ID across shards, each with its own lock for
+    writers. Records are never mutated in place, only replaced, so readers
+    take no lock: a dict lookup returns either the old or the new JobState.
+    """
     
-    def __init__(self):
-        self._jobs: Dict[str, JobState] = {}
-        self._lock = threading.Lock()
+    def __init__(self, shards: int = 64, log: Optional[SegmentLog] = None,
+                 events: Optional[JobEventBus] = None):
+        if shards < 1 or shards & (shards - 1):
+            raise ValueError("shards must be a power of two")
+        self._mask = shards - 1
+        self._shards: List[Dict[str, JobState]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._log = log
+        self._events = events
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+    
+    def _index(self, job_id: str) -> int:
+        return hash(job_id) & self._mask
     
-    def create_job(self, job_id: str, state: str = "PLANNED") -> JobState:
+    def create_job(self, job_id: str, state: str = "PLANNED", started: Optional[datetime] = None,
+                   result: Optional[Dict] = None) -> JobState:
         """Create new job with proper validation"""
-        with self._lock:
-            if job_id in self._jobs:
+        i = self._index(job_id)
+        shard = self._shards[i]
+        with self._locks[i]:
+            if job_id in shard:
                 raise ValueError(f"Job {job_id} already exists")
             
             job = JobState(
                 id=job_id,
                 state=state,
-                created=datetime.utcnow()
+                created=datetime.utcnow(),
+                started=started,
+                result=result
             )
-            self._jobs[job_id] = job
-            return job
+            shard[job_id] = job
+            # Logged under the shard lock so log order matches apply order
+            seq = self._log.append(_job_record(job)) if self._log else 0
+        if seq:
+            self._log.wait(seq)
+        self._publish(job)
+        return job
     
     def get_job(self, job_id: str) -> Optional[JobState]:
-        """Get job by ID (immutable copy)"""
-        with self._lock:
-            job = self._jobs.get(job_id)
-            return job
+        """Get job by ID (immutable snapshot, lock-free)"""
+        return self._shards[hash(job_id) & self._mask].get(job_id)
     
     def update_job_state(self, job_id: str, new_state: str, 
                         started: Optional[datetime] = None,
@@ -114,12 +201,13 @@ class SecureJobStorage:
                         result: Optional[Dict] = None,
                         error_message: Optional[str] = None) -> JobState:
         """Update job state with invariant preservation"""
-        with self._lock:
-            if job_id not in self._jobs:
+        i = self._index(job_id)
+        shard = self._shards[i]
+        with self._locks[i]:
+            old_job = shard.get(job_id)
+            if old_job is None:
                 raise ValueError(f"Job {job_id} not found")
             
-            old_job = self._jobs[job_id]
-            
             # Validate state transitions
             if old_job.state == "COMPLETED" and new_state != "COMPLETED":
                 raise ValueError("Cannot modify completed jobs")
@@ -134,46 +222,448 @@ class SecureJobStorage:
                 error_message=error_message or old_job.error_message
             )
             
-            self._jobs[job_id] = new_job
-            return new_job
+            shard[job_id] = new_job
+            seq = self._log.append(_job_record(new_job)) if self._log else 0
+        if seq:
+            self._log.wait(seq)
+        self._publish(new_job)
+        return new_job
+    
+    def _publish(self, job: JobState) -> None:
+        # After the change is durable, so pushed state never runs ahead of the log
+        if self._events is not None and self._events.watching(job.id):
+            self._events.publish(job.id, job_dict(job))
+    
+    def restore(self, job: JobState) -> None:
+        """Install a recovered job without logging it again"""
+        self._shards[self._index(job.id)][job.id] = job
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Per-scope memory limits; None means unlimited"""
+    max_entries: Optional[int] = None
+    max_age_seconds: Optional[float] = None
+    max_bytes: Optional[int] = None
+    
+    @property
+    def unlimited(self) -> bool:
+        return self.max_entries is None and self.max_age_seconds is None and self.max_bytes is None
 
 class SecureMemoryStorage:
-    """Thread-safe memory storage with scope isolation"""
+    """Thread-safe memory storage with scope isolation
+    
+    Each scope is an append-only list in commit order, so timestamps and
+    sequence numbers both increase along it and retention only ever removes
+    a prefix. Entry and byte totals are maintained as entries come and go.
+    """
     
-    def __init__(self):
+    def __init__(self, log: Optional[SegmentLog] = None,
+                 default_policy: RetentionPolicy = RetentionPolicy(), clock=datetime.utcnow):
         self._memory: Dict[str, List[MemoryEntry]] = {}
+        self._next_seq: Dict[str, int] = {}
+        self._bytes: Dict[str, int] = {}
+        self._policies: Dict[str, RetentionPolicy] = {}
         self._lock = threading.Lock()
+        self._log = log
+        self._clock = clock
+        self.default_policy = default_policy
+        self.entry_count = 0
+        self.byte_count = 0
+        self.index = MemoryIndex()
+    
+    def append_entries(self, scope: str, entries: List[Dict], index_timeout: Optional[float] = None) -> bool:
+        """Append memory entries with proper validation
+        
+        Waits up to index_timeout seconds (None: until done) for the entries
+        to become searchable; returns whether they are.
+        """
+        embeddings = list(self._embeddings(scope, entries))
+        contents = [entry_data.get("content", "") for entry_data in entries]
+        indexed = self._append(scope, contents, embeddings)
+        # Small appends stay searchable as soon as they return, unless the
+        # indexer is still working through a backlog such as a bulk load
+        return indexed.wait(index_timeout)
     
-    def append_entries(self, scope: str, entries: List[Dict]) -> None:
-        """Append memory entries with proper validation"""
+    def _embeddings(self, scope: str, entries: List[Dict]) -> Iterator[Optional[List[float]]]:
+        """Validate optional per-entry embeddings before anything is stored"""
+        dim = self.index.vector_dim(scope)
+        vectors = []
+        for entry_data in entries:
+            vector, dim = check_embedding(entry_data.get("embedding"), dim)
+            vectors.append(vector)
+        return iter(vectors)
+    
+    def append_batch(self, scope: str, contents: List[str],
+                     embeddings: List[Optional[List[float]]]) -> int:
+        """Commit pre-validated entries with one lock hold and one log record
+        
+        Indexing is left to the background indexer, so search catches up
+        shortly after a bulk load.
+        """
+        self._append(scope, contents, embeddings)
+        return len(contents)
+    
+    def _append(self, scope: str, contents: List[str],
+                embeddings: List[Optional[List[float]]]) -> threading.Event:
+        # IDs come from a single block and entries are built before the lock
+        # is taken; the batch shares one timestamp
+        timestamp = self._clock()
+        batch = [MemoryEntry(content=content, timestamp=timestamp, scope=scope,
+                             entry_id=entry_id, embedding=embedding)
+                 for content, entry_id, embedding in zip(contents, allocate_ids(len(contents)), embeddings)]
+        seq = 0
         with self._lock:
-            if scope not in self._memory:
-                self._memory[scope] = []
-            
-            for entry_data in entries:
-                entry = MemoryEntry(
-                    content=entry_data.get("content", ""),
-                    timestamp=datetime.utcnow(),
-                    scope=scope,
-                    entry_id=str(uuid.uuid4())
-                )
-                self._memory[scope].append(entry)
+            scope_entries = self._memory.get(scope)
+            if scope_entries and scope_entries[-1].timestamp > timestamp:
+                # Timestamps never go backwards within a scope, so time ranges
+                # can be found by bisection
+                for entry in batch:
+                    entry.timestamp = scope_entries[-1].timestamp
+            self._commit(scope, batch)
+            if self._log:
+                seq = self._log.append(_memory_batch_record(scope, batch))
+        indexed = self.index.add_later(batch)
+        if seq:
+            self._log.wait(seq)
+        return indexed
+    
+    def _commit(self, scope: str, batch: List[MemoryEntry]) -> None:
+        """Number and store entries; caller holds the lock"""
+        seq = self._next_seq.get(scope, 0)
+        size = 0
+        for entry in batch:
+            entry.seq = seq
+            seq += 1
+            size += _size(entry)
+        self._next_seq[scope] = seq
+        self._memory.setdefault(scope, []).extend(batch)
+        self._bytes[scope] = self._bytes.get(scope, 0) + size
+        self.entry_count += len(batch)
+        self.byte_count += size
     
     def get_entries(self, scope: str) -> List[Dict]:
         """Get memory entries (deep copy for isolation)"""
         with self._lock:
             entries = self._memory.get(scope, [])
             return [asdict(entry) for entry in entries]
+    
+    def scope_stats(self, scope: str) -> Tuple[int, int]:
+        """(entries, content bytes) currently held for a scope"""
+        with self._lock:
+            return len(self._memory.get(scope, ())), self._bytes.get(scope, 0)
+    
+    def bounds(self, scope: str, start: int = 0, since: Optional[datetime] = None,
+               until: Optional[datetime] = None) -> Tuple[int, int]:
+        """Sequence numbers [start, stop) of a scope's entries within a time range"""
+        with self._lock:
+            entries = self._memory.get(scope, [])
+            first = entries[0].seq if entries else self._next_seq.get(scope, 0)
+            lo, hi = max(start - first, 0), len(entries)
+            if since is not None:
+                lo = max(lo, bisect.bisect_left(entries, since, key=_timestamp))
+            if until is not None:
+                hi = bisect.bisect_right(entries, until, lo=min(lo, hi), key=_timestamp)
+            return first + min(lo, hi), first + hi
+    
+    def iter_entries(self, scope: str, start: int, stop: int,
+                     chunk_size: int = 1000) -> Iterator[List[MemoryEntry]]:
+        """Yield entries with sequence numbers in [start, stop) a chunk at a time,
+        locking only to slice; entries removed by retention meanwhile are skipped"""
+        position = start
+        while position < stop:
+            with self._lock:
+                entries = self._memory.get(scope, [])
+                first = entries[0].seq if entries else position
+                lo = max(position - first, 0)
+                chunk = entries[lo:lo + min(chunk_size, stop - position)]
+            if not chunk or chunk[0].seq >= stop:
+                return
+            yield chunk
+            position = chunk[-1].seq + 1
+    
+    def policy(self, scope: str) -> RetentionPolicy:
+        return self._policies.get(scope, self.default_policy)
+    
+    def set_policy(self, scope: str, policy: RetentionPolicy) -> int:
+        """Set a scope's retention policy and apply it; returns entries removed"""
+        seq = 0
+        with self._lock:
+            self._policies[scope] = policy
+            if self._log:
+                seq = self._log.append(_policy_record(scope, policy))
+        if seq:
+            self._log.wait(seq)
+        return self._compact_scope(scope, self._clock())
+    
+    def compact(self) -> int:
+        """Apply every scope's retention policy; returns entries removed"""
+        now = self._clock()
+        return sum(self._compact_scope(scope, now) for scope in list(self._memory))
+    
+    def _compact_scope(self, scope: str, now: datetime) -> int:
+        policy = self.policy(scope)
+        if policy.unlimited:
+            return 0
+        seq = 0
+        with self._lock:
+            entries = self._memory.get(scope)
+            if not entries:
+                return 0
+            drop = 0
+            if policy.max_entries is not None:
+                drop = max(drop, len(entries) - policy.max_entries)
+            if policy.max_age_seconds is not None:
+                cutoff = now - timedelta(seconds=policy.max_age_seconds)
+                drop = max(drop, bisect.bisect_left(entries, cutoff, key=_timestamp))
+            dropped_bytes = sum(_size(entry) for entry in entries[:drop])
+            if policy.max_bytes is not None:
+                while drop < len(entries) and self._bytes[scope] - dropped_bytes > policy.max_bytes:
+                    dropped_bytes += _size(entries[drop])
+                    drop += 1
+            if not drop:
+                return 0
+            self._remove_prefix(scope, drop, dropped_bytes)
+            floor = self._next_seq[scope] if not entries else entries[0].seq
+            if self._log:
+                seq = self._log.append(["mc", scope, drop])
+        self.index.discard_before(scope, floor)
+        if seq:
+            self._log.wait(seq)
+        return drop
+    
+    def _remove_prefix(self, scope: str, count: int, size: Optional[int] = None) -> None:
+        """Drop a scope's oldest entries; caller holds the lock"""
+        entries = self._memory[scope]
+        if size is None:
+            size = sum(_size(entry) for entry in entries[:count])
+        del entries[:count]
+        self._bytes[scope] -= size
+        self.entry_count -= count
+        self.byte_count -= size
+    
+    def restore(self, entry: MemoryEntry) -> None:
+        """Install a recovered entry without logging it again (see reindex)"""
+        self._commit(entry.scope, [entry])
+    
+    def restore_removal(self, scope: str, count: int) -> None:
+        self._remove_prefix(scope, min(count, len(self._memory.get(scope, ()))))
+    
+    def restore_policy(self, scope: str, policy: RetentionPolicy) -> None:
+        self._policies[scope] = policy
+    
+    def restore_sequence(self, scope: str, first_seq: int) -> None:
+        """Number a recovered scope's next entry first_seq, as it was before the snapshot"""
+        self._next_seq[scope] = max(self._next_seq.get(scope, 0), first_seq)
+    
+    def reindex(self, chunk_size: int = 10_000) -> None:
+        """Queue every stored entry for indexing, e.g. after recovery"""
+        with self._lock:
+            scopes = [list(entries) for entries in self._memory.values()]
+        for entries in scopes:
+            for first in range(0, len(entries), chunk_size):
+                self.index.add_later(entries[first:first + chunk_size])
+
+def _size(entry: MemoryEntry) -> int:
+    return len(entry.content.encode())
+
+def check_embedding(vector, dim: Optional[int]) -> Tuple[Optional[List[float]], Optional[int]]:
+    """Validate an entry's optional embedding against the scope's dimension"""
+    if vector is None:
+        return None, dim
+    if not isinstance(vector, list) or not vector or not all(
+            isinstance(x, (int, float)) and not isinstance(x, bool) for x in vector):
+        raise ValueError("embedding must be a non-empty list of numbers")
+    if dim is None:
+        if not vector_search_available():
+            raise ValueError("vector search is not available (numpy is not installed)")
+        dim = len(vector)
+    if len(vector) != dim:
+        raise ValueError(f"embedding must have dimension {dim}")
+    return [float(x) for x in vector], dim
+
+def allocate_ids(count: int) -> List[str]:
+    """A block of UUID4-formatted IDs from one random draw plus a counter"""
+    prefix = uuid.uuid4().hex
+    head = f"{prefix[:8]}-{prefix[8:12]}-{prefix[12:16]}-{prefix[16:20]}-"
+    start = int(prefix[20:], 16)
+    return [f"{head}{(start + i) & 0xFFFFFFFFFFFF:012x}" for i in range(count)]
+
+def job_dict(job: JobState) -> Dict:
+    """JSON-ready form of a job, as returned by /v1/jobs/{job_id} and pushed to subscribers"""
+    return {
+        "id": job.id,
+        "status": job.state,
+        "created": job.created.isoformat(),
+        "started": job.started.isoformat() if job.started else None,
+        "completed": job.completed.isoformat() if job.completed else None,
+        "result": job.result,
+        "error_message": job.error_message
+    }
+
+def _timestamp(entry: MemoryEntry) -> datetime:
+    return entry.timestamp
+
+def entry_dict(entry: MemoryEntry) -> Dict:
+    """JSON-ready form of an entry, without asdict()'s recursive deep copy"""
+    return {"content": entry.content, "timestamp": entry.timestamp.isoformat(),
+            "scope": entry.scope, "entry_id": entry.entry_id}
+
+# Log records are JSON arrays; a job record always carries the full state,
+# so replay keeps only the last one per job
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _from_iso(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+def _job_record(job: JobState) -> list:
+    return ["j", job.id, job.state, job.created.isoformat(), _iso(job.started),
+            _iso(job.completed), job.result, job.error_message]
+
+def _memory_record(entry: MemoryEntry) -> list:
+    record = ["m", entry.scope, entry.entry_id, entry.timestamp.isoformat(), entry.content]
+    if entry.embedding is not None:
+        record.append(entry.embedding)
+    return record
+
+def _memory_batch_record(scope: str, batch: List[MemoryEntry]) -> list:
+    # Entries committed together share scope and timestamp, so log them as one record
+    return ["mb", scope, batch[0].timestamp.isoformat(),
+            [[e.entry_id, e.content] if e.embedding is None else [e.entry_id, e.content, e.embedding]
+             for e in batch]]
+
+def _policy_record(scope: str, policy: RetentionPolicy) -> list:
+    return ["mp", scope, policy.max_entries, policy.max_age_seconds, policy.max_bytes]
+
+def _sequence_record(scope: str, first_seq: int) -> list:
+    # Snapshots hold only the entries retention kept, so each scope's entries
+    # are preceded by the sequence number of the first of them
+    return ["ms", scope, first_seq]
+
+def recover_storage(log: SegmentLog, jobs: SecureJobStorage, memory: SecureMemoryStorage) -> int:
+    """Rebuild both stores from the latest snapshot and the log; returns records replayed"""
+    latest: Dict[str, list] = {}
+    count = 0
+    for record in log.recover():
+        count += 1
+        if record[0] == "j":
+            latest[record[1]] = record
+        elif record[0] == "m":
+            scope, entry_id, timestamp, content = record[1:5]
+            memory.restore(MemoryEntry(content=content, timestamp=datetime.fromisoformat(timestamp),
+                                       scope=scope, entry_id=entry_id,
+                                       embedding=record[5] if len(record) > 5 else None))
+        elif record[0] == "mb":
+            _, scope, timestamp, items = record
+            timestamp = datetime.fromisoformat(timestamp)
+            for item in items:
+                memory.restore(MemoryEntry(content=item[1], timestamp=timestamp, scope=scope,
+                                           entry_id=item[0], embedding=item[2] if len(item) > 2 else None))
+        elif record[0] == "mc":
+            memory.restore_removal(record[1], record[2])
+        elif record[0] == "mp":
+            memory.restore_policy(record[1], RetentionPolicy(*record[2:5]))
+        elif record[0] == "ms":
+            memory.restore_sequence(record[1], record[2])
+    memory.reindex()
+    for _, job_id, state, created, started, completed, result, error_message in latest.values():
+        jobs.restore(JobState(id=job_id, state=state, created=datetime.fromisoformat(created),
+                              started=_from_iso(started), completed=_from_iso(completed),
+                              result=result, error_message=error_message))
+    return count
+
+def checkpoint(log: SegmentLog, jobs: SecureJobStorage, memory: SecureMemoryStorage) -> None:
+    """Snapshot both stores at one point in the log and drop the segments it covers"""
+    # Writers log under their storage lock, so holding every lock while the
+    # log rotates gives a cut with each change on exactly one side of it.
+    # Only reference copies happen under the locks; encoding happens after.
+    with ExitStack() as stack:
+        for lock in jobs._locks + [memory._lock]:
+            stack.enter_context(lock)
+        segment = log.rotate()
+        job_list = [job for shard in jobs._shards for job in shard.values()]
+        entry_lists = {scope: list(entries) for scope, entries in memory._memory.items()}
+        next_seqs = dict(memory._next_seq)
+        policies = list(memory._policies.items())
+    records = itertools.chain(
+        (_job_record(job) for job in job_list),
+        (_policy_record(scope, policy) for scope, policy in policies),
+        itertools.chain.from_iterable(
+            itertools.chain([_sequence_record(scope, next_seq - len(entry_lists.get(scope, ())))],
+                            map(_memory_record, entry_lists.get(scope, ())))
+            for scope, next_seq in next_seqs.items()
+        )
+    )
+    log.write_snapshot(segment, records)
+
+def fail_interrupted_runs(jobs: SecureJobStorage) -> int:
+    """Fail runs that were queued or still executing when the process stopped"""
+    interrupted = [job for shard in jobs._shards for job in shard.values()
+                   if job.state in ("QUEUED", "RUNNING") and job.result and "steps" in job.result]
+    for job in interrupted:
+        jobs.update_job_state(job.id, "FAILED", started=job.started or datetime.utcnow(),
+                              error_message="interrupted by restart")
+    return len(interrupted)
+
+def _snapshot_loop(stop: threading.Event) -> None:
+    written = storage_log.appended
+    while not stop.wait(SNAPSHOT_INTERVAL):
+        if storage_log.appended != written:
+            written = storage_log.appended
+            try:
+                checkpoint(storage_log, job_storage, memory_storage)
+            except Exception as e:
+                logger.error(f"Snapshot error: {e}")
+
+def _compact_loop(stop: threading.Event) -> None:
+    while not stop.wait(COMPACT_INTERVAL):
+        try:
+            removed = memory_storage.compact()
+            if removed:
+                logger.info(f"Memory retention removed {removed} entries")
+        except Exception as e:
+            logger.error(f"Memory compaction error: {e}")
 
 # Initialize secure storage
-job_storage = SecureJobStorage()
-memory_storage = SecureMemoryStorage()
+storage_log = SegmentLog(DATA_DIR, fsync=os.environ.get("JARVISOPS_FSYNC", "1") != "0") if DATA_DIR else None
+job_events = JobEventBus()
+# Responses to /v1/plan and /v1/run by Idempotency-Key, so client retries do not start duplicate jobs
+idempotency_cache = IdempotencyCache(
+    max_entries=_env_number("JARVISOPS_IDEMPOTENCY_KEYS", int) or 10_000,
+    ttl=_env_number("JARVISOPS_IDEMPOTENCY_TTL", float) or 24 * 3600
+)
+job_storage = SecureJobStorage(log=storage_log, events=job_events)
+memory_storage = SecureMemoryStorage(log=storage_log, default_policy=RetentionPolicy(
+    max_entries=_env_number("JARVISOPS_MEMORY_MAX_ENTRIES", int),
+    max_age_seconds=_env_number("JARVISOPS_MEMORY_MAX_AGE", float),
+    max_bytes=_env_number("JARVISOPS_MEMORY_MAX_BYTES", int)
+))
+if storage_log is not None:
+    _started = time.perf_counter()
+    _replayed = recover_storage(storage_log, job_storage, memory_storage)
+    logger.info(f"Recovered {_replayed} records from {DATA_DIR} in {time.perf_counter() - _started:.2f}s")
+    _interrupted = fail_interrupted_runs(job_storage)
+    if _interrupted:
+        logger.warning(f"Marked {_interrupted} runs interrupted by restart as FAILED")
+plan_executor = PlanExecutor(job_storage, workers=STEP_WORKERS, scheduler=FairScheduler(
+    MAX_RUNNING_PLANS, TENANT_QUEUE_LIMIT, RUN_QUEUE_LIMIT,
+    tenant_weights=parse_weights(os.environ.get("JARVISOPS_TENANT_WEIGHTS"))
+))
 
 # Input validation models
+class PlanStep(BaseModel):
+    """One step of a plan: an action run once the steps it depends on succeed"""
+    name: str = Field(..., min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
+    action: str = Field(..., min_length=1, max_length=64)
+    depends_on: List[str] = Field(default_factory=list, max_length=100)
+    params: Dict = Field(default_factory=dict)
+
 class PlanRequest(BaseModel):
     """Validated plan request"""
     goal: str = Field(..., min_length=1, max_length=500)
     parameters: Optional[Dict] = Field(default_factory=dict)
+    steps: Optional[List[PlanStep]] = Field(default=None, min_length=1, max_length=100)
+    max_concurrency: int = Field(default=4, ge=1, le=64)
     
     @validator('goal')
     def validate_goal(cls, v):
@@ -185,6 +675,7 @@ class PlanRequest(BaseModel):
 class RunRequest(BaseModel):
     """Validated run request"""
     plan_id: str = Field(..., min_length=1)
+    priority: str = Field(default="normal", pattern="^(high|normal|low)$")
     
     @validator('plan_id')
     def validate_plan_id(cls, v):
@@ -205,6 +696,32 @@ class MemoryAppendRequest(BaseModel):
             raise ValueError("Invalid scope format")
         return v
 
+class MemorySearchRequest(BaseModel):
+    """Validated memory search request: a text query or an embedding"""
+    scope: str = Field(default="global", min_length=1, max_length=100)
+    query: Optional[str] = Field(default=None, min_length=1, max_length=1000)
+    vector: Optional[List[float]] = Field(default=None, min_length=1, max_length=4096)
+    limit: int = Field(default=10, ge=1, le=100)
+    
+    @validator('scope')
+    def validate_scope(cls, v):
+        if not v.replace('_', '').replace('-', '').isalnum():
+            raise ValueError("Invalid scope format")
+        return v
+
+class RetentionPolicyRequest(BaseModel):
+    """Retention limits for a scope; omitted limits are unlimited"""
+    scope: str = Field(default="global", min_length=1, max_length=100)
+    max_entries: Optional[int] = Field(default=None, ge=1)
+    max_age_seconds: Optional[float] = Field(default=None, gt=0)
+    max_bytes: Optional[int] = Field(default=None, ge=1)
+
+    @validator('scope')
+    def validate_scope(cls, v):
+        if not v.replace('_', '').replace('-', '').isalnum():
+            raise ValueError("Invalid scope format")
+        return v
+
 # Security utilities
 def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """Verify JWT token (simplified for demo)"""
@@ -216,22 +733,13 @@ def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(securit
 
 def check_rate_limit(request: Request) -> None:
     """Check rate limiting"""
-    client_ip = request.client.host
-    now = time.time()
-    
-    if client_ip not in rate_limit_storage:
-        rate_limit_storage[client_ip] = []
-    
-    # Clean old requests
-    rate_limit_storage[client_ip] = [
-        req_time for req_time in rate_limit_storage[client_ip]
-        if now - req_time < RATE_LIMIT_WINDOW
-    ]
-    
-    if len(rate_limit_storage[client_ip]) >= RATE_LIMIT_REQUESTS:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-    
-    rate_limit_storage[client_ip].append(now)
+    result = rate_limiter.hit(request.client.host)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, int(result.retry_after + 0.999)))}
+        )
 
 def validate_request_size(request: Request) -> None:
     """Validate request size"""
@@ -254,10 +762,20 @@ async def security_middleware(request: Request, call_next):
         response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
         
         return response
+    except HTTPException as e:
+        # Exceptions raised here bypass FastAPI's handlers, so answer directly
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
     except Exception as e:
         logger.error(f"Security middleware error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Outermost, so request timings include the security checks
+http_metrics = instrument(app, "jarvisops")
+# Off unless PROFILING_ENABLED or PROFILING_SAMPLE_RATE is set; X-Profile: 1 also needs PROFILING_HEADER_ENABLED
+profiler = install_profiling(app, dependencies=[Depends(verify_jwt_token)])
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
+
 @app.get("/healthz")
 async def healthz():
     """Health check endpoint"""
@@ -272,71 +790,120 @@ async def readyz():
 async def metrics():
     """Metrics endpoint with proper data"""
     return {
-        "latency_p95_ms": 100,
-        "error_rate": 0.0,
-        "active_jobs": len(job_storage._jobs),
-        "memory_entries": sum(len(entries) for entries in memory_storage._memory.values()),
+        **http_metrics.summary(),
+        "active_jobs": len(job_storage),
+        "running_plans": plan_executor.active,
+        "run_queue": plan_executor.scheduler.stats(),
+        "event_subscribers": job_events.subscribers,
+        "idempotent_replays": idempotency_cache.replayed + idempotency_cache.coalesced,
+        "memory_entries": memory_storage.entry_count,
+        "memory_bytes": memory_storage.byte_count,
+        "memory_index_pending": memory_storage.index.pending,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 @app.post("/v1/plan")
 async def create_plan(
     request: PlanRequest,
+    http_request: Request,
+    response: Response,
     token: str = Depends(verify_jwt_token)
 ):
-    """Create execution plan with proper validation"""
+    """Create execution plan with proper validation
+    
+    Without explicit steps the plan is the fixed ingest -> curate -> build ->
+    eval pipeline. The plan is stored on its PLANNED job for /v1/run. A retry
+    with the same Idempotency-Key returns the first plan.
+    """
+    steps = [step.model_dump() for step in request.steps] if request.steps else default_plan()
     try:
-        plan_id = str(uuid.uuid4())
-        job = job_storage.create_job(plan_id, "PLANNED")
-        
-        # Log security event
-        logger.info(f"Plan created: {plan_id} by token: {token[:8]}...")
-        
-        return {
-            "plan_id": plan_id,
-            "steps": ["ingest", "curate", "build", "eval"],
-            "requires_approval": False,
-            "created": job.created.isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Plan creation error: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+        order = validate_plan(steps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def create() -> Dict:
+        try:
+            plan_id = str(uuid.uuid4())
+            job = job_storage.create_job(plan_id, "PLANNED", result={
+                "goal": request.goal, "steps": steps, "max_concurrency": request.max_concurrency})
+            
+            # Log security event
+            logger.info(f"Plan created: {plan_id} by token: {token[:8]}...")
+            
+            return {
+                "plan_id": plan_id,
+                "steps": order,
+                "dependencies": {step["name"]: step["depends_on"] for step in steps},
+                "max_concurrency": request.max_concurrency,
+                "requires_approval": False,
+                "created": job.created.isoformat()
+            }
+        except Exception as e:
+            logger.error(f"Plan creation error: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+    
+    # create_job waits for the log to be synced; off the event loop, concurrent requests share one fsync
+    return await idempotent(idempotency_cache, http_request, response,
+                            lambda: run_in_threadpool(create), tenant=tenant_key(token))
 
 @app.post("/v1/run")
 async def run_plan(
     request: RunRequest,
+    http_request: Request,
+    response: Response,
     token: str = Depends(verify_jwt_token)
 ):
-    """Execute plan with proper validation"""
+    """Queue a plan for execution; poll /v1/jobs/{job_id} for per-step progress
+    
+    Runs are started in fair-share order across tenants (bearer tokens) and
+    priority classes. A tenant with too many queued runs gets 429 with a
+    Retry-After estimated from the queue ahead of it. Retries with the same
+    Idempotency-Key, including ones sent while the first is still being
+    queued, return the first run instead of starting another.
+    """
+    tenant = tenant_key(token)
+    return await idempotent(idempotency_cache, http_request, response,
+                            lambda: _queue_run(request, tenant), tenant=tenant)
+
+async def _queue_run(request: RunRequest, tenant: str) -> Dict:
     try:
         # Validate plan exists
         plan_job = job_storage.get_job(request.plan_id)
         if not plan_job:
             raise HTTPException(status_code=404, detail="Plan not found")
         
-        if plan_job.state != "PLANNED":
+        if plan_job.state != "PLANNED" or not plan_job.result or "goal" not in plan_job.result:
             raise HTTPException(status_code=400, detail="Plan not in valid state")
         
-        # Create run job
-        run_id = str(uuid.uuid4())
-        run_job = job_storage.create_job(run_id, "RUNNING")
+        # The place is taken before awaiting, so concurrent requests cannot all pass the check
+        scheduler = plan_executor.scheduler
+        try:
+            scheduler.reserve(tenant)
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=f"{e}, retry later",
+                                headers={"Retry-After": str(e.retry_after)})
         
-        # Update to completed (simplified for demo)
-        completed_job = job_storage.update_job_state(
-            run_id, "COMPLETED",
-            started=datetime.utcnow(),
-            completed=datetime.utcnow(),
-            result={"status": "success", "plan_id": request.plan_id}
-        )
+        plan = plan_job.result
+        run_id = str(uuid.uuid4())
+        steps = {step["name"]: {"state": "PENDING"} for step in plan["steps"]}
+        try:
+            run_job = await run_in_threadpool(job_storage.create_job, run_id, "QUEUED", None, {
+                "plan_id": request.plan_id, "priority": request.priority, "steps": steps})
+        except BaseException:
+            scheduler.release(tenant)
+            raise
+        plan_executor.submit(run_id, request.plan_id, plan["steps"], plan["max_concurrency"],
+                             tenant, request.priority, reserved=True)
         
         # Log security event
-        logger.info(f"Plan executed: {run_id} for plan: {request.plan_id}")
+        logger.info(f"Plan queued: {run_id} for plan: {request.plan_id} at priority {request.priority}")
         
         return {
             "job_id": run_id,
-            "status": "COMPLETED",
-            "started": completed_job.started.isoformat(),
-            "completed": completed_job.completed.isoformat()
+            "status": run_job.state,
+            "priority": request.priority,
+            "tenant_queued": plan_executor.scheduler.depth(tenant),
+            "created": run_job.created.isoformat()
         }
     except HTTPException:
         raise
@@ -358,15 +925,7 @@ async def get_job(
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        return {
-            "id": job.id,
-            "status": job.state,
-            "created": job.created.isoformat(),
-            "started": job.started.isoformat() if job.started else None,
-            "completed": job.completed.isoformat() if job.completed else None,
-            "result": job.result,
-            "error_message": job.error_message
-        }
+        return job_dict(job)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid job ID format")
     except HTTPException:
@@ -375,6 +934,54 @@ async def get_job(
         logger.error(f"Job retrieval error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+TERMINAL_STATES = ("COMPLETED", "FAILED")
+
+def _job_terminal(event: Dict) -> bool:
+    return event["status"] in TERMINAL_STATES
+
+def _job_snapshot(job_id: str):
+    def snapshot() -> Optional[Dict]:
+        job = job_storage.get_job(job_id)
+        return job_dict(job) if job else None
+    return snapshot
+
+def _known_job(job_id: str) -> bool:
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return False
+    return job_storage.get_job(job_id) is not None
+
+@app.get("/v1/jobs/{job_id}/events")
+async def job_events_stream(
+    job_id: str,
+    token: str = Depends(verify_jwt_token)
+):
+    """Server-sent events: the job's status now and after every change, until it finishes"""
+    if not _known_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(sse_events(job_events, job_id, _job_snapshot(job_id), _job_terminal),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.websocket("/v1/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket push of the job's status, as /v1/jobs/{job_id}/events
+    
+    Browsers cannot set headers on WebSockets, so the bearer token may also
+    be passed as the access_token query parameter.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else \
+        websocket.query_params.get("access_token", "")
+    if not token or len(token) < 10:
+        await websocket.close(code=1008)
+        return
+    if not _known_job(job_id):
+        await websocket.close(code=1008, reason="Job not found")
+        return
+    await websocket.accept()
+    await stream_websocket(websocket, job_events, job_id, _job_snapshot(job_id), _job_terminal)
+
 @app.post("/v1/memory/append")
 async def append_memory(
     request: MemoryAppendRequest,
@@ -382,30 +989,276 @@ async def append_memory(
 ):
     """Append memory entries with proper validation"""
     try:
-        memory_storage.append_entries(request.scope, request.entries)
+        # Waits for the log to be synced, so keep it off the event loop
+        indexed = await run_in_threadpool(memory_storage.append_entries, request.scope, request.entries,
+                                          INDEX_WAIT_SECONDS)
         
         # Log security event
         logger.info(f"Memory appended: {len(request.entries)} entries to scope: {request.scope}")
         
-        return {"ok": True, "entries_added": len(request.entries)}
+        # index_pending: stored, but not yet returned by /v1/memory/search
+        return {"ok": True, "entries_added": len(request.entries), "index_pending": not indexed}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Memory append error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+BULK_BLOCK_BYTES = 1024 * 1024  # NDJSON bytes decoded and committed at a time, and the longest line
+BULK_CHUNK = 10_000             # msgpack entries committed at a time
+BULK_MAX_ERRORS = 20
+_BLANK = object()
+
+def _decode_ndjson(block: bytes) -> List:
+    """Decode a block of NDJSON lines; undecodable lines become None, blank ones _BLANK"""
+    try:
+        # json.loads handles the whole block in one call when every line is well formed
+        objects = json.loads(b"[" + block.replace(b"\n", b",") + b"]")
+        if len(objects) == block.count(b"\n") + 1:
+            return objects
+    except ValueError:
+        pass
+    objects = []
+    for line in block.split(b"\n"):
+        if not line.strip():
+            objects.append(_BLANK)
+            continue
+        try:
+            objects.append(json.loads(line))
+        except ValueError:
+            objects.append(None)
+    return objects
+
+class BulkLineTooLong(Exception):
+    """An NDJSON line longer than BULK_BLOCK_BYTES"""
+
+async def _ndjson_batches(stream) -> AsyncIterator[List]:
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer += chunk
+        if len(buffer) >= BULK_BLOCK_BYTES:
+            end = buffer.rfind(b"\n")
+            if end < 0:
+                # A whole block without a newline: the line would grow without bound
+                raise BulkLineTooLong(f"NDJSON lines must be under {BULK_BLOCK_BYTES} bytes")
+            block = bytes(buffer[:end])
+            del buffer[:end + 1]
+            yield await run_in_threadpool(_decode_ndjson, block)
+    if buffer.strip():
+        yield await run_in_threadpool(_decode_ndjson, bytes(buffer.rstrip(b"\r\n")))
+
+async def _msgpack_batches(stream, msgpack) -> AsyncIterator[List]:
+    unpacker = msgpack.Unpacker(raw=False)
+    batch = []
+    async for chunk in stream:
+        unpacker.feed(chunk)
+        for obj in unpacker:
+            batch.append(obj)
+            if len(batch) >= BULK_CHUNK:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def _ingest_batch(scope: str, objects: List, first_line: int) -> Tuple[int, List[Dict]]:
+    """Validate a decoded batch and commit the valid entries; returns (added, errors)"""
+    dim = memory_storage.index.vector_dim(scope)
+    contents, embeddings, errors = [], [], []
+    for line, obj in enumerate(objects, first_line):
+        if obj is _BLANK:
+            continue
+        content = obj.get("content") if isinstance(obj, dict) else None
+        if not isinstance(content, str) or not content:
+            errors.append({"line": line, "error": "expected an object with non-empty string content"})
+            continue
+        try:
+            embedding, dim = check_embedding(obj.get("embedding"), dim)
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+            continue
+        contents.append(content)
+        embeddings.append(embedding)
+    added = memory_storage.append_batch(scope, contents, embeddings) if contents else 0
+    return added, errors
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+@app.post("/v1/memory/bulk")
+async def bulk_memory(
+    request: Request,
+    scope: str = "global",
+    token: str = Depends(verify_jwt_token)
+):
+    """Ingest an NDJSON or msgpack stream of {"content", "embedding"?} objects
+    
+    The body is read incrementally and committed a block at a time, so a
+    stream of any size is accepted; invalid entries are skipped and reported
+    by line (msgpack: object position) while the rest are stored. An NDJSON
+    line of BULK_BLOCK_BYTES or more stops the load with 413.
+    """
+    if len(scope) > 100 or not scope.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(status_code=400, detail="Invalid scope format")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        batches = _ndjson_batches(request.stream())
+    elif content_type in ("application/msgpack", "application/x-msgpack"):
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise HTTPException(status_code=415, detail="msgpack bodies need the msgpack package installed")
+        batches = _msgpack_batches(request.stream(), msgpack)
+    else:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson or application/msgpack")
+    
+    added, rejected, errors, line = 0, 0, [], 1
+    try:
+        async for objects in batches:
+            batch_added, batch_errors = await run_in_threadpool(_ingest_batch, scope, objects, line)
+            line += len(objects)
+            added += batch_added
+            rejected += len(batch_errors)
+            errors.extend(batch_errors[:BULK_MAX_ERRORS - len(errors)])
+    except BulkLineTooLong as e:
+        logger.warning(f"Memory bulk load stopped after {added} entries: {e}")
+        return JSONResponse(status_code=413, content={
+            "detail": str(e), "line": line, "entries_added": added, "rejected": rejected})
+    except Exception as e:
+        # Blocks already committed stay committed; report how far the load got
+        logger.error(f"Memory bulk error after {added} entries: {e}")
+        return JSONResponse(status_code=500, content={
+            "detail": "Internal server error", "entries_added": added, "rejected": rejected})
+    
+    logger.info(f"Memory bulk load: {added} entries to scope: {scope}, {rejected} rejected")
+    return {"ok": True, "scope": scope, "entries_added": added, "rejected": rejected,
+            "errors": errors, "index_pending": memory_storage.index.pending}
+
+@app.post("/v1/memory/search")
+async def search_memory(
+    request: MemorySearchRequest,
+    token: str = Depends(verify_jwt_token)
+):
+    """Rank a scope's entries by BM25 against `query`, or by cosine similarity to `vector`"""
+    if (request.query is None) == (request.vector is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of query or vector")
+    try:
+        index = memory_storage.index
+        if request.query is not None:
+            hits = index.search_text(request.scope, request.query, request.limit)
+        else:
+            dim = index.vector_dim(request.scope)
+            if dim is not None and dim != len(request.vector):
+                raise HTTPException(status_code=400, detail=f"vector must have dimension {dim}")
+            hits = index.search_vector(request.scope, request.vector, request.limit)
+        results = [{"score": score, **entry_dict(entry)} for score, entry in hits]
+        return {"scope": request.scope, "results": results, "count": len(results)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Memory search error: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def encode_cursor(scope: str, position: int) -> str:
+    """Opaque cursor for the entry with sequence number `position` in a scope
+    
+    Sequence numbers are never reused, so a cursor stays valid when retention
+    removes older entries.
+    """
+    raw = json.dumps({"scope": scope, "position": position}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, scope: str) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = int(data["position"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if data.get("scope") != scope or position < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; convert aware query values to match"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _ndjson(chunks: Iterator[List[MemoryEntry]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield "".join(json.dumps(entry_dict(entry)) + "\n" for entry in chunk).encode()
+
+def _policy_dict(policy: RetentionPolicy) -> Dict:
+    return {"max_entries": policy.max_entries, "max_age_seconds": policy.max_age_seconds,
+            "max_bytes": policy.max_bytes}
+
+@app.put("/v1/memory/policy")
+async def set_memory_policy(
+    request: RetentionPolicyRequest,
+    token: str = Depends(verify_jwt_token)
+):
+    """Set a scope's retention limits and apply them immediately"""
+    try:
+        policy = RetentionPolicy(request.max_entries, request.max_age_seconds, request.max_bytes)
+        removed = await run_in_threadpool(memory_storage.set_policy, request.scope, policy)
+        logger.info(f"Memory policy set for scope: {request.scope}, {removed} entries removed")
+        return {"ok": True, "scope": request.scope, "policy": _policy_dict(policy), "removed": removed}
+    except Exception as e:
+        logger.error(f"Memory policy error: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/v1/memory/policy")
+async def get_memory_policy(
+    scope: str = "global",
+    token: str = Depends(verify_jwt_token)
+):
+    """A scope's retention limits and current usage"""
+    if len(scope) > 100 or not scope.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(status_code=400, detail="Invalid scope format")
+    entries, size = memory_storage.scope_stats(scope)
+    return {"scope": scope, "policy": _policy_dict(memory_storage.policy(scope)),
+            "entries": entries, "bytes": size}
+
 @app.get("/v1/memory/get")
 async def get_memory(
     scope: str = "global",
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     token: str = Depends(verify_jwt_token)
 ):
-    """Get memory entries with proper validation"""
+    """Get memory entries with proper validation
+
+    JSON responses are pages of at most MEMORY_PAGE_MAX entries (default
+    MEMORY_PAGE_DEFAULT) with a next_cursor to continue from. NDJSON streams
+    every matching entry (or `limit` of them) a chunk at a time; the cursor
+    for the rest is in the X-Next-Cursor header. The entries returned are
+    those present when the request started.
+    """
     try:
         # Validate scope
         if not scope.replace('_', '').replace('-', '').isalnum():
             raise HTTPException(status_code=400, detail="Invalid scope format")
         
-        entries = memory_storage.get_entries(scope)
+        start = decode_cursor(cursor, scope) if cursor else 0
+        start, stop = memory_storage.bounds(scope, start, _naive_utc(since), _naive_utc(until))
+        if format == "json":
+            limit = min(limit or MEMORY_PAGE_DEFAULT, MEMORY_PAGE_MAX)
+        end = min(stop, start + limit) if limit else stop
+        next_cursor = encode_cursor(scope, end) if end < stop else None
+        
+        if format == "ndjson":
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            return StreamingResponse(_ndjson(memory_storage.iter_entries(scope, start, end)),
+                                     media_type="application/x-ndjson", headers=headers)
         
-        return {"entries": entries, "scope": scope, "count": len(entries)}
+        entries = [entry_dict(entry) for chunk in memory_storage.iter_entries(scope, start, end)
+                   for entry in chunk]
+        return {"entries": entries, "scope": scope, "count": len(entries), "next_cursor": next_cursor}
     except HTTPException:
         raise
     except Exception as e:
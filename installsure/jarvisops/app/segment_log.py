@@ -0,0 +1,173 @@
+"""
+Append-only segment log with group commit, snapshots and recovery.
+
+Records are JSON arrays, one per line, in numbered segment files
+(segment-00000001.log, ...). Appenders hand their encoded record to a single
+writer thread, which writes and fsyncs whatever has accumulated in one go,
+so concurrent writers share an fsync instead of queueing for one each.
+rotate() starts a new segment at a well-defined point in the record order;
+a snapshot written for that point replaces every older segment, and
+recover() yields the snapshot's records followed by the newer segments.
+"""
+import json
+import os
+import re
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+_SEGMENT = re.compile(r"^segment-(\d+)\.log$")
+_SNAPSHOT = re.compile(r"^snapshot-(\d+)\.log$")
+_ROTATE = object()
+_READ_SIZE = 4 * 1024 * 1024
+
+
+class SegmentLog:
+    """Durable record log; append() + wait() returns once a record is on disk"""
+
+    def __init__(self, directory: str, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        segments = self._numbers(_SEGMENT)
+        snapshots = self._numbers(_SNAPSHOT)
+        # Always write into a fresh segment: a crash may have left a torn tail
+        self._segment = max(segments + snapshots + [0]) + 1
+        self._file = open(self._path("segment", self._segment), "ab")
+
+        self._pending: List = []
+        self._appended = 0      # sequence number of the last appended record
+        self._durable = 0       # sequence number of the last record on disk
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self.batches = 0        # fsync batches written, for group commit stats
+        self._writer = threading.Thread(target=self._write_loop, name="segment-log", daemon=True)
+        self._writer.start()
+
+    def append(self, record: list) -> int:
+        """Queue a record; returns its sequence number for wait()."""
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("log is closed")
+            self._pending.append(line)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    @property
+    def appended(self) -> int:
+        """Sequence number of the last appended record."""
+        return self._appended
+
+    def wait(self, seq: int) -> None:
+        """Block until the record with sequence number `seq` is durable."""
+        with self._cond:
+            while self._durable < seq and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise RuntimeError("log write failed") from self._error
+
+    def rotate(self) -> int:
+        """Start a new segment; records appended before this call stay in older ones.
+
+        Returns the new segment's number, which is what write_snapshot() takes
+        for a snapshot of the state as of this call.
+        """
+        with self._cond:
+            self._pending.append(_ROTATE)
+            self._segment += 1
+            self._cond.notify_all()
+            return self._segment
+
+    def write_snapshot(self, segment: int, records: Iterable[list]) -> None:
+        """Persist the state as of rotate() == segment and drop what it covers."""
+        path = self._path("snapshot", segment)
+        tmp = path + ".tmp"
+        with open(tmp, "wb", buffering=1024 * 1024) as f:
+            f.writelines(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for number in self._numbers(_SEGMENT):
+            if number < segment:
+                os.remove(self._path("segment", number))
+        for number in self._numbers(_SNAPSHOT):
+            if number < segment:
+                os.remove(self._path("snapshot", number))
+
+    def recover(self) -> Iterator[list]:
+        """Yield the latest snapshot's records, then every record logged after it."""
+        snapshots = self._numbers(_SNAPSHOT)
+        start = max(snapshots) if snapshots else 0
+        paths = [self._path("snapshot", start)] if snapshots else []
+        paths += [self._path("segment", n) for n in self._numbers(_SEGMENT) if n >= start]
+        for path in paths:
+            with open(path, "rb") as f:
+                tail = b""
+                while True:
+                    block = f.read(_READ_SIZE)
+                    if not block:
+                        break  # anything left in `tail` is a torn write from a crash
+                    block = tail + block
+                    end = block.rfind(b"\n")
+                    if end < 0:
+                        tail = block
+                        continue
+                    block, tail = block[:end], block[end + 1:]
+                    # json.dumps escapes newlines, so a block of lines decodes
+                    # as one JSON array in a single call
+                    yield from json.loads(b"[" + block.replace(b"\n", b",") + b"]")
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                batch, self._pending = self._pending, []
+                last = self._appended
+            try:
+                for item in batch:
+                    if item is _ROTATE:
+                        self._sync()
+                        self._file.close()
+                        self._file = open(self._path("segment", self._next_segment()), "ab")
+                    else:
+                        self._file.write(item)
+                self._sync()
+            except BaseException as e:  # surface to every waiter instead of hanging them
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable = last
+                self.batches += 1
+                self._cond.notify_all()
+
+    def _next_segment(self) -> int:
+        current = int(_SEGMENT.match(os.path.basename(self._file.name)).group(1))
+        return current + 1
+
+    def _sync(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _numbers(self, pattern) -> List[int]:
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.directory)) if m)
+
+    def _path(self, kind: str, number: int) -> str:
+        return os.path.join(self.directory, f"{kind}-{number:08d}.log")
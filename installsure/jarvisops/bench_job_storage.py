@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: job storage throughput across threads, single global lock (the
+previous SecureJobStorage) vs the sharded store with lock-free reads.
+Usage: python bench_job_storage.py [--jobs 100000] [--ops 400000] [--threads 1,2,4,8] [--writes 0.1]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python"))
+
+from app.secure_main import JobState, SecureJobStorage
+
+
+class GlobalLockJobStorage:
+    """The previous design: one dict, one lock around every call."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create_job(self, job_id, state="PLANNED"):
+        with self._lock:
+            job = JobState(id=job_id, state=state, created=datetime.utcnow())
+            self._jobs[job_id] = job
+            return job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def update_job_state(self, job_id, new_state, started=None, completed=None, result=None, error_message=None):
+        with self._lock:
+            old = self._jobs[job_id]
+            job = JobState(id=job_id, state=new_state, created=old.created,
+                           started=started or old.started, completed=completed or old.completed,
+                           result=result or old.result, error_message=error_message or old.error_message)
+            self._jobs[job_id] = job
+            return job
+
+
+def run(storage, job_ids, threads, ops, write_ratio):
+    """Total ops/s with `threads` threads sharing `ops` operations."""
+    per_thread = ops // threads
+    now = datetime.utcnow()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        picks = [job_ids[rnd.randrange(len(job_ids))] for _ in range(per_thread)]
+        writes = [rnd.random() < write_ratio for _ in range(per_thread)]
+        get, update = storage.get_job, storage.update_job_state
+        barrier.wait()
+        for job_id, write in zip(picks, writes):
+            if write:
+                update(job_id, "RUNNING", started=now)
+            else:
+                get(job_id)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=400_000)
+    parser.add_argument("--threads", default="1,2,4,8")
+    parser.add_argument("--writes", type=float, default=0.1, help="fraction of operations that update")
+    args = parser.parse_args()
+
+    job_ids = [str(uuid.uuid4()) for _ in range(args.jobs)]
+    stores = {"global lock": GlobalLockJobStorage(), "sharded": SecureJobStorage()}
+    for storage in stores.values():
+        for job_id in job_ids:
+            storage.create_job(job_id)
+
+    print(f"{args.jobs:,} jobs, {args.ops:,} operations per run, {os.cpu_count()} CPUs")
+    for write_ratio in (0.0, args.writes):
+        print(f"  {write_ratio:.0%} writes")
+        for name, storage in stores.items():
+            base = None
+            for threads in (int(t) for t in args.threads.split(",")):
+                rate = run(storage, job_ids, threads, args.ops, write_ratio)
+                base = base or rate
+                print(f"    {name:12s} {threads:2d} threads {rate:12,.0f} ops/s  x{rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
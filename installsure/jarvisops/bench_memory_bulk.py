@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk memory ingestion into one scope, through /v1/memory/bulk
+(in-process, streamed NDJSON body) and through the decode/validate/commit
+path directly, compared with /v1/memory/append in batches of 100.
+Usage: python bench_memory_bulk.py [--entries 1000000] [--append-entries 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python"))
+
+from fastapi.testclient import TestClient
+
+import app.secure_main as secure_main
+
+AUTH = {"Authorization": "Bearer bench-token-123"}
+
+
+def ndjson(count, block=10_000):
+    for first in range(0, count, block):
+        yield "".join(json.dumps({"content": f"note {i} about roof flashing and drainage"}) + "\n"
+                      for i in range(first, min(first + block, count))).encode()
+
+
+def fresh_storage():
+    secure_main.memory_storage = secure_main.SecureMemoryStorage()
+    return secure_main.memory_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--append-entries", type=int, default=20_000)
+    args = parser.parse_args()
+    secure_main.rate_limiter = secure_main.RateLimiter(10**9, 3600)
+    body = b"".join(ndjson(args.entries))
+    client = TestClient(secure_main.app)
+
+    storage = fresh_storage()
+    start = time.perf_counter()
+    line = 1
+    blocks = body.rstrip(b"\n").split(b"\n")
+    for first in range(0, len(blocks), 15_000):
+        objects = secure_main._decode_ndjson(b"\n".join(blocks[first:first + 15_000]))
+        secure_main._ingest_batch("bench", objects, line)
+        line += len(objects)
+    direct_s = time.perf_counter() - start
+    storage.index.flush()
+
+    storage = fresh_storage()
+    start = time.perf_counter()
+    response = client.post("/v1/memory/bulk?scope=bench", content=ndjson(args.entries),
+                           headers={**AUTH, "Content-Type": "application/x-ndjson"})
+    http_s = time.perf_counter() - start
+    assert response.json()["entries_added"] == args.entries, response.text
+    start = time.perf_counter()
+    storage.index.flush()
+    index_s = time.perf_counter() - start + http_s
+
+    fresh_storage()
+    start = time.perf_counter()
+    for first in range(0, args.append_entries, 100):
+        client.post("/v1/memory/append", headers=AUTH, json={
+            "scope": "bench", "entries": [{"content": f"note {i}"} for i in range(first, first + 100)]})
+    append_s = time.perf_counter() - start
+
+    print(f"{args.entries:,} entries into one scope")
+    print(f"  decode+validate+commit   {args.entries / direct_s:10,.0f} entries/s")
+    print(f"  POST /v1/memory/bulk     {args.entries / http_s:10,.0f} entries/s "
+          f"(searchable after {index_s:.1f} s)")
+    print(f"  POST /v1/memory/append   {args.append_entries / append_s:10,.0f} entries/s (100 per request)")
+
+
+if __name__ == "__main__":
+    main()
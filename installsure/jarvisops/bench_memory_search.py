@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory search index build rate and query latency.
+Synthetic entries draw words from a Zipf-like vocabulary, so queries mix
+very common and rare terms; the vector index is brute force over random
+unit embeddings.
+Usage: python bench_memory_search.py [--entries 1000000] [--vectors 200000] [--dim 128] [--queries 200]
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from app.memory_index import BM25Index, VectorIndex
+
+
+def latency(search, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    words = [f"w{i}" for i in range(args.vocabulary)]
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(args.vocabulary)))
+    index = BM25Index()
+    start = time.perf_counter()
+    for i in range(args.entries):
+        index.add(i, " ".join(rnd.choices(words, cum_weights=cum_weights, k=12)))
+    build_s = time.perf_counter() - start
+
+    print(f"BM25, {args.entries:,} entries of 12 words")
+    print(f"  index build       {args.entries / build_s:12,.0f} entries/s")
+    for label, pool in (("common terms", words[:20]), ("mid terms", words[100:1000]), ("rare terms", words[-5000:])):
+        queries = [" ".join(rnd.sample(pool, rnd.randint(1, 3))) for _ in range(args.queries)]
+        p50, p95 = latency(lambda q: index.search(q, 10), queries)
+        print(f"  {label:16s}  p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+    import numpy as np
+    vectors = VectorIndex(args.dim)
+    gen = np.random.default_rng(0)
+    matrix = gen.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    start = time.perf_counter()
+    for i in range(args.vectors):
+        vectors.add(i, matrix[i])
+    build_s = time.perf_counter() - start
+    queries = gen.standard_normal((args.queries, args.dim)).astype(np.float32)
+    p50, p95 = latency(lambda q: vectors.search(q, 10), queries)
+    print(f"Vectors, {args.vectors:,} x {args.dim} (exact)")
+    print(f"  index build       {args.vectors / build_s:12,.0f} vectors/s")
+    print(f"  top-10 query      p50 {p50:8.2f} ms   p95 {p95:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a simulated week of steady memory appends under a retention
+policy, on a fake clock. Prints, per simulated day, live entries and bytes
+(from the O(1) counters), process RSS and the time spent compacting, and
+compares the cost of the counters with summing every scope.
+Usage: python bench_memory_soak.py [--days 7] [--per-minute 100] [--scopes 20] [--max-age-hours 24]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python"))
+
+from app.secure_main import RetentionPolicy, SecureMemoryStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--per-minute", type=int, default=100)
+    parser.add_argument("--scopes", type=int, default=20)
+    parser.add_argument("--max-age-hours", type=float, default=24)
+    args = parser.parse_args()
+
+    clock = FakeClock()
+    storage = SecureMemoryStorage(clock=clock,
+                                  default_policy=RetentionPolicy(max_age_seconds=args.max_age_hours * 3600))
+    per_scope = max(1, args.per_minute // args.scopes)
+    compact_s, appended, removed = 0.0, 0, 0
+    start = time.perf_counter()
+    print(f"{'day':>4} {'appended':>10} {'live':>9} {'MiB live':>9} {'RSS MiB':>8} {'compact ms/run':>15}")
+    for day in range(1, args.days + 1):
+        day_compact, runs = 0.0, 0
+        for minute in range(24 * 60):
+            clock.now += timedelta(minutes=1)
+            for scope in range(args.scopes):
+                contents = [f"reading {appended + i} for sensor {scope} at {clock.now:%H:%M}"
+                            for i in range(per_scope)]
+                storage.append_batch(f"scope-{scope}", contents, [None] * per_scope)
+                appended += per_scope
+            # The service compacts every JARVISOPS_COMPACT_INTERVAL (60 s by default)
+            t = time.perf_counter()
+            removed += storage.compact()
+            day_compact += time.perf_counter() - t
+            runs += 1
+        storage.index.flush()
+        compact_s += day_compact
+        print(f"{day:>4} {appended:>10,} {storage.entry_count:>9,} {storage.byte_count / 2**20:>9.1f} "
+              f"{rss_mb():>8.1f} {day_compact / runs * 1000:>15.3f}")
+    elapsed = time.perf_counter() - start
+
+    t = time.perf_counter()
+    for _ in range(1000):
+        storage.entry_count, storage.byte_count
+    counter_us = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    for _ in range(10):
+        sum(len(entries) for entries in storage._memory.values())
+        sum(len(e.content.encode()) for entries in storage._memory.values() for e in entries)
+    sum_us = (time.perf_counter() - t) * 1e5
+
+    print(f"{appended:,} appended, {removed:,} removed by retention in {elapsed:.1f} s "
+          f"({compact_s:.1f} s compacting); index rebuilds: {storage.index.rebuilds}")
+    print(f"metrics: counters {counter_us:.2f} us, summing every entry {sum_us:,.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the DAG plan executor. Runs a fan-out/fan-in plan of sleeping
+steps (standing in for I/O-bound stages) at several max_concurrency settings
+on a process pool, then measures per-step scheduling overhead with
+zero-length steps and the /v1/run response time while a long plan runs.
+Usage: python bench_plan_executor.py [--width 16] [--step-seconds 0.2] [--workers 16]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python"))
+
+from fastapi.testclient import TestClient
+
+import app.secure_main as secure_main
+from app.plan_executor import PlanExecutor
+from app.secure_main import SecureJobStorage
+
+AUTH = {"Authorization": "Bearer bench-token-123"}
+
+
+def fan_plan(width, seconds):
+    steps = [{"name": "ingest", "action": "ingest", "depends_on": [], "params": {}}]
+    steps += [{"name": f"curate{i}", "action": "curate", "depends_on": ["ingest"],
+               "params": {"duration_s": seconds}} for i in range(width)]
+    steps.append({"name": "build", "action": "build", "depends_on": [s["name"] for s in steps[1:]], "params": {}})
+    return steps
+
+
+async def run_plan(executor, jobs, steps, max_concurrency):
+    run_id = f"run-{time.perf_counter_ns()}"
+    jobs.create_job(run_id, "RUNNING", started=datetime.utcnow())
+    start = time.perf_counter()
+    executor.start(run_id, "bench", steps, max_concurrency)
+    await executor.wait()
+    assert jobs.get_job(run_id).state == "COMPLETED", jobs.get_job(run_id)
+    return time.perf_counter() - start
+
+
+async def bench_executor(args):
+    jobs = SecureJobStorage()
+    executor = PlanExecutor(jobs, workers=args.workers)
+    await run_plan(executor, jobs, fan_plan(2, 0), 2)  # start the worker processes
+    steps = fan_plan(args.width, args.step_seconds)
+    print(f"fan-out of {args.width} x {args.step_seconds}s steps, {args.workers} worker processes")
+    for concurrency in sorted({1, 4, args.width}):
+        seconds = await run_plan(executor, jobs, steps, concurrency)
+        print(f"  max_concurrency {concurrency:>3}: {seconds:6.2f} s")
+    zero = fan_plan(200, 0)
+    seconds = await run_plan(executor, jobs, zero, args.workers)
+    print(f"zero-length steps: {len(zero) / seconds:,.0f} steps/s ({seconds / len(zero) * 1000:.2f} ms/step)")
+    await executor.shutdown()
+
+
+def bench_request(args):
+    secure_main.rate_limiter = secure_main.RateLimiter(10**9, 3600)
+    secure_main.plan_executor = PlanExecutor(secure_main.job_storage, workers=args.workers)
+    with TestClient(secure_main.app) as client:
+        body = {"goal": "bench", "steps": fan_plan(args.width, args.step_seconds), "max_concurrency": 4}
+        times = []
+        for _ in range(20):
+            plan_id = client.post("/v1/plan", json=body, headers=AUTH).json()["plan_id"]
+            start = time.perf_counter()
+            response = client.post("/v1/run", json={"plan_id": plan_id}, headers=AUTH)
+            times.append(time.perf_counter() - start)
+            assert response.json()["status"] == "RUNNING"
+        times.sort()
+        print(f"POST /v1/run with plans running: p50 {times[10] * 1000:.1f} ms, max {times[-1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=16)
+    parser.add_argument("--step-seconds", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(bench_executor(args))
+    bench_request(args)
+
+
+if __name__ == "__main__":
+    main()
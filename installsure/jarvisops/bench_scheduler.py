@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Load test: queue wait per tenant under a flooding tenant, fair scheduler vs
+a single FIFO queue with the same slots and admission limits. A discrete-event
+simulation on a virtual clock drives app.scheduler.FairScheduler directly, so
+minutes of overload run in seconds and every run is repeatable.
+Usage: python bench_scheduler.py [--minutes 10] [--slots 8] [--flood-rate 40] [--light-tenants 20]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python"))
+
+from app.scheduler import FairScheduler, QueueFull
+
+
+class FifoScheduler(FairScheduler):
+    """Same limits and accounting, first come first served"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fifo = deque()
+
+    def __len__(self):
+        return len(self._fifo)
+
+    def check(self, tenant):
+        if self._depth[tenant] >= self.tenant_limit:
+            raise QueueFull(self.retry_after(self._depth[tenant]), "tenant queue is full")
+        if len(self._fifo) >= self.queue_limit:
+            raise QueueFull(self.retry_after(len(self._fifo)), "run queue is full")
+
+    def push(self, tenant, priority, item, cost=1.0):
+        self._depth[tenant] += 1
+        self._fifo.append((tenant, self._clock(), item))
+
+    def pop(self):
+        if not self._fifo:
+            return None
+        tenant, enqueued, item = self._fifo.popleft()
+        self._depth[tenant] -= 1
+        return item
+
+
+def simulate(make_scheduler, args, seed=1):
+    rnd = random.Random(seed)
+    now = [0.0]
+    scheduler = make_scheduler(lambda: now[0])
+    tenants = [("flood", args.flood_rate)] + [(f"light{i}", args.light_rate) for i in range(args.light_tenants)]
+    events = [(rnd.expovariate(rate), 0, "arrive", tenant) for tenant, rate in tenants]
+    heapq.heapify(events)
+    seq, running, end = 1, 0, args.minutes * 60
+    waits = {"flood": [], "light": []}
+    rejected = {"flood": 0, "light": 0}
+
+    def start_runs():
+        nonlocal running, seq
+        while running < args.slots:
+            item = scheduler.pop()
+            if item is None:
+                return
+            tenant, enqueued = item
+            waits["flood" if tenant == "flood" else "light"].append(now[0] - enqueued)
+            running += 1
+            duration = rnd.expovariate(1 / args.run_seconds)
+            heapq.heappush(events, (now[0] + duration, seq, "finish", duration))
+            seq += 1
+
+    while events:
+        now[0], _, kind, data = heapq.heappop(events)
+        if kind == "arrive":
+            tenant = data
+            if now[0] < end:
+                heapq.heappush(events, (now[0] + rnd.expovariate(dict(tenants)[tenant]), seq, "arrive", tenant))
+                seq += 1
+                try:
+                    scheduler.check(tenant)
+                    scheduler.push(tenant, "normal", (tenant, now[0]))
+                except QueueFull:
+                    rejected["flood" if tenant == "flood" else "light"] += 1
+        else:
+            running -= 1
+            scheduler.finished(data)
+        start_runs()
+    return waits, rejected
+
+
+def pct(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--run-seconds", type=float, default=0.2)
+    parser.add_argument("--flood-rate", type=float, default=40, help="runs/s from the flooding tenant")
+    parser.add_argument("--light-tenants", type=int, default=20)
+    parser.add_argument("--light-rate", type=float, default=0.2, help="runs/s per light tenant")
+    parser.add_argument("--tenant-limit", type=int, default=100)
+    args = parser.parse_args()
+
+    capacity = args.slots / args.run_seconds
+    offered = args.flood_rate + args.light_tenants * args.light_rate
+    print(f"{args.minutes:g} simulated min, {args.slots} slots ({capacity:.0f} runs/s), "
+          f"offered {offered:.0f} runs/s: 1 tenant at {args.flood_rate:g}/s, "
+          f"{args.light_tenants} at {args.light_rate:g}/s")
+    print(f"{'':6} {'light p50':>10} {'light p99':>10} {'flood p50':>10} {'flood p99':>10} "
+          f"{'light 429':>10} {'flood 429':>10}")
+    for name, cls in (("fifo", FifoScheduler), ("fair", FairScheduler)):
+        waits, rejected = simulate(lambda clock: cls(args.slots, args.tenant_limit, 1000, clock=clock), args)
+        print(f"{name:6} {pct(waits['light'], .5) * 1000:>8.0f}ms {pct(waits['light'], .99) * 1000:>8.0f}ms "
+              f"{pct(waits['flood'], .5) * 1000:>8.0f}ms {pct(waits['flood'], .99) * 1000:>8.0f}ms "
+              f"{rejected['light']:>10,} {rejected['flood']:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,43 @@
-from fastapi import FastAPI, Body, HTTPException
+from fastapi import FastAPI, Body, Depends, Header, HTTPException, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+import hmac
+import os
+import queue
+import threading
+import time
 import uuid
 
-app = FastAPI(title="Reality Capture Engine", version="0.1.0")
+from httpmetrics import instrument
+from idempotency import IdempotencyCache, idempotent
+from jobevents import SSE_HEADERS, JobEventBus, sse_events, stream_websocket
+from replay import install_capture
+
+WORKERS = int(os.environ.get("REALITY_WORKERS", "2"))
+# Finished jobs are kept this long, and at most this many
+JOB_TTL = float(os.environ.get("REALITY_JOB_TTL", "86400"))
+MAX_FINISHED_JOBS = int(os.environ.get("REALITY_MAX_FINISHED_JOBS", "10000"))
+WORKER_TOKEN = os.environ.get("REALITY_WORKER_TOKEN", "")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    workers = [threading.Thread(target=run_jobs, name=f"capture-worker-{i}", daemon=True) for i in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    yield
+    for _ in workers:
+        job_queue.put(None)
+    for worker in workers:
+        worker.join(timeout=5)
+
+app = FastAPI(title="Reality Capture Engine", version="0.1.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+http_metrics = instrument(app, "reality-capture-engine")
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
 
 @app.get("/healthz")
 def healthz():
@@ -15,33 +49,186 @@ def readyz():
 
 @app.get("/metrics")
 def metrics():
-    return {"latency_p95_ms": 100, "error_rate": 0.0}
+    return {**http_metrics.summary(), "jobs": len(JOBS), "queued_jobs": job_queue.qsize(),
+            "event_subscribers": events.subscribers,
+            "idempotent_replays": idempotency_cache.replayed + idempotency_cache.coalesced}
+
+# Capture and processing jobs. Worker threads started with the app take
+# queued jobs and run their kind's processor; processing running outside this
+# process reports progress with POST /v1/jobs/{job_id}/state instead, using
+# the REALITY_WORKER_TOKEN bearer token. Clients read a job's status or
+# subscribe to changes.
+JOB_STATES = ("QUEUED", "RUNNING", "COMPLETED", "FAILED")
+TERMINAL_STATES = ("COMPLETED", "FAILED")
+JOBS: Dict[str, Dict] = {}
+jobs_lock = threading.Lock()
+job_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+finished: "deque" = deque()  # (finish time, job id), oldest first
+clock = time.monotonic
+events = JobEventBus()
+# Job-starting requests by Idempotency-Key, so a retried upload or processing
+# request returns the first job instead of starting another
+idempotency_cache = IdempotencyCache()
+
+def _no_processing(job: Dict, progress: Callable[[int], None]) -> None:
+    """Nothing runs in this service for the kind yet; the job completes once a worker takes it"""
+
+# kind -> processor(job, progress); raising fails the job with the error
+PROCESSORS: Dict[str, Callable[[Dict, Callable[[int], None]], None]] = {
+    kind: _no_processing for kind in ("ingest/tripod", "ingest/drone", "process/photogrammetry", "process/register")
+}
+
+class JobFinished(Exception):
+    """The job already reached a terminal state"""
+
+def create_job(kind: str) -> Dict:
+    _evict()
+    job = {"job_id": str(uuid.uuid4()), "kind": kind, "state": "QUEUED", "progress": 0}
+    with jobs_lock:
+        JOBS[job["job_id"]] = job
+    job_queue.put(job["job_id"])
+    return job
+
+def submit_job(kind: str) -> Dict:
+    job = create_job(kind)
+    return {"job_id": job["job_id"], "status": job["state"]}
+
+def job_status(job: Dict) -> Dict:
+    status = {"state": job["state"], "progress": job["progress"]}
+    if job.get("error"):
+        status["error"] = job["error"]
+    return status
+
+def update_job(job_id: str, state: str, progress: Optional[int] = None, error: Optional[str] = None) -> Dict:
+    """Move a job to a new state and publish its status; KeyError if unknown, JobFinished if terminal"""
+    with jobs_lock:
+        job = JOBS[job_id]
+        if job["state"] in TERMINAL_STATES:
+            raise JobFinished(f"Job is already {job['state']}")
+        # Replace rather than mutate, so readers never see a half-applied update
+        job = {**job, "state": state, "progress": 100 if state == "COMPLETED" else
+               max(job["progress"], progress or 0), "error": error if state == "FAILED" else None}
+        JOBS[job_id] = job
+        if state in TERMINAL_STATES:
+            finished.append((clock(), job_id))
+    status = job_status(job)
+    events.publish(job_id, status)
+    if state in TERMINAL_STATES:
+        _evict()
+    return status
+
+def _evict() -> None:
+    """Forget finished jobs past JOB_TTL or beyond MAX_FINISHED_JOBS"""
+    with jobs_lock:
+        now = clock()
+        while finished and (finished[0][0] + JOB_TTL <= now or len(finished) > MAX_FINISHED_JOBS):
+            JOBS.pop(finished.popleft()[1], None)
+
+def run_jobs() -> None:
+    """Worker thread: run queued jobs until a None is queued"""
+    while True:
+        job_id = job_queue.get()
+        if job_id is None:
+            return
+        job = JOBS.get(job_id)
+        if job is None or job["state"] != "QUEUED":
+            continue
+        try:
+            update_job(job_id, "RUNNING")
+            PROCESSORS[job["kind"]](job, lambda progress: update_job(job_id, "RUNNING", progress))
+            update_job(job_id, "COMPLETED")
+        except (KeyError, JobFinished):
+            pass  # evicted, or finished by an out-of-process report
+        except Exception as e:
+            try:
+                update_job(job_id, "FAILED", error=str(e))
+            except (KeyError, JobFinished):
+                pass
+
+def verify_worker(authorization: Optional[str] = Header(None)) -> None:
+    """Bearer REALITY_WORKER_TOKEN; worker reports are refused while no token is configured"""
+    if not WORKER_TOKEN:
+        raise HTTPException(status_code=403, detail="Worker reports are disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), WORKER_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid worker token", headers={"WWW-Authenticate": "Bearer"})
 
 @app.post("/v1/capture-plans")
 def capture_plans(body: dict = Body(...)):
     return {"plan_id": str(uuid.uuid4())}
 
 @app.post("/v1/ingest/tripod")
-def ingest_tripod(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4()), "status":"QUEUED"}
+async def ingest_tripod(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: submit_job("ingest/tripod"))
 
 @app.post("/v1/ingest/drone")
-def ingest_drone(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4()), "status":"QUEUED"}
+async def ingest_drone(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: submit_job("ingest/drone"))
 
 @app.post("/v1/process/photogrammetry")
-def photogrammetry(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4())}
+async def photogrammetry(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: submit_job("process/photogrammetry"))
 
 @app.post("/v1/process/register")
-def register(body: dict = Body(...)):
-    return {"job_id": str(uuid.uuid4())}
+async def register(request: Request, response: Response, body: dict = Body(...)):
+    return await idempotent(idempotency_cache, request, response,
+                            lambda: submit_job("process/register"))
 
 @app.post("/v1/export/tiles")
 def export_tiles(body: dict = Body(...)):
     return {"tileset_url":"s3://bucket/tiles/tileset.json"}
 
+def _get_job(job_id: str) -> Dict:
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/v1/jobs/{job_id}")
 def jobs(job_id: str):
-    return {"state":"COMPLETED","progress":100}
+    return job_status(_get_job(job_id))
+
+@app.post("/v1/jobs/{job_id}/state", dependencies=[Depends(verify_worker)])
+def report_job_state(job_id: str, body: dict = Body(...)):
+    """Record an out-of-process worker's report: {"state", "progress"?, "error"?}"""
+    state = body.get("state")
+    progress = body.get("progress")
+    if state not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"state must be one of {', '.join(JOB_STATES)}")
+    if progress is not None and (not isinstance(progress, int) or not 0 <= progress <= 100):
+        raise HTTPException(status_code=400, detail="progress must be an integer from 0 to 100")
+    try:
+        return update_job(job_id, state, progress, body.get("error"))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except JobFinished as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def _status_snapshot(job_id: str):
+    def snapshot() -> Optional[Dict]:
+        job = JOBS.get(job_id)
+        return job_status(job) if job else None
+    return snapshot
+
+def _terminal(status: Dict) -> bool:
+    return status["state"] in TERMINAL_STATES
+
+@app.get("/v1/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: the job's status now and after every change, until it finishes"""
+    _get_job(job_id)
+    return StreamingResponse(sse_events(events, job_id, _status_snapshot(job_id), _terminal),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.websocket("/v1/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket push of the job's status, as /v1/jobs/{job_id}/events"""
+    if job_id not in JOBS:
+        await websocket.close(code=1008, reason="Job not found")
+        return
+    await websocket.accept()
+    await stream_websocket(websocket, events, job_id, _status_snapshot(job_id), _terminal)
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The job event bus, idempotency cache and request metrics live in installsure/shared (on PYTHONPATH in the image)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python")))
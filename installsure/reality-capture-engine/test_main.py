@@ -0,0 +1,158 @@
+"""
+Test suite for the Reality Capture Engine FastAPI application
+Covers the job lifecycle, worker reports and status push
+"""
+
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+import app.main as main
+from app.main import app
+
+WORKER = {"Authorization": "Bearer worker-secret"}
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "WORKER_TOKEN", "worker-secret")
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def held(monkeypatch):
+    """Photogrammetry jobs report 40% and run until the event is set"""
+    release = threading.Event()
+    release.running = threading.Event()
+    def process(job, progress):
+        progress(40)
+        release.running.set()
+        release.wait(10)
+    monkeypatch.setitem(main.PROCESSORS, "process/photogrammetry", process)
+    yield release
+    release.set()
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/v1/jobs/{job_id}").json()
+        if status["state"] in ("COMPLETED", "FAILED"):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+class TestHealthEndpoints:
+    """Test health check endpoints"""
+
+    def test_healthz_endpoint(self, client):
+        response = client.get("/healthz")
+        assert response.status_code == 200
+        assert response.json()["service"] == "Reality Capture Engine"
+
+    def test_metrics(self, client):
+        client.get("/healthz")
+        metrics = client.get("/metrics").json()
+        assert metrics["routes"]["GET /healthz"]["count"] >= 1
+        assert metrics["queued_jobs"] >= 0
+
+class TestJobs:
+    """Test job submission and processing by the in-process workers"""
+
+    def test_ingest_runs_to_completion(self, client):
+        response = client.post("/v1/ingest/tripod", json={"site": "a"})
+        assert response.json()["status"] == "QUEUED"
+        assert wait_for(client, response.json()["job_id"]) == {"state": "COMPLETED", "progress": 100}
+
+    def test_processor_progress_and_failure(self, client, held, monkeypatch):
+        job_id = client.post("/v1/process/photogrammetry", json={}).json()["job_id"]
+        assert held.running.wait(10)
+        assert client.get(f"/v1/jobs/{job_id}").json() == {"state": "RUNNING", "progress": 40}
+        held.set()
+        assert wait_for(client, job_id)["state"] == "COMPLETED"
+
+        def broken(job, progress):
+            raise RuntimeError("no images")
+        monkeypatch.setitem(main.PROCESSORS, "process/register", broken)
+        job_id = client.post("/v1/process/register", json={}).json()["job_id"]
+        assert wait_for(client, job_id) == {"state": "FAILED", "progress": 0, "error": "no images"}
+
+    def test_unknown_job(self, client):
+        assert client.get("/v1/jobs/nonexistent").status_code == 404
+
+    def test_idempotency_key(self, client):
+        headers = {"Idempotency-Key": "drone-upload-1"}
+        first = client.post("/v1/ingest/drone", json={"flight": 1}, headers=headers).json()
+        second = client.post("/v1/ingest/drone", json={"flight": 1}, headers=headers).json()
+        assert first["job_id"] == second["job_id"]
+
+    def test_finished_jobs_are_evicted(self, client, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr(main, "clock", lambda: now[0])
+        monkeypatch.setattr(main, "MAX_FINISHED_JOBS", 2)
+        monkeypatch.setattr(main, "JOB_TTL", 60)
+        main.finished.clear()
+        ids = []
+        for _ in range(3):
+            ids.append(client.post("/v1/ingest/tripod", json={}).json()["job_id"])
+            wait_for(client, ids[-1])
+        # Only the two most recently finished are kept
+        assert [client.get(f"/v1/jobs/{job_id}").status_code for job_id in ids] == [404, 200, 200]
+        now[0] = 60.0
+        client.post("/v1/ingest/tripod", json={})
+        assert all(client.get(f"/v1/jobs/{job_id}").status_code == 404 for job_id in ids)
+
+class TestWorkerReports:
+    """Test POST /v1/jobs/{job_id}/state"""
+
+    def test_requires_the_worker_token(self, client, held, monkeypatch):
+        job_id = client.post("/v1/process/photogrammetry", json={}).json()["job_id"]
+        body = {"state": "FAILED", "error": "spoofed"}
+        assert client.post(f"/v1/jobs/{job_id}/state", json=body).status_code == 401
+        assert client.post(f"/v1/jobs/{job_id}/state", json=body,
+                           headers={"Authorization": "Bearer wrong"}).status_code == 401
+        monkeypatch.setattr(main, "WORKER_TOKEN", "")
+        assert client.post(f"/v1/jobs/{job_id}/state", json=body, headers=WORKER).status_code == 403
+        assert client.get(f"/v1/jobs/{job_id}").json()["state"] != "FAILED"
+
+    def test_reports_update_the_job(self, client, held):
+        job_id = client.post("/v1/process/photogrammetry", json={}).json()["job_id"]
+        assert held.running.wait(10)
+        report = client.post(f"/v1/jobs/{job_id}/state", json={"state": "RUNNING", "progress": 70}, headers=WORKER)
+        assert report.json() == {"state": "RUNNING", "progress": 70}
+        assert client.post(f"/v1/jobs/{job_id}/state", json={"state": "RUNNING", "progress": 101},
+                           headers=WORKER).status_code == 400
+        assert client.post(f"/v1/jobs/{job_id}/state", json={"state": "COMPLETED"}, headers=WORKER).status_code == 200
+        # The in-process worker finishing later leaves the report's outcome alone
+        held.set()
+        assert client.post(f"/v1/jobs/{job_id}/state", json={"state": "FAILED"}, headers=WORKER).status_code == 409
+        assert client.post("/v1/jobs/nonexistent/state", json={"state": "RUNNING"}, headers=WORKER).status_code == 404
+
+class TestStatusPush:
+    """Test SSE and WebSocket status streams"""
+
+    def test_sse_stream_ends_with_completion(self, client, held):
+        job_id = client.post("/v1/process/photogrammetry", json={}).json()["job_id"]
+        assert held.running.wait(10)
+        threading.Timer(0.2, held.set).start()
+        with client.stream("GET", f"/v1/jobs/{job_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            statuses = [json.loads(line[len("data: "):]) for line in response.iter_lines()
+                        if line.startswith("data: ")]
+        assert statuses[0] == {"state": "RUNNING", "progress": 40}
+        assert statuses[-1] == {"state": "COMPLETED", "progress": 100}
+
+    def test_websocket_pushes_until_finished(self, client, held):
+        job_id = client.post("/v1/process/photogrammetry", json={}).json()["job_id"]
+        assert held.running.wait(10)
+        with client.websocket_connect(f"/v1/jobs/{job_id}/ws") as ws:
+            assert ws.receive_json()["state"] == "RUNNING"
+            held.set()
+            final = ws.receive_json()
+            assert (final["state"], final["progress"]) == ("COMPLETED", 100)
+
+    def test_unknown_job(self, client):
+        assert client.get("/v1/jobs/nonexistent/events").status_code == 404
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,147 @@
+"""
+SentinelGuard findings store.
+
+Findings are rows in SQLite, numbered in the order they are recorded, with
+secondary indexes by scan, severity, category and path. A filtered listing
+reads one index range in order and stops after a page, so a page costs the
+same over ten findings as over tens of millions; pages are continued by
+keyset cursor (the last row's sort key), never by offset, for the same
+reason. Listings by path prefix are ordered by path, all others by the
+order the findings were recorded in.
+
+Without a path the database is a private temporary file, spilled to disk
+as it grows and deleted when the store is closed.
+"""
+import base64
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Page cache per store, in KiB; index pages stay hot while findings are inserted
+_CACHE_KIB = 65536
+
+MAX_PAGE = 1000
+
+# API field -> column; "column" itself is an SQL keyword
+_FIELDS = (("id", "id"), ("scan_id", "scan_id"), ("type", "severity"), ("category", "category"),
+           ("path", "path"), ("line", "line"), ("column", "col"), ("message", "message"),
+           ("severity_score", "severity_score"), ("rule", "rule"), ("excerpt", "excerpt"),
+           ("timestamp", "timestamp"))
+_SELECT = ", ".join(column for _, column in _FIELDS)
+_INDEXES = (("scan_id",), ("scan_id", "severity"), ("scan_id", "category"), ("scan_id", "path"),
+            ("severity",), ("severity", "category"), ("category",), ("path",))
+
+
+class FindingsPage(NamedTuple):
+    findings: List[Dict]
+    cursor: Optional[str]  # continues after the last finding returned; the given cursor if there were none
+    more: bool  # whether the listing has findings beyond this page
+
+
+class FindingsStore:
+    """Findings of all scans, indexed by scan, severity, category and path"""
+
+    def __init__(self, path: str = ""):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA cache_size=-{_CACHE_KIB}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS findings ("
+            "seq INTEGER PRIMARY KEY, id TEXT NOT NULL, scan_id TEXT NOT NULL, severity TEXT NOT NULL, "
+            "category TEXT NOT NULL, path TEXT NOT NULL, line INTEGER NOT NULL, col INTEGER NOT NULL, "
+            "message TEXT NOT NULL, severity_score INTEGER NOT NULL, rule TEXT NOT NULL, excerpt TEXT NOT NULL, "
+            "timestamp TEXT NOT NULL)"
+        )
+        # Each index ends in seq, so equality on the columns before it reads in recorded order; a scan's
+        # listings have their own, or a filter on a scan would read every other scan's findings too
+        for columns in _INDEXES:
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS findings_{'_'.join(columns)} "
+                             f"ON findings ({', '.join(columns)}, seq)")
+        self.total = self._db.execute("SELECT COUNT(*) FROM findings").fetchone()[0]
+
+    def add(self, findings: Iterable[Dict]) -> int:
+        """Record findings (dicts with the listing's fields) in one transaction; returns how many"""
+        rows = [tuple(finding[name] for name, _ in _FIELDS) for finding in findings]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    f"INSERT INTO findings ({_SELECT}) VALUES ({', '.join('?' * len(_FIELDS))})", rows
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.total += len(rows)
+        return len(rows)
+
+    def delete_scan(self, scan_id: str) -> int:
+        """Drop a scan's findings; returns how many there were"""
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM findings WHERE scan_id = ?", (scan_id,)).rowcount
+            self.total -= deleted
+        return deleted
+
+    def query(self, scan_id: Optional[str] = None, severity: Optional[str] = None,
+              category: Optional[str] = None, path_prefix: Optional[str] = None,
+              cursor: Optional[str] = None, offset: int = 0, limit: int = 100) -> FindingsPage:
+        """One page of the findings matching every filter given
+
+        `offset` skips that many findings first, reading past them, for
+        clients that resume by count. Raises ValueError for a cursor that
+        is not one of this listing's.
+        """
+        where, params = [], []
+        for column, value in (("scan_id", scan_id), ("severity", severity), ("category", category)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        order, index = ("seq",), ""
+        if path_prefix:
+            # Under binary collation, the paths with a prefix sort between it and its successor
+            where.append("path >= ? AND path < ?")
+            params += [path_prefix, path_prefix[:-1] + chr(ord(path_prefix[-1]) + 1)]
+            order = ("path", "seq")
+            # Read the prefix's range in order and check other filters on the way, rather than let the
+            # planner read all findings of a severity or category to sort them by path
+            index = f" INDEXED BY findings_{'scan_id_' if scan_id is not None else ''}path"
+        if cursor is not None:
+            key = _decode_cursor(cursor, len(order))
+            where.append(f"({', '.join(order)}) > ({', '.join('?' * len(order))})")
+            params += key
+        sql = (f"SELECT {', '.join(order)}, {_SELECT} FROM findings{index}"
+               f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {', '.join(order)} LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._db.execute(sql, (*params, limit + 1, offset)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            cursor = _encode_cursor(rows[-1][:len(order)])
+        return FindingsPage(
+            [dict(zip((name for name, _ in _FIELDS), row[len(order):])) for row in rows], cursor, more
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(",", ":")).encode()).decode()
+
+
+def _decode_cursor(cursor: str, size: int) -> List:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if (not isinstance(key, list) or len(key) != size or not isinstance(key[-1], int)
+            or not all(isinstance(part, str) for part in key[:-1])):
+        raise ValueError("Invalid cursor")
+    return key
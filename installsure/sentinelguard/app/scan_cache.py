@@ -0,0 +1,105 @@
+"""
+Persistent cache of scan results for incremental repository scans.
+
+Findings are stored per blob: the git object id of a file's contents (see
+scanner.blob_id), under the ruleset version that produced them, so a file
+whose contents were scanned before, at any path and in any checkout, is not
+scanned again until the rules change. Opening the cache for writing drops
+the results of every other ruleset.
+
+A second table remembers the blob id last seen at each (checkout, path)
+with the file's size and mtime, so unchanged files in a checkout that was
+scanned before are not even read. Worker processes open the cache read-only
+for blob lookups; the scanning process writes each scan's new results in
+one transaction.
+"""
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# SQLite's default host parameter limit is 999; stay well below it
+_LOOKUP_CHUNK = 500
+
+CachedHits = Optional[List[Tuple[str, int, int, str]]]  # (rule, line, column, excerpt); None for a binary file
+
+
+class ScanCache:
+    """Findings per (ruleset, blob id), and the blob id last seen at each path"""
+
+    def __init__(self, path: str, ruleset: str, readonly: bool = False):
+        self.ruleset = ruleset
+        self._lock = threading.Lock()
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30,
+                                       isolation_level=None, check_same_thread=False)
+            return
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "ruleset TEXT NOT NULL, blob TEXT NOT NULL, size INTEGER NOT NULL, hits TEXT, "
+            "PRIMARY KEY (ruleset, blob)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "root TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "blob TEXT NOT NULL, PRIMARY KEY (root, path)) WITHOUT ROWID"
+        )
+        self._db.execute("DELETE FROM blobs WHERE ruleset != ?", (ruleset,))
+
+    def get_blobs(self, blobs: Iterable[str]) -> Dict[str, Tuple[int, CachedHits]]:
+        """(size, hits) for whichever blob ids were scanned under this ruleset"""
+        found = {}
+        blobs = list(set(blobs))
+        with self._lock:
+            for i in range(0, len(blobs), _LOOKUP_CHUNK):
+                chunk = blobs[i:i + _LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT blob, size, hits FROM blobs WHERE ruleset = ? AND blob IN ({','.join('?' * len(chunk))})",
+                    (self.ruleset, *chunk)
+                )
+                for blob, size, hits in rows:
+                    found[blob] = (size, None if hits is None else [tuple(hit) for hit in json.loads(hits)])
+        return found
+
+    def get_files(self, root: str, paths: Iterable[str]) -> Dict[str, Tuple[int, int, str]]:
+        """(size, mtime_ns, blob id) last recorded for whichever paths under root are known"""
+        found = {}
+        paths = list(paths)
+        with self._lock:
+            for i in range(0, len(paths), _LOOKUP_CHUNK):
+                chunk = paths[i:i + _LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT path, size, mtime_ns, blob FROM files WHERE root = ? AND path IN ({','.join('?' * len(chunk))})",
+                    (root, *chunk)
+                )
+                for path, size, mtime_ns, blob in rows:
+                    found[path] = (size, mtime_ns, blob)
+        return found
+
+    def put(self, blobs: Dict[str, Tuple[int, CachedHits]], root: Optional[str] = None,
+            files: Iterable[Tuple[str, int, int, str]] = ()) -> None:
+        """Store new blob results, and (path, size, mtime_ns, blob id) records for a checkout"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO blobs (ruleset, blob, size, hits) VALUES (?, ?, ?, ?)",
+                    ((self.ruleset, blob, size, None if hits is None else json.dumps(hits))
+                     for blob, (size, hits) in blobs.items())
+                )
+                if root is not None:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO files (root, path, size, mtime_ns, blob) VALUES (?, ?, ?, ?, ?)",
+                        ((root, *record) for record in files)
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,82 @@
+"""
+SentinelGuard scan queue.
+
+Requests to scan are answered at once: the scan is queued and run by one of
+a few runner threads, and its report shows its progress and the findings so
+far until it finishes. A runner only drives a scan; the scan's files are
+spread over RepoScanner's process pool, so a couple of runners keep that
+busy while a small scan need not wait behind a large one. The queue is
+bounded so that overload is refused up front rather than left to grow.
+"""
+import logging
+import queue
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the scan queue is at capacity."""
+
+
+class ScanQueue:
+    """Bounded FIFO of scans, run by `runners` threads"""
+
+    def __init__(self, runners: int = 2, max_queue: int = 256):
+        self.runners = runners
+        self.running = 0
+        self._queue: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def depth(self) -> int:
+        """Scans waiting for a runner"""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._run, name=f"scan-runner-{i}", daemon=True)
+                             for i in range(self.runners)]
+            for thread in self._threads:
+                thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the runners once they finish their current scans; queued scans are not started"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+    def submit(self, scan: Callable[[], None]) -> None:
+        """Queue a scan; raises QueueFull. The scan records its own outcome."""
+        self.start()
+        try:
+            self._queue.put_nowait(scan)
+        except queue.Full:
+            raise QueueFull("Scan queue is full")
+
+    def _run(self) -> None:
+        while True:
+            scan = self._queue.get()
+            if scan is None:
+                return
+            with self._lock:
+                self.running += 1
+            try:
+                scan()
+            except Exception:
+                logger.exception("Scan runner error")
+            finally:
+                with self._lock:
+                    self.running -= 1
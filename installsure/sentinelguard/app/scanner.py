@@ -0,0 +1,838 @@
+"""
+SentinelGuard repository scanner.
+
+Walks a local checkout (or reads a tarball) and checks every text file
+against RULES: secret signatures (cloud and SaaS tokens, private keys,
+credentials in URLs), keyword assignments whose value has high Shannon
+entropy, and insecure configuration and code patterns.
+
+All rules are compiled once into a Matcher. Each rule names the literal
+anchors its matches start with, so the Matcher finds every anchor with
+bytes.find (C speed, case-insensitive anchors in a lowercased copy) and
+runs a rule's regex only where one of its anchors occurs. A single
+alternation of all the rules is far slower in CPython's re, which tries
+every branch at every offset; a byte-at-a-time Aho-Corasick automaton in
+pure Python slower still.
+
+Files are batched by size and spread over a process pool; each worker reads
+and scans its own files, so only findings cross the process boundary.
+Archive members (tar or zip, read as a stream, never extracted) are read by
+the parent and sent to the workers in batches.
+
+Memory stays bounded whatever the size of a file. Files over READ_BYTES are
+mapped rather than read, and matched a window at a time, in place; each
+window shares OVERLAP_BYTES of context with its neighbours so that matches
+across a boundary are found once, and the pages behind the scan are released
+as it moves on. Large archive members are streamed through one reused
+window buffer. A single large target file is split into ranges over the
+pool.
+
+With a ScanCache, scans are incremental: findings are kept per file
+contents (the git blob id) and ruleset version, files whose size and mtime
+are unchanged since the last scan of the same checkout are not read, and
+files whose contents were scanned before (at any path) are not scanned
+again. Given two git revisions, only the files that differ between them are
+scanned, read straight from the repository's object store.
+"""
+import functools
+import hashlib
+import itertools
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .scan_cache import CachedHits, ScanCache
+
+ENGINE_VERSION = 1  # bump when a change to Matcher alters what it reports
+SKIP_DIRS = {".git", ".hg", ".svn"}
+BINARY_SNIFF_BYTES = 8192
+READ_BYTES = 8 * 1024 * 1024  # files up to this size are read whole; larger ones are mapped
+MAX_BLOB_BYTES = 64 * 1024 * 1024  # larger git blobs are skipped
+WINDOW_BYTES = 1024 * 1024  # mapped files and archive streams are matched a window at a time
+OVERLAP_BYTES = 4096  # context shared by adjacent windows; a longer match is cut short at a boundary
+RANGE_BYTES = 64 * 1024 * 1024  # a single large file is split into ranges of this size over the pool
+BATCH_BYTES = 4 * 1024 * 1024  # scanned per pool task
+BATCH_FILES = 512
+EXCERPT_CHARS = 80
+
+# Secret values that are references, examples or documentation, not secrets
+PLACEHOLDER = re.compile(rb"^(?:\$\{?|\{\{|<|\[|%\(|process\.env|os\.environ|env\(|xxx|changeme|example|dummy|test"
+                         rb"|(?:pass(?:word|wd)?|secret|pwd|token)$)", re.I)
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    category: str  # FindingCategory value
+    severity: str  # FindingType value
+    score: int  # severity_score, 0-10
+    message: str
+    anchors: Tuple[bytes, ...]  # every match starts with one of these
+    pattern: bytes  # matched at the anchor; group 1, if any, is the secret value
+    ignore_case: bool = False  # anchors are then lowercase
+    min_entropy: float = 0.0  # bits per character the secret value must reach
+    fallback: bool = False  # reported only where no other rule matched the value
+    redact: bool = True  # SECRET excerpts show only the first characters
+
+
+RULES: Tuple[Rule, ...] = (
+    Rule("aws-access-key-id", "SECRET", "CRITICAL", 9, "AWS access key ID",
+         (b"AKIA", b"ASIA"), rb"(?<![0-9A-Z])(?:AKIA|ASIA)[0-9A-Z]{16}(?![0-9A-Z])"),
+    Rule("private-key", "SECRET", "CRITICAL", 10, "Private key",
+         (b"-----BEGIN",), rb"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP |ENCRYPTED )?PRIVATE KEY(?: BLOCK)?-----",
+         redact=False),
+    Rule("github-token", "SECRET", "HIGH", 8, "GitHub token",
+         (b"gh", b"github_pat_"), rb"gh[pousr]_[A-Za-z0-9]{36,255}|github_pat_[A-Za-z0-9_]{82}"),
+    Rule("gitlab-token", "SECRET", "HIGH", 8, "GitLab personal access token",
+         (b"glpat-",), rb"glpat-[A-Za-z0-9_\-]{20}"),
+    Rule("slack-token", "SECRET", "HIGH", 8, "Slack token",
+         (b"xox",), rb"xox[baprs]-[A-Za-z0-9-]{10,}"),
+    Rule("slack-webhook", "SECRET", "MEDIUM", 6, "Slack incoming webhook URL",
+         (b"hooks.slack.com",), rb"hooks\.slack\.com/services/T[A-Za-z0-9_]+/B[A-Za-z0-9_]+/[A-Za-z0-9_]+"),
+    Rule("stripe-live-key", "SECRET", "CRITICAL", 9, "Stripe live secret key",
+         (b"sk_live_", b"rk_live_"), rb"[sr]k_live_[0-9a-zA-Z]{24,}"),
+    Rule("google-api-key", "SECRET", "HIGH", 7, "Google API key",
+         (b"AIza",), rb"AIza[0-9A-Za-z_\-]{35}"),
+    Rule("jwt", "SECRET", "MEDIUM", 6, "JSON Web Token",
+         (b"eyJ",), rb"eyJ[A-Za-z0-9_-]{10,}\.eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}"),
+    Rule("url-credentials", "SECRET", "MEDIUM", 6, "Password in URL",
+         (b"://",), rb"://[^/\s:@'\"]{1,64}:([^/\s:@'\"]{3,64})@"),
+    Rule("generic-secret", "SECRET", "HIGH", 7, "High-entropy value assigned to a secret-like name",
+         (b"passw", b"secret", b"token", b"api_key", b"api-key", b"apikey", b"access_key", b"private_key"),
+         rb"(?:passw(?:or)?d|secret|token|api[_-]?key|access_key|private_key)[\w.-]{0,30}[\"']?\s*(?::=|=>|[:=])\s*"
+         rb"[\"']([^\"'\s]{8,200})[\"']",
+         ignore_case=True, min_entropy=3.0, fallback=True),
+    Rule("tls-verify-disabled", "CONFIGURATION", "MEDIUM", 5, "TLS certificate verification disabled",
+         (b"verify",), rb"verify\s*=\s*False\b"),
+    Rule("node-tls-disabled", "CONFIGURATION", "MEDIUM", 5, "TLS certificate verification disabled",
+         (b"NODE_TLS_REJECT_UNAUTHORIZED",), rb"NODE_TLS_REJECT_UNAUTHORIZED[\"']?\s*[:=]\s*[\"']?0\b"),
+    Rule("debug-enabled", "CONFIGURATION", "LOW", 3, "Debug mode enabled",
+         (b"DEBUG",), rb"(?<![\w.])DEBUG\s*=\s*True\b"),
+    Rule("unsafe-yaml-load", "VULNERABILITY", "MEDIUM", 6, "yaml.load without a safe Loader",
+         (b"yaml.load",), rb"yaml\.load\((?![^)\n]*Loader)"),
+    Rule("unsafe-deserialization", "VULNERABILITY", "LOW", 4, "pickle deserialization of possibly untrusted data",
+         (b"pickle.load",), rb"pickle\.loads?\("),
+    Rule("shell-injection", "VULNERABILITY", "MEDIUM", 6, "Subprocess started through a shell",
+         (b"shell",), rb"shell\s*=\s*True\b"),
+)
+RULES_BY_ID: Dict[str, Rule] = {rule.id: rule for rule in RULES}
+# Cached findings are reused only under the rules that produced them
+RULESET_VERSION = f"{ENGINE_VERSION}-" + hashlib.sha256(
+    repr((RULES, PLACEHOLDER.pattern, EXCERPT_CHARS)).encode()).hexdigest()[:12]
+
+
+class Hit(NamedTuple):
+    """One rule match: where it is and a redacted excerpt"""
+    rule: str
+    path: str
+    line: int
+    column: int
+    excerpt: str
+
+
+def shannon_entropy(value: bytes) -> float:
+    """Bits per character"""
+    n = len(value)
+    return -sum(c / n * math.log2(c / n) for c in Counter(value).values()) if n else 0.0
+
+
+def plausible_secret(rule: Rule, value: bytes) -> bool:
+    """Whether a matched secret value looks real rather than a placeholder or a word"""
+    if PLACEHOLDER.match(value):
+        return False
+    if not rule.min_entropy:
+        return True
+    # Generated secrets mix character classes; names and prose ("token_type = 'quoted-string'") do not
+    classes = (any(97 <= c <= 122 for c in value) + any(65 <= c <= 90 for c in value)
+               + any(48 <= c <= 57 for c in value))
+    return classes >= 2 and shannon_entropy(value) >= rule.min_entropy
+
+
+def _excerpt(rule: Rule, match) -> str:
+    if rule.category != "SECRET" or not rule.redact:
+        return match.group(0)[:EXCERPT_CHARS].decode("utf-8", "replace")
+    secret = match.group(match.re.groups and 1 or 0)
+    return secret[:4].decode("utf-8", "replace") + "*" * min(len(secret) - 4, 12)
+
+
+class Matcher:
+    """RULES compiled for scanning: anchor -> the rules it starts"""
+
+    def __init__(self, rules: Iterable[Rule] = RULES):
+        self._exact: List[Tuple[bytes, List[Tuple[Rule, "re.Pattern"]]]] = []
+        self._folded: List[Tuple[bytes, List[Tuple[Rule, "re.Pattern"]]]] = []
+        table: Dict[Tuple[bytes, bool], List[Tuple[Rule, "re.Pattern"]]] = {}
+        for rule in rules:
+            regex = re.compile(rule.pattern, re.I if rule.ignore_case else 0)
+            for anchor in rule.anchors:
+                table.setdefault((anchor, rule.ignore_case), []).append((rule, regex))
+        for (anchor, folded), entries in table.items():
+            (self._folded if folded else self._exact).append((anchor, entries))
+
+    def scan(self, data: bytes, path: str) -> List[Hit]:
+        """Every rule match in one file's contents, in file order"""
+        lowered = data.lower()
+        matches = self._matches(data, lowered, 0, 0, len(data), len(data))
+        return self._locate(matches, lowered, 0, 0, len(data), path, 1, 1)[0]
+
+    def scan_buffer(self, data, path: str, start: int = 0, stop: Optional[int] = None, line: int = 1,
+                    column: int = 1, window: int = WINDOW_BYTES,
+                    overlap: int = OVERLAP_BYTES) -> Tuple[List[Hit], int, int]:
+        """The matches starting in data[start:stop], found a window at a time
+
+        data is bytes or an mmap; a mapping's pages are released as the scan
+        moves past them, so a file of any size costs about one window of
+        memory. line and column are those of data[start]; returns the hits
+        and the line and column at stop.
+        """
+        stop = len(data) if stop is None else stop
+        hits = []
+        released = max(0, start - overlap)
+        released -= released % mmap.PAGESIZE
+        for at in range(start, stop, window):
+            until = min(at + window, stop)
+            lo, end = max(0, at - overlap), min(len(data), until + overlap)
+            lowered = data[lo:end].lower()
+            matches = self._matches(data, lowered, lo, at, until, end)
+            found, line, column = self._locate(matches, lowered, lo, at, until, path, line, column)
+            hits.extend(found)
+            released = release_pages(data, released, until - overlap)
+        return hits, line, column
+
+    def scan_stream(self, stream: BinaryIO, path: str, binaries: bool = True, window: int = WINDOW_BYTES,
+                    overlap: int = OVERLAP_BYTES) -> Optional[List[Hit]]:
+        """The matches in a file object's contents, read a window at a time into one reused buffer
+
+        Returns None, having read only the first window, for a binary file
+        when not `binaries`.
+        """
+        buffer = bytearray(window + 2 * overlap)
+        hits = []
+        line, column = 1, 1
+        filled, start, eof = 0, 0, False
+        with memoryview(buffer) as view:
+            while True:
+                while filled < len(buffer) and not eof:
+                    n = stream.readinto(view[filled:])
+                    eof = not n
+                    filled += n or 0
+                if start == 0 and not binaries and is_binary(buffer[:min(filled, BINARY_SNIFF_BYTES)]):
+                    return None
+                stop = filled if eof else filled - overlap
+                lo = max(0, start - overlap)
+                lowered = buffer[lo:filled].lower()
+                matches = self._matches(buffer, lowered, lo, start, stop, filled)
+                found, line, column = self._locate(matches, lowered, lo, start, stop, path, line, column)
+                hits.extend(found)
+                if eof:
+                    return hits
+                # Keep the unreported tail and the context before it; the rest of the buffer is refilled
+                buffer[:2 * overlap] = view[stop - overlap:filled]
+                filled, start = 2 * overlap, overlap
+
+    def _matches(self, data, lowered: bytes, lo: int, start: int, stop: int,
+                 end: int) -> List[Tuple[int, "Rule", "re.Match"]]:
+        """(position, rule, match) of the matches starting in data[start:stop], in order
+
+        Anchors are found and regexes run on data itself (bytes, bytearray or
+        mmap, never copied), within data[lo:end]; lowered is
+        data[lo:end].lower(), for the case-insensitive anchors. Matches in
+        the context either side are found too, so that a specific rule there
+        still overrides a fallback rule inside the range.
+        """
+        matches = []
+        seen: Set[Tuple[str, int]] = set()
+        for haystack, shift, anchors in ((data, 0, self._exact), (lowered, lo, self._folded)):
+            for anchor, entries in anchors:
+                find = haystack.find
+                bound = end - shift
+                pos = find(anchor, lo - shift, bound)
+                while pos != -1:
+                    at = pos + shift
+                    for rule, regex in entries:
+                        match = regex.match(data, at, end)
+                        if match is None or (rule.id, match.end()) in seen:
+                            continue
+                        if regex.groups and not plausible_secret(rule, match.group(1)):
+                            continue
+                        seen.add((rule.id, match.end()))
+                        matches.append((at, rule, match))
+                    pos = find(anchor, pos + 1, bound)
+        fallbacks = [item for item in matches if item[1].fallback]
+        if fallbacks:
+            claimed = [item[2].span() for item in matches if not item[1].fallback]
+            matches = [item for item in matches if not item[1].fallback]
+            matches += [item for item in fallbacks
+                        if not any(left < item[2].end(1) and item[2].start(1) < right for left, right in claimed)]
+        matches = [item for item in matches if start <= item[0] < stop]
+        matches.sort(key=lambda item: item[0])
+        return matches
+
+    @staticmethod
+    def _locate(matches, lowered: bytes, lo: int, start: int, stop: int, path: str, line: int,
+                column: int) -> Tuple[List[Hit], int, int]:
+        """Hits for matches in data[start:stop], given the line and column of data[start]
+
+        Newlines are counted in lowered, the copy of data[lo:]. Returns the
+        hits and the line and column at stop.
+        """
+        hits = []
+        counted = start
+        for pos, rule, match in matches:
+            line += lowered.count(b"\n", counted - lo, pos - lo)
+            counted = pos
+            newline = lowered.rfind(b"\n", start - lo, pos - lo)
+            hits.append(Hit(rule.id, path, line, pos - lo - newline if newline != -1 else column + pos - start,
+                            _excerpt(rule, match)))
+        line += lowered.count(b"\n", counted - lo, stop - lo)
+        newline = lowered.rfind(b"\n", start - lo, stop - lo)
+        return hits, line, stop - lo - newline if newline != -1 else column + stop - start
+
+
+MATCHER = Matcher()
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+
+# Linux and macOS; elsewhere a mapping's pages stay resident until it is closed
+MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)
+
+
+def release_pages(data, start: int, stop: int) -> int:
+    """Drop an mmap's pages in [start, stop) from this process; start is page-aligned
+
+    The file's pages stay in the page cache, so touching them again just
+    maps them back in. Returns the offset released up to, rounded down to a
+    page.
+    """
+    stop -= stop % mmap.PAGESIZE
+    if stop <= start:
+        return start
+    if MADV_DONTNEED is not None and isinstance(data, mmap.mmap):
+        data.madvise(MADV_DONTNEED, start, stop - start)
+    return stop
+
+
+def blob_id(data) -> str:
+    """The git object id of a file with these contents: bytes, or an mmap hashed a window at a time"""
+    digest = hashlib.sha1(b"blob %d\0" % len(data))
+    if isinstance(data, mmap.mmap):
+        released = 0
+        with memoryview(data) as view:
+            for at in range(0, len(data), WINDOW_BYTES):
+                digest.update(view[at:at + WINDOW_BYTES])
+                released = release_pages(data, released, at + WINDOW_BYTES)
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+@dataclass
+class BatchResult:
+    hits: List[Hit] = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0
+    skipped: int = 0  # binary, unreadable or (git blobs) too large
+    cache_hits: int = 0  # files whose findings came from the cache
+    bytes_skipped: int = 0  # in those files
+    fresh: Dict[str, Tuple[int, CachedHits]] = field(default_factory=dict)  # blob id -> (size, findings) to cache
+    seen: List[Tuple[str, int, int, str]] = field(default_factory=list)  # (path, size, mtime_ns, blob id) read
+
+    def add(self, other: "BatchResult") -> None:
+        self.hits.extend(other.hits)
+        self.files += other.files
+        self.bytes += other.bytes
+        self.skipped += other.skipped
+        self.cache_hits += other.cache_hits
+        self.bytes_skipped += other.bytes_skipped
+        self.fresh.update(other.fresh)
+        self.seen.extend(other.seen)
+
+    def scanned(self, size: int, hits: List[Hit], blob: Optional[str] = None) -> None:
+        """Add a scanned file's findings, and keep them for the cache if its blob id is known"""
+        self.hits.extend(hits)
+        self.files += 1
+        self.bytes += size
+        if blob:
+            self.fresh[blob] = (size, [(hit.rule, hit.line, hit.column, hit.excerpt) for hit in hits])
+
+    def progress(self) -> Dict:
+        """Counters so far, named as in ScanResult.stats()"""
+        return {
+            "files_scanned": self.files,
+            "bytes_scanned": self.bytes,
+            "files_skipped": self.skipped,
+            "files_cached": self.cache_hits,
+            "bytes_skipped": self.bytes_skipped,
+            "findings": len(self.hits),
+        }
+
+    def reuse(self, path: str, size: int, hits: CachedHits) -> None:
+        """Take a file's findings from the cache"""
+        self.cache_hits += 1
+        if hits is None:
+            self.skipped += 1
+            return
+        self.bytes_skipped += size
+        self.hits.extend(Hit(rule, path, line, column, excerpt) for rule, line, column, excerpt in hits)
+
+
+# Worker processes' read-only view of the cache, opened by _init_worker
+_worker_cache: Optional[ScanCache] = None
+
+
+def _init_worker(cache_path: Optional[str]) -> None:
+    global _worker_cache
+    if cache_path:
+        _worker_cache = ScanCache(cache_path, RULESET_VERSION, readonly=True)
+
+
+def _scan_batch(result: BatchResult, files: List[Tuple[str, Optional[bytes], Optional[str]]],
+                cache: Optional[ScanCache], binaries: bool) -> BatchResult:
+    cached = cache.get_blobs(blob for _, _, blob in files if blob) if cache is not None else {}
+    for path, data, blob in files:
+        if blob in cached:
+            result.reuse(path, *cached[blob])
+            continue
+        if data is None or (not binaries and is_binary(data)):
+            result.skipped += 1
+            if blob and data is not None:
+                result.fresh[blob] = (len(data), None)
+            continue
+        result.scanned(len(data), MATCHER.scan(data, path), blob)
+    return result
+
+
+def _scan_mapped(result: BatchResult, f: BinaryIO, path: str, mtime_ns: int, binaries: bool,
+                 record: bool, cache: Optional[ScanCache]) -> None:
+    """Scan a file too large to read whole through a read-only mapping, a window at a time"""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+        if not binaries and is_binary(data[:BINARY_SNIFF_BYTES]):
+            result.skipped += 1
+            return
+        blob = None
+        if record:
+            blob = blob_id(data)
+            result.seen.append((path, len(data), mtime_ns, blob))
+            cached = cache.get_blobs([blob]) if cache is not None else {}
+            if blob in cached:
+                result.reuse(path, *cached[blob])
+                return
+        result.scanned(len(data), MATCHER.scan_buffer(data, path)[0], blob)
+
+
+def scan_blobs(blobs: List[Tuple[str, Optional[bytes], Optional[str]]], record: bool = False,
+               binaries: bool = False) -> BatchResult:
+    """Scan in-memory file contents: (path, data or None if too large to read, blob id if known)
+
+    The caller has already taken whatever it could from the cache. With
+    `record`, results are returned by blob id for caching. Binary files are
+    skipped unless `binaries`.
+    """
+    if record:
+        blobs = [(path, data, blob or (data is not None and blob_id(data)) or None) for path, data, blob in blobs]
+    return _scan_batch(BatchResult(), blobs, None, binaries)
+
+
+def scan_files(root: str, entries: List[Tuple[str, int, int]], record: bool = False,
+               cache: Optional[ScanCache] = None, binaries: bool = False) -> BatchResult:
+    """Scan files under root, given as (relative path, size, mtime_ns)
+
+    Files up to READ_BYTES are read whole, larger ones mapped. With
+    `record`, files are identified by blob id: ones already in the cache
+    (the worker's, or `cache` when scanning in-process) are not scanned,
+    and results are returned for caching. Binary files are skipped unless
+    `binaries`.
+    """
+    result = BatchResult()
+    cache = (cache or _worker_cache) if record else None
+    files = []
+    for path, _, mtime_ns in entries:
+        try:
+            with open(os.path.join(root, path), "rb") as f:
+                if os.fstat(f.fileno()).st_size > READ_BYTES:
+                    _scan_mapped(result, f, path, mtime_ns, binaries, record, cache)
+                    continue
+                data = f.read(READ_BYTES)
+        except (OSError, ValueError):  # ValueError: mapping a file emptied since the walk
+            result.skipped += 1
+            continue
+        blob = None
+        if record:
+            blob = blob_id(data)
+            result.seen.append((path, len(data), mtime_ns, blob))
+        files.append((path, data, blob))
+    return _scan_batch(result, files, cache, binaries)
+
+
+def scan_range(path: str, start: int, stop: int) -> Tuple[List[Hit], int, int]:
+    """The matches starting in bytes [start, stop) of a large file, and the line and column at stop
+
+    Lines and columns are counted from start, for the caller to offset by
+    the ranges before.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return MATCHER.scan_buffer(data, os.path.basename(path), start, stop)
+
+
+def walk(root: str) -> Iterator[Tuple[str, int, int]]:
+    """(relative path, size, mtime_ns) of the regular files under root; symlinks are not followed"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    yield os.path.relpath(entry.path, root), st.st_size, st.st_mtime_ns
+            except OSError:
+                continue
+
+
+# Repository config can run commands (fsmonitor) and scanned checkouts belong to other users
+GIT = ("git", "-c", "safe.directory=*", "-c", "core.fsmonitor=false")
+GIT_TIMEOUT = 300
+REVISION = re.compile(r"^[A-Za-z0-9_][\w./~^@{}+-]{0,199}$")
+
+
+def git_changes(repo: str, base: str, head: str) -> List[Tuple[str, str]]:
+    """(path, blob id) of the files added or modified from base to head"""
+    for revision in (base, head):
+        if not REVISION.match(revision):
+            raise ValueError(f"Invalid git revision {revision!r}")
+    try:
+        out = subprocess.run(
+            [*GIT, "-C", repo, "diff", "--raw", "-z", "--no-renames", "--no-abbrev", "--no-ext-diff",
+             "--no-textconv", base, head, "--"],
+            capture_output=True, check=True, timeout=GIT_TIMEOUT
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"git diff {base} {head} failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+    fields = out.split(b"\0")
+    changes = []
+    # Each change is ":old_mode new_mode old_blob new_blob status" then the path
+    for meta, path in zip(fields[0::2], fields[1::2]):
+        _, mode, _, blob, status = meta.decode().split(" ")
+        # Deleted files, symlinks (120000) and submodules (160000) have nothing to scan
+        if status != "D" and mode.startswith("100"):
+            changes.append((path.decode("utf-8", "surrogateescape"), blob))
+    return changes
+
+
+def git_blobs(repo: str, blobs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, Optional[bytes], str]]:
+    """(path, contents, blob id) for (path, blob id) pairs, read by one git cat-file process"""
+    with subprocess.Popen([*GIT, "-C", repo, "cat-file", "--batch"],
+                          stdin=subprocess.PIPE, stdout=subprocess.PIPE) as process:
+        try:
+            for path, blob in blobs:
+                process.stdin.write(blob.encode() + b"\n")
+                process.stdin.flush()
+                header = process.stdout.readline().split()
+                if len(header) != 3 or header[1] != b"blob":
+                    yield path, None, blob  # missing
+                    continue
+                size = int(header[2])
+                if size > MAX_BLOB_BYTES:
+                    for offset in range(0, size, 1 << 20):
+                        process.stdout.read(min(1 << 20, size - offset))
+                    data = None
+                else:
+                    data = process.stdout.read(size)
+                process.stdout.read(1)  # newline after the contents
+                yield path, data, blob
+        finally:
+            process.stdin.close()
+
+
+@dataclass
+class ScanResult:
+    hits: List[Hit]
+    files: int
+    bytes: int
+    skipped: int
+    elapsed: float
+    cache_hits: int = 0
+    bytes_skipped: int = 0
+    mode: str = "directory"
+    extra: Dict = field(default_factory=dict)
+
+    def stats(self) -> Dict:
+        looked_up = self.cache_hits + self.files
+        return {
+            "mode": self.mode,
+            **self.extra,
+            "files_scanned": self.files,
+            "bytes_scanned": self.bytes,
+            "files_skipped": self.skipped,
+            "files_cached": self.cache_hits,
+            "bytes_skipped": self.bytes_skipped,
+            "cache_hit_rate": round(self.cache_hits / looked_up, 4) if looked_up else 0.0,
+            "elapsed_s": round(self.elapsed, 3),
+            "mb_per_s": round(self.bytes / self.elapsed / 1e6, 1) if self.elapsed else 0.0,
+            "ruleset_version": RULESET_VERSION,
+        }
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class RepoScanner:
+    """Scans checkouts, archives and git revision ranges on a process pool of `workers` processes
+
+    With one worker, files are scanned in the calling thread instead. With a
+    `cache_path`, results are cached there and scans are incremental.
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_bytes: int = BATCH_BYTES,
+                 cache_path: Optional[str] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_bytes = batch_bytes
+        self.cache_path = cache_path
+        self.cache = ScanCache(cache_path, RULESET_VERSION) if cache_path else None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=(self.cache_path,))
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    def scan(self, target: str, base: Optional[str] = None, head: Optional[str] = None,
+             binaries: bool = False, progress: Optional[Callable[[BatchResult], None]] = None) -> ScanResult:
+        """Scan a directory, a tar (optionally compressed) or zip archive, or a single file
+
+        Given `base` (and optionally `head`, default HEAD), target is a git
+        repository and only the files changed from base to head are scanned.
+        Binary files are skipped unless `binaries`, as when checking an
+        artifact; such scans bypass the cache.
+
+        `progress` is called in this thread with the running totals after
+        each batch, and once more at the end. Hits are appended to
+        total.hits in the order they are found, and only sorted after the
+        last call.
+        """
+        start = time.perf_counter()
+        total = BatchResult()
+        record = self.cache is not None and not binaries
+        # Pool workers open their own connection to the cache
+        inline_cache = self.cache if self.workers <= 1 else None
+        root, extra = None, {"binaries": True} if binaries else {}
+        if base is not None:
+            mode = "git-diff"
+            head = head or "HEAD"
+            changes = git_changes(target, base, head)
+            extra.update(base=base, head=head, files_changed=len(changes))
+            # Blob ids come with the diff, so cached files are not even read
+            missing = self._uncached_blobs([(path, None, blob) for path, blob in changes], total)
+            blobs = git_blobs(target, [(path, blob) for path, _, blob in missing])
+            tasks = ((scan_blobs, batch, record, binaries)
+                     for batch in self._blob_batches(blobs, total, lookup=False))
+        elif os.path.isdir(target):
+            mode, root = "directory", target
+            files = self._changed_files(root, walk(root), total) if record else walk(root)
+            tasks = ((scan_files, root, batch, record, inline_cache, binaries) for batch in self._batches(files))
+        elif os.path.isfile(target) and (zipfile.is_zipfile(target) or tarfile.is_tarfile(target)):
+            mode = "zip" if zipfile.is_zipfile(target) else "tarball"
+            members = self._archive_members(target, total, record, binaries)
+            tasks = ((scan_blobs, batch, record, binaries) for batch in self._blob_batches(members, total, record))
+        elif os.path.isfile(target):
+            mode, root = "file", os.path.dirname(target)
+            st = os.stat(target)
+            if self.workers > 1 and st.st_size > RANGE_BYTES:
+                tasks = iter(())
+                self._scan_ranges(target, st.st_size, total, binaries, progress)
+            else:
+                tasks = iter([(scan_files, root, [(os.path.basename(target), st.st_size, st.st_mtime_ns)], record,
+                               inline_cache, binaries)])
+        else:
+            raise ValueError(f"{target} is not a file, directory or archive")
+        if self.workers <= 1:
+            for function, *args in tasks:
+                total.add(function(*args))
+                if progress is not None:
+                    progress(total)
+        else:
+            self._run(tasks, total, progress)
+        if progress is not None:
+            progress(total)
+        if self.cache is not None and (total.fresh or total.seen):
+            self.cache.put(total.fresh, root, total.seen)
+        total.hits.sort(key=lambda hit: (hit.path, hit.line, hit.column))
+        return ScanResult(total.hits, total.files, total.bytes, total.skipped, time.perf_counter() - start,
+                          total.cache_hits, total.bytes_skipped, mode, extra)
+
+    def _run(self, tasks, total: BatchResult, progress: Optional[Callable[[BatchResult], None]]) -> None:
+        # At most two batches per worker in flight, so a tarball is not read into memory ahead of the pool
+        executor = self._executor()
+        pending: Set[Future] = set()
+        try:
+            for function, *args in tasks:
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        total.add(future.result())
+                    if progress is not None:
+                        progress(total)
+                pending.add(executor.submit(function, *args))
+            for future in pending:
+                total.add(future.result())
+                if progress is not None:
+                    progress(total)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _changed_files(self, root: str, files: Iterable[Tuple[str, int, int]],
+                       total: BatchResult) -> Iterator[Tuple[str, int, int]]:
+        """Files whose size or mtime changed since they were last scanned; the rest come from the cache"""
+        if self.cache is None:
+            yield from files
+            return
+        for chunk in _chunks(files, 500):
+            known = self.cache.get_files(root, (path for path, _, _ in chunk))
+            unchanged = {path: record[2] for path, size, mtime_ns in chunk
+                         if (record := known.get(path)) is not None and record[:2] == (size, mtime_ns)}
+            cached = self.cache.get_blobs(unchanged.values())
+            for path, size, mtime_ns in chunk:
+                blob = unchanged.get(path)
+                if blob in cached:
+                    total.reuse(path, *cached[blob])
+                else:
+                    yield path, size, mtime_ns
+
+    def _uncached_blobs(self, blobs: List[Tuple[str, Optional[bytes], Optional[str]]],
+                        total: BatchResult) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+        """The blobs whose findings are not cached; the rest are added to total"""
+        if self.cache is None:
+            return blobs
+        cached = self.cache.get_blobs(blob for _, _, blob in blobs if blob)
+        missing = []
+        for path, data, blob in blobs:
+            if blob in cached:
+                total.reuse(path, *cached[blob])
+            else:
+                missing.append((path, data, blob))
+        return missing
+
+    def _batches(self, files: Iterable[Tuple[str, int, int]]) -> Iterator[List[Tuple[str, int, int]]]:
+        batch, size = [], 0
+        for entry in files:
+            batch.append(entry)
+            size += entry[1]
+            if size >= self.batch_bytes or len(batch) >= BATCH_FILES:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    def _blob_batches(self, blobs: Iterable[Tuple[str, Optional[bytes], Optional[str]]], total: BatchResult,
+                      lookup: bool = True) -> Iterator[List[Tuple[str, Optional[bytes], Optional[str]]]]:
+        batch, size = [], 0
+        for entry in itertools.chain(blobs, [None]):
+            if entry is not None:
+                batch.append(entry)
+                size += len(entry[1] or b"")
+                if size < self.batch_bytes and len(batch) < BATCH_FILES:
+                    continue
+            if lookup:
+                batch = self._uncached_blobs(batch, total)
+            if batch:
+                yield batch
+            batch, size = [], 0
+
+    def _scan_ranges(self, target: str, size: int, total: BatchResult, binaries: bool,
+                     progress: Optional[Callable[[BatchResult], None]]) -> None:
+        """Scan one large file as RANGE_BYTES ranges over the pool, bypassing the cache"""
+        if not binaries:
+            with open(target, "rb") as f:
+                if is_binary(f.read(BINARY_SNIFF_BYTES)):
+                    total.skipped += 1
+                    return
+        starts = range(0, size, RANGE_BYTES)
+        stops = [min(at + RANGE_BYTES, size) for at in starts]
+        line, column = 1, 1
+        for hits, lines, columns in self._executor().map(scan_range, itertools.repeat(target), starts, stops):
+            # Each range counted lines and columns from its own start
+            total.hits.extend(hit._replace(line=line + hit.line - 1,
+                                           column=column + hit.column - 1 if hit.line == 1 else hit.column)
+                              for hit in hits)
+            line, column = line + lines - 1, columns if lines > 1 else column + columns - 1
+            if progress is not None:
+                progress(total)
+        total.files += 1
+        total.bytes += size
+
+    def _archive_members(self, target: str, total: BatchResult, record: bool,
+                         binaries: bool) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+        """(path, contents, blob id) of a zip or tar archive's members, read as a stream
+
+        Members over READ_BYTES are not returned but streamed through the
+        matcher here, a window at a time, and bypass the cache.
+        """
+        if zipfile.is_zipfile(target):
+            with zipfile.ZipFile(target) as archive:
+                yield from self._members(((info.filename, info.file_size, functools.partial(archive.open, info))
+                                          for info in archive.infolist() if not info.is_dir()),
+                                         total, record, binaries)
+        else:
+            # Stream mode: members are read in archive order and never seeked back to
+            with tarfile.open(target, "r|*") as archive:
+                yield from self._members(((member.name, member.size, functools.partial(archive.extractfile, member))
+                                          for member in archive if member.isfile()),
+                                         total, record, binaries)
+
+    def _members(self, members: Iterable[Tuple[str, int, Callable[[], BinaryIO]]], total: BatchResult,
+                 record: bool, binaries: bool) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+        for name, size, open_member in members:
+            try:
+                with open_member() as stream:
+                    if size > READ_BYTES:
+                        hits = MATCHER.scan_stream(stream, name, binaries)
+                    else:
+                        data = stream.read()
+            except (OSError, RuntimeError, zipfile.BadZipFile, zlib.error):  # encrypted or corrupt zip members
+                total.skipped += 1
+                continue
+            if size <= READ_BYTES:
+                yield name, data, blob_id(data) if record else None
+            elif hits is None:
+                total.skipped += 1
+            else:
+                total.scanned(size, hits)
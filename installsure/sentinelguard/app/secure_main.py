@@ -3,21 +3,37 @@
 Secure SentinelGuard Service Implementation
 Following MIT representation invariants and Harvard security analysis standards
 """
-from fastapi import FastAPI, Body, HTTPException, Depends, Request
+from fastapi import FastAPI, Body, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field, validator, HttpUrl
-from typing import Dict, List, Optional, Set
+from pydantic import BaseModel, Field, validator
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from contextlib import asynccontextmanager
+import json
+import os
+import tempfile
+import threading
 import uuid
 import time
 from datetime import datetime, timedelta
 import logging
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field, replace
 import hashlib
 import secrets
+
+from httpmetrics import instrument
+from jobevents import HEARTBEAT_SECONDS, SSE_HEADERS, JobEventBus
+from profiling import install_profiling
+from ratelimit import RateLimiter, make_backend
+from replay import install_capture
 import re
 from enum import Enum
 
+from .findings_store import MAX_PAGE, FindingsPage, FindingsStore
+from .scan_jobs import QueueFull, ScanQueue
+from .scanner import RULES_BY_ID, BatchResult, RepoScanner
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,10 +45,37 @@ MAX_REQUEST_SIZE = 1024 * 1024  # 1MB limit
 RATE_LIMIT_REQUESTS = 50  # Lower limit for security operations
 RATE_LIMIT_WINDOW = 3600  # 1 hour
 
+# Repository scans read local checkouts and tarballs, and only those under these directories
+SCAN_ROOTS = [root for root in os.environ.get("SENTINELGUARD_SCAN_ROOTS", "/data/repos").split(os.pathsep) if root]
+# Files are scanned in a pool of SCAN_WORKERS processes (default: CPU count)
+SCAN_WORKERS = int(os.environ.get("SENTINELGUARD_SCAN_WORKERS", "0")) or None
+# Findings per file contents are kept here so rescans skip unchanged files; empty disables
+SCAN_CACHE = os.environ.get("SENTINELGUARD_SCAN_CACHE",
+                            os.path.join(tempfile.gettempdir(), "sentinelguard", "scan-cache.sqlite3"))
+
+if SCAN_CACHE:
+    os.makedirs(os.path.dirname(SCAN_CACHE) or ".", exist_ok=True)
+repo_scanner = RepoScanner(workers=SCAN_WORKERS, cache_path=SCAN_CACHE or None)
+# Scans run in the background, SCAN_RUNNERS at a time; beyond SCAN_QUEUE_SIZE waiting, requests get 503
+SCAN_RUNNERS = int(os.environ.get("SENTINELGUARD_SCAN_RUNNERS", "2"))
+SCAN_QUEUE_SIZE = int(os.environ.get("SENTINELGUARD_SCAN_QUEUE_SIZE", "256"))
+scan_queue = ScanQueue(runners=SCAN_RUNNERS, max_queue=SCAN_QUEUE_SIZE)
+# Progress of running scans, for clients following their findings
+scan_events = JobEventBus()
+# Findings of every scan, indexed for /v1/findings; empty keeps them in a temporary file for this process
+FINDINGS_DB = os.environ.get("SENTINELGUARD_FINDINGS_DB", "")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    scan_queue.shutdown()
+    repo_scanner.shutdown()
+
 app = FastAPI(
     title="SentinelGuard Secure",
     version="1.0.0",
-    description="Secure vulnerability scanning system with MIT/Harvard compliance"
+    description="Secure vulnerability scanning system with MIT/Harvard compliance",
+    lifespan=lifespan
 )
 
 # Secure CORS configuration
@@ -44,8 +87,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting storage
-rate_limit_storage: Dict[str, List[float]] = {}
+# Sliding-window rate limiting; set RATE_LIMIT_REDIS_URL to share budgets across replicas
+rate_limiter = RateLimiter(
+    RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW,
+    backend=make_backend(os.environ.get("RATE_LIMIT_REDIS_URL"), RATE_LIMIT_WINDOW)
+)
 
 # Enums for type safety
 class FindingType(str, Enum):
@@ -81,6 +127,9 @@ class Finding:
     scan_id: str
     timestamp: datetime
     severity_score: int
+    rule: str = ""
+    column: int = 1
+    excerpt: str = ""  # secrets are redacted to their first characters
     
     def __post_init__(self):
         # Validate finding properties per MIT invariants
@@ -95,18 +144,22 @@ class Finding:
 class ScanReport:
     """Immutable scan report following MIT invariants"""
     id: str
-    findings: List[Finding]
     timestamp: datetime
     status: ScanStatus
     target: str
     scan_type: str
+    severity_counts: Dict[str, int] = field(default_factory=dict)  # findings so far per FindingType value
+    stats: Dict = field(default_factory=dict)
+    progress: Dict = field(default_factory=dict)  # counters so far while RUNNING, final ones after
+    error: Optional[str] = None
+    
+    @property
+    def findings_count(self) -> int:
+        return sum(self.severity_counts.values())
     
     def __post_init__(self):
         # Validate scan report properties
-        if self.status == ScanStatus.COMPLETED and not self.findings:
-            # Allow completed scans with no findings
-            pass
-        if self.status == ScanStatus.FAILED and self.findings:
+        if self.status == ScanStatus.FAILED and self.findings_count:
             raise ValueError("Failed scans cannot have findings")
 
 @dataclass
@@ -124,13 +177,25 @@ class QuarantinedArtifact:
 
 # Secure storage with proper isolation
 class SecureScanStorage:
-    """Thread-safe scan storage with MIT invariant preservation"""
+    """Thread-safe scan storage with MIT invariant preservation
+
+    Findings go to a FindingsStore as they are found, so a scan lists them
+    in discovery order; each report keeps its counts per severity, updated
+    as findings are added. Changes are published to an optional JobEventBus
+    for clients following a scan.
+    """
     
-    def __init__(self):
+    def __init__(self, events: Optional[JobEventBus] = None, findings: Optional[FindingsStore] = None):
         self._scans: Dict[str, ScanReport] = {}
-        self._findings: Dict[str, Finding] = {}
+        self._findings = findings or FindingsStore()
         self._quarantine: Dict[str, QuarantinedArtifact] = {}
         self._lock = threading.Lock()
+        self._events = events
+        self._running = 0  # scans in RUNNING, kept by update_scan_status for /metrics
+    
+    @property
+    def running(self) -> int:
+        return self._running
     
     def create_scan(self, scan_id: str, target: str, scan_type: str) -> ScanReport:
         """Create new scan with proper validation"""
@@ -140,7 +205,6 @@ class SecureScanStorage:
             
             scan = ScanReport(
                 id=scan_id,
-                findings=[],
                 timestamp=datetime.utcnow(),
                 status=ScanStatus.PENDING,
                 target=target,
@@ -150,8 +214,9 @@ class SecureScanStorage:
             return scan
     
     def update_scan_status(self, scan_id: str, status: ScanStatus, 
-                          findings: List[Finding] = None) -> ScanReport:
-        """Update scan status with invariant preservation"""
+                          findings: List[Finding] = None, stats: Dict = None,
+                          error: Optional[str] = None) -> ScanReport:
+        """Update scan status, adding any findings not yet recorded, with invariant preservation"""
         with self._lock:
             if scan_id not in self._scans:
                 raise ValueError(f"Scan {scan_id} not found")
@@ -162,23 +227,58 @@ class SecureScanStorage:
             if old_scan.status == ScanStatus.COMPLETED and status != ScanStatus.COMPLETED:
                 raise ValueError("Cannot modify completed scans")
             
-            new_findings = findings or old_scan.findings
+            # A failed scan's partial findings are dropped with it
+            if status == ScanStatus.FAILED:
+                self._findings.delete_scan(scan_id)
+                counts = {}
+            else:
+                counts = self._add_findings(old_scan, findings or [])
             new_scan = ScanReport(
                 id=scan_id,
-                findings=new_findings,
                 timestamp=old_scan.timestamp,
                 status=status,
                 target=old_scan.target,
-                scan_type=old_scan.scan_type
+                scan_type=old_scan.scan_type,
+                severity_counts=counts,
+                stats=stats or old_scan.stats,
+                progress=old_scan.progress,
+                error=error or old_scan.error
             )
             
             self._scans[scan_id] = new_scan
-            
-            # Store findings separately
-            for finding in new_findings:
-                self._findings[finding.id] = finding
-            
-            return new_scan
+            self._running += (status == ScanStatus.RUNNING) - (old_scan.status == ScanStatus.RUNNING)
+        self._publish(new_scan)
+        return new_scan
+    
+    def record_progress(self, scan_id: str, findings: List[Finding], progress: Dict) -> ScanReport:
+        """Append a running scan's new findings and replace its progress counters"""
+        with self._lock:
+            old_scan = self._scans.get(scan_id)
+            if old_scan is None or old_scan.status != ScanStatus.RUNNING:
+                raise ValueError(f"Scan {scan_id} is not running")
+            new_scan = replace(old_scan, severity_counts=self._add_findings(old_scan, findings), progress=progress)
+            self._scans[scan_id] = new_scan
+        self._publish(new_scan)
+        return new_scan
+    
+    def _add_findings(self, scan: ScanReport, findings: List[Finding]) -> Dict[str, int]:
+        """Store a scan's new findings; returns its counts per severity with them"""
+        if not findings:
+            return scan.severity_counts
+        self._findings.add(finding_dict(f) for f in findings)
+        counts = dict(scan.severity_counts)
+        for finding in findings:
+            counts[finding.type.value] = counts.get(finding.type.value, 0) + 1
+        return counts
+    
+    def _publish(self, scan: ScanReport) -> None:
+        if self._events is not None and self._events.watching(scan.id):
+            self._events.publish(scan.id, {"id": scan.id, "status": scan.status.value,
+                                           "findings_count": scan.findings_count, "progress": scan.progress})
+    
+    def list_findings(self, **filters) -> FindingsPage:
+        """A page of findings across scans; see FindingsStore.query"""
+        return self._findings.query(**filters)
     
     def get_scan(self, scan_id: str) -> Optional[ScanReport]:
         """Get scan by ID (immutable copy)"""
@@ -209,21 +309,23 @@ class SecureScanStorage:
             return self._quarantine.get(artifact_id)
 
 # Initialize secure storage
-scan_storage = SecureScanStorage()
+scan_storage = SecureScanStorage(events=scan_events, findings=FindingsStore(FINDINGS_DB))
 
 # Input validation models
 class ScanRequest(BaseModel):
     """Validated scan request"""
-    target: HttpUrl = Field(..., description="Target URL to scan")
-    scan_type: str = Field(..., regex="^(system|repo|file)$")
+    target: str = Field(..., min_length=1, max_length=1000,
+                        description="Checkout directory, tar or zip archive, or file, absolute or relative "
+                                    "to the first scan root")
+    scan_type: str = Field(..., pattern="^(system|repo|file)$")
     options: Optional[Dict] = Field(default_factory=dict)
     
     @validator('target')
     def validate_target(cls, v):
-        # Additional URL validation
-        if not v.scheme in ['http', 'https']:
-            raise ValueError("Only HTTP/HTTPS URLs allowed")
-        return v
+        # Remote repositories are not fetched; scan a local clone instead
+        if "://" in v:
+            raise ValueError("Scan targets must be local paths under SENTINELGUARD_SCAN_ROOTS")
+        return resolve_scan_target(v)
 
 class QuarantineRequest(BaseModel):
     """Validated quarantine request"""
@@ -240,6 +342,19 @@ class QuarantineRequest(BaseModel):
         return v
 
 # Security utilities
+def resolve_scan_target(target: str) -> str:
+    """Real path of a scan target, which must exist under one of SCAN_ROOTS"""
+    if not SCAN_ROOTS:
+        raise ValueError("Repository scanning is disabled (SENTINELGUARD_SCAN_ROOTS is empty)")
+    # Resolving symlinks and '..' first means a target cannot escape its root
+    path = os.path.realpath(os.path.join(SCAN_ROOTS[0], target))
+    for root in map(os.path.realpath, SCAN_ROOTS):
+        if os.path.commonpath([root, path]) == root:
+            if not os.path.exists(path):
+                raise ValueError("Scan target not found")
+            return path
+    raise ValueError("Scan target must be under SENTINELGUARD_SCAN_ROOTS")
+
 def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """Verify JWT token"""
     token = credentials.credentials
@@ -249,22 +364,13 @@ def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(securit
 
 def check_rate_limit(request: Request) -> None:
     """Check rate limiting"""
-    client_ip = request.client.host
-    now = time.time()
-    
-    if client_ip not in rate_limit_storage:
-        rate_limit_storage[client_ip] = []
-    
-    # Clean old requests
-    rate_limit_storage[client_ip] = [
-        req_time for req_time in rate_limit_storage[client_ip]
-        if now - req_time < RATE_LIMIT_WINDOW
-    ]
-    
-    if len(rate_limit_storage[client_ip]) >= RATE_LIMIT_REQUESTS:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-    
-    rate_limit_storage[client_ip].append(now)
+    result = rate_limiter.hit(request.client.host)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, int(result.retry_after + 0.999)))}
+        )
 
 def validate_request_size(request: Request) -> None:
     """Validate request size"""
@@ -276,39 +382,47 @@ class SecurityScanner:
     """Security scanner with proper validation"""
     
     @staticmethod
-    def scan_repo(target: str) -> List[Finding]:
-        """Scan repository for vulnerabilities"""
-        findings = []
-        
-        # Simulate security scan (in production, use real scanners)
-        # Check for common vulnerabilities
-        if "password" in target.lower():
-            findings.append(Finding(
-                id=str(uuid.uuid4()),
-                type=FindingType.MEDIUM,
-                category=FindingCategory.CONFIGURATION,
-                path="config.json",
-                line=1,
-                message="Potential hardcoded password detected",
-                scan_id="",
-                timestamp=datetime.utcnow(),
-                severity_score=6
-            ))
+    def scan_repo(path: str, scan_id: str, base: Optional[str] = None, head: Optional[str] = None,
+                  binaries: bool = False,
+                  progress: Optional[Callable[[List[Finding], Dict], None]] = None) -> Tuple[int, Dict]:
+        """Scan a checkout, archive or file for secrets and insecure patterns
+
+        With `base`, path is a git repository and only the files changed
+        from base to head are scanned. With `binaries`, binary files are
+        scanned too rather than skipped. `progress` is called with each
+        batch's new findings, in discovery order, and the counters so far.
+        Returns the number of findings and the scan's stats.
+        """
+        reported = 0
         
-        if "secret" in target.lower():
-            findings.append(Finding(
-                id=str(uuid.uuid4()),
-                type=FindingType.HIGH,
-                category=FindingCategory.SECRET,
-                path="secrets.yaml",
-                line=1,
-                message="Secret key exposure detected",
-                scan_id="",
-                timestamp=datetime.utcnow(),
-                severity_score=8
-            ))
+        def found(total: BatchResult) -> None:
+            nonlocal reported
+            now = datetime.utcnow()
+            new = [SecurityScanner._finding(hit, scan_id, now) for hit in total.hits[reported:]]
+            reported = len(total.hits)
+            if progress is not None:
+                progress(new, total.progress())
         
-        return findings
+        result = repo_scanner.scan(path, base=base, head=head, binaries=binaries, progress=found)
+        return reported, result.stats()
+    
+    @staticmethod
+    def _finding(hit, scan_id: str, timestamp: datetime) -> Finding:
+        rule = RULES_BY_ID[hit.rule]
+        return Finding(
+            id=str(uuid.uuid4()),
+            type=FindingType(rule.severity),
+            category=FindingCategory(rule.category),
+            path=hit.path,
+            line=hit.line,
+            message=rule.message,
+            scan_id=scan_id,
+            timestamp=timestamp,
+            severity_score=rule.score,
+            rule=rule.id,
+            column=hit.column,
+            excerpt=hit.excerpt
+        )
     
     @staticmethod
     def scan_system() -> List[Finding]:
@@ -330,6 +444,72 @@ class SecurityScanner:
         
         return findings
 
+def finding_dict(f: Finding) -> Dict:
+    return {
+        "id": f.id,
+        "scan_id": f.scan_id,
+        "type": f.type.value,
+        "category": f.category.value,
+        "path": f.path,
+        "line": f.line,
+        "message": f.message,
+        "severity_score": f.severity_score,
+        "rule": f.rule,
+        "column": f.column,
+        "excerpt": f.excerpt,
+        "timestamp": f.timestamp.isoformat()
+    }
+
+# Background scans: each records its own progress and outcome on its report
+def run_system_scan(scan_id: str) -> None:
+    scan_storage.update_scan_status(scan_id, ScanStatus.RUNNING)
+    try:
+        findings = SecurityScanner.scan_system()
+    except Exception as e:
+        logger.error(f"System scan error: {e}")
+        scan_storage.update_scan_status(scan_id, ScanStatus.FAILED, error="Internal error")
+        return
+    scan_storage.update_scan_status(scan_id, ScanStatus.COMPLETED, findings)
+    logger.info(f"System scan completed: {scan_id} with {len(findings)} findings")
+
+def run_repo_scan(scan_id: str, target: str, base: Optional[str], head: Optional[str], binaries: bool) -> None:
+    scan_storage.update_scan_status(scan_id, ScanStatus.RUNNING)
+    try:
+        count, stats = SecurityScanner.scan_repo(
+            target, scan_id, base, head, binaries,
+            progress=lambda new, progress: scan_storage.record_progress(scan_id, new, progress)
+        )
+    except ValueError as e:
+        # Not a scannable target, or a git revision range that does not resolve
+        logger.warning(f"Repository scan failed: {scan_id} for {target}: {e}")
+        scan_storage.update_scan_status(scan_id, ScanStatus.FAILED, error=str(e))
+        return
+    except Exception as e:
+        logger.error(f"Repository scan error: {scan_id} for {target}: {e}")
+        scan_storage.update_scan_status(scan_id, ScanStatus.FAILED, error="Internal error")
+        return
+    # Its findings were recorded batch by batch
+    scan_storage.update_scan_status(scan_id, ScanStatus.COMPLETED, stats=stats)
+    logger.info(f"Repository scan completed: {scan_id} for {target}: "
+                f"{count} findings in {stats['files_scanned']} files, {stats['mb_per_s']} MB/s")
+
+def queue_scan(scan_id: str, scan: Callable[[], None]) -> Dict:
+    """Queue a created scan and answer the request that started it"""
+    try:
+        scan_queue.submit(scan)
+    except QueueFull as e:
+        scan_storage.update_scan_status(scan_id, ScanStatus.FAILED, error=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    report = scan_storage.get_scan(scan_id)
+    return {
+        "id": scan_id,
+        "status": report.status.value,
+        "report": f"/v1/reports/{scan_id}",
+        "findings": f"/v1/reports/{scan_id}/findings",
+        "queued": scan_queue.depth,
+        "timestamp": report.timestamp.isoformat()
+    }
+
 # Secure endpoints
 @app.middleware("http")
 async def security_middleware(request: Request, call_next):
@@ -347,10 +527,20 @@ async def security_middleware(request: Request, call_next):
         response.headers["Content-Security-Policy"] = "default-src 'self'"
         
         return response
+    except HTTPException as e:
+        # Exceptions raised here bypass FastAPI's handlers, so answer directly
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
     except Exception as e:
         logger.error(f"Security middleware error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Outermost, so request timings include the security checks
+http_metrics = instrument(app, "sentinelguard")
+# Off unless PROFILING_ENABLED or PROFILING_SAMPLE_RATE is set; X-Profile: 1 also needs PROFILING_HEADER_ENABLED
+profiler = install_profiling(app, dependencies=[Depends(verify_jwt_token)])
+# Off unless CAPTURE_PATH is set; then requests are appended to it for replay.py
+install_capture(app)
+
 @app.get("/healthz")
 async def healthz():
     """Health check endpoint"""
@@ -365,129 +555,170 @@ async def readyz():
 async def metrics():
     """Metrics endpoint with proper data"""
     return {
-        "latency_p95_ms": 100,
-        "error_rate": 0.0,
-        "active_scans": len([s for s in scan_storage._scans.values() if s.status == ScanStatus.RUNNING]),
-        "total_findings": len(scan_storage._findings),
+        **http_metrics.summary(),
+        "active_scans": scan_storage.running,
+        "queued_scans": scan_queue.depth,
+        "total_findings": scan_storage._findings.total,
         "quarantined_artifacts": len(scan_storage._quarantine),
         "timestamp": datetime.utcnow().isoformat()
     }
 
-@app.post("/v1/scan/system")
+@app.post("/v1/scan/system", status_code=202)
 async def scan_system(
     token: str = Depends(verify_jwt_token)
 ):
-    """Scan system for vulnerabilities"""
+    """Queue a system scan; poll /v1/reports/{id} for the outcome"""
     try:
         scan_id = str(uuid.uuid4())
-        scan = scan_storage.create_scan(scan_id, "system", "system")
-        
-        # Perform system scan
-        findings = SecurityScanner.scan_system()
-        
-        # Update scan with findings
-        updated_scan = scan_storage.update_scan_status(
-            scan_id, ScanStatus.COMPLETED, findings
-        )
-        
-        # Log security event
-        logger.info(f"System scan completed: {scan_id} with {len(findings)} findings")
-        
-        return {
-            "id": scan_id,
-            "findings": [
-                {
-                    "id": f.id,
-                    "type": f.type.value,
-                    "category": f.category.value,
-                    "path": f.path,
-                    "line": f.line,
-                    "message": f.message,
-                    "severity_score": f.severity_score
-                } for f in findings
-            ],
-            "status": updated_scan.status.value,
-            "timestamp": updated_scan.timestamp.isoformat()
-        }
+        scan_storage.create_scan(scan_id, "system", "system")
+        return queue_scan(scan_id, lambda: run_system_scan(scan_id))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"System scan error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/v1/scan/repo")
+@app.post("/v1/scan/repo", status_code=202)
 async def scan_repo(
     request: ScanRequest,
     token: str = Depends(verify_jwt_token)
 ):
-    """Scan repository for vulnerabilities"""
+    """Queue a repository scan; poll /v1/reports/{id} for progress, or stream its findings"""
     try:
-        scan_id = str(uuid.uuid4())
-        scan = scan_storage.create_scan(scan_id, str(request.target), request.scan_type)
+        # options.base / options.head: scan only the files changed between two git revisions
+        base, head = request.options.get("base"), request.options.get("head")
+        if not all(rev is None or isinstance(rev, str) for rev in (base, head)) or (head and not base):
+            raise HTTPException(status_code=400,
+                                detail="options.base and options.head must be git revisions, and head needs base")
+        # scan_type "file" checks an artifact (a binary, package or archive) byte for byte
+        binaries = request.scan_type == "file"
         
-        # Perform repository scan
-        findings = SecurityScanner.scan_repo(str(request.target))
-        
-        # Update scan with findings
-        updated_scan = scan_storage.update_scan_status(
-            scan_id, ScanStatus.COMPLETED, findings
-        )
-        
-        # Log security event
-        logger.info(f"Repository scan completed: {scan_id} for {request.target}")
-        
-        return {
-            "id": scan_id,
-            "findings": [
-                {
-                    "id": f.id,
-                    "type": f.type.value,
-                    "category": f.category.value,
-                    "path": f.path,
-                    "line": f.line,
-                    "message": f.message,
-                    "severity_score": f.severity_score
-                } for f in findings
-            ],
-            "status": updated_scan.status.value,
-            "timestamp": updated_scan.timestamp.isoformat()
-        }
+        scan_id = str(uuid.uuid4())
+        scan_storage.create_scan(scan_id, request.target, request.scan_type)
+        return queue_scan(scan_id, lambda: run_repo_scan(scan_id, request.target, base, head, binaries))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Repository scan error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def get_scan_or_404(rid: str) -> ScanReport:
+    try:
+        uuid.UUID(rid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid report ID format")
+    scan = scan_storage.get_scan(rid)
+    if not scan:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return scan
+
 @app.get("/v1/reports/{rid}")
 async def get_report(
     rid: str,
     token: str = Depends(verify_jwt_token)
 ):
-    """Get scan report with proper validation"""
+    """Get a scan report: its status, progress and finding counts so far"""
     try:
-        # Validate scan ID format
-        uuid.UUID(rid)
-        
-        scan = scan_storage.get_scan(rid)
-        if not scan:
-            raise HTTPException(status_code=404, detail="Report not found")
+        scan = get_scan_or_404(rid)
         
         return {
             "id": scan.id,
             "status": scan.status.value,
             "target": scan.target,
             "scan_type": scan.scan_type,
-            "findings_count": len(scan.findings),
-            "critical_findings": len([f for f in scan.findings if f.type == FindingType.CRITICAL]),
-            "high_findings": len([f for f in scan.findings if f.type == FindingType.HIGH]),
-            "medium_findings": len([f for f in scan.findings if f.type == FindingType.MEDIUM]),
-            "low_findings": len([f for f in scan.findings if f.type == FindingType.LOW]),
+            "findings_count": scan.findings_count,
+            "critical_findings": scan.severity_counts.get(FindingType.CRITICAL.value, 0),
+            "high_findings": scan.severity_counts.get(FindingType.HIGH.value, 0),
+            "medium_findings": scan.severity_counts.get(FindingType.MEDIUM.value, 0),
+            "low_findings": scan.severity_counts.get(FindingType.LOW.value, 0),
+            "progress": scan.progress,
+            "stats": scan.stats,
+            "error": scan.error,
             "timestamp": scan.timestamp.isoformat()
         }
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid report ID format")
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Report retrieval error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+SCAN_TERMINAL = (ScanStatus.COMPLETED, ScanStatus.FAILED)
+
+async def follow_findings(scan_id: str, offset: int, follow: bool = True):
+    """NDJSON lines of a scan's findings from offset on, until the scan ends (or only those so far)"""
+    cursor = None
+    # Subscribe before reading, so findings recorded in between still wake us
+    with scan_events.subscribe(scan_id) as subscription:
+        while True:
+            scan = scan_storage.get_scan(scan_id)
+            # The scan's status is read first: once it has ended, the pages below hold all its findings
+            while True:
+                page = scan_storage.list_findings(scan_id=scan_id, cursor=cursor,
+                                                  offset=0 if cursor else offset, limit=MAX_PAGE)
+                if page.findings:
+                    yield "".join(json.dumps(f) + "\n" for f in page.findings).encode()
+                cursor = page.cursor
+                if not page.more:
+                    break
+            if scan.status in SCAN_TERMINAL or not follow:
+                return
+            await subscription.next(HEARTBEAT_SECONDS)
+
+@app.get("/v1/reports/{rid}/findings")
+async def stream_findings(
+    rid: str,
+    offset: int = Query(0, ge=0, description="Skip this many findings, e.g. to resume a stream"),
+    follow: bool = Query(True, description="Keep streaming new findings until the scan ends"),
+    token: str = Depends(verify_jwt_token)
+):
+    """A scan's findings as NDJSON in the order they were found, streamed as they come while it runs"""
+    get_scan_or_404(rid)
+    return StreamingResponse(follow_findings(rid, offset, follow), media_type="application/x-ndjson", headers=SSE_HEADERS)
+
+@app.get("/v1/findings")
+async def list_findings(
+    scan_id: Optional[str] = Query(None, description="Only this scan's findings"),
+    severity: Optional[FindingType] = Query(None),
+    category: Optional[FindingCategory] = Query(None),
+    path_prefix: Optional[str] = Query(None, min_length=1, max_length=1000,
+                                       description="Only findings in files whose path starts with this"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    cursor: Optional[str] = Query(None, max_length=2048, description="next_cursor of the previous page"),
+    token: str = Depends(verify_jwt_token)
+):
+    """Findings across scans matching every filter given, a page at a time
+
+    Listings with path_prefix are ordered by path, others in the order the
+    findings were found; pass a page's next_cursor to get the next one.
+    """
+    try:
+        if scan_id is not None:
+            try:
+                uuid.UUID(scan_id)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid scan ID format")
+        try:
+            page = scan_storage.list_findings(
+                scan_id=scan_id,
+                severity=severity.value if severity else None,
+                category=category.value if category else None,
+                path_prefix=path_prefix,
+                cursor=cursor,
+                limit=limit
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "findings": page.findings,
+            "count": len(page.findings),
+            "next_cursor": page.cursor if page.more else None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Findings query error: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/v1/enforce/quarantine")
 async def quarantine_artifact(
     request: QuarantineRequest,
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the findings store.
+
+Records --findings synthetic findings, spread over --scans scans and drawn
+from the scanner's rules across a tree of paths, in batches of the size a
+scan records them. Then it times listings the /v1/findings API serves: by
+scan, severity, category and path prefix alone and combined, first pages
+and pages continued by cursor, and reports the median and worst latency of
+each over --repeat runs.
+Usage: python bench_findings.py [--findings 10000000] [--scans 1000] [--batch 5000] [--repeat 20] [--db PATH]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+
+from app.findings_store import FindingsStore
+from app.scanner import RULES
+
+
+def findings(count, scans, seed=1):
+    rng = random.Random(seed)
+    scan_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(scans)]
+    timestamp = "2026-10-17T12:00:00"
+    for i in range(count):
+        rule = rng.choice(RULES)
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            # each scan records its findings together, as scans do
+            "scan_id": scan_ids[i * scans // count],
+            "type": rule.severity,
+            "category": rule.category,
+            "path": f"svc{rng.randrange(50)}/pkg{rng.randrange(200)}/module{rng.randrange(100)}.py",
+            "line": rng.randrange(1, 2000),
+            "column": rng.randrange(1, 80),
+            "message": rule.message,
+            "severity_score": rule.score,
+            "rule": rule.id,
+            "excerpt": "AKIA****",
+            "timestamp": timestamp,
+        }
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), max(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--findings", type=int, default=10_000_000)
+    parser.add_argument("--scans", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", help="store file (default: a temporary one)")
+    args = parser.parse_args()
+
+    workdir = None if args.db else tempfile.mkdtemp(prefix="findings-")
+    path = args.db or os.path.join(workdir, "findings.sqlite3")
+    store = FindingsStore(path)
+    elapsed, batch = 0.0, []
+    for finding in findings(args.findings, args.scans):
+        batch.append(finding)
+        if len(batch) == args.batch:
+            start = time.perf_counter()
+            store.add(batch)
+            elapsed += time.perf_counter() - start
+            batch = []
+    start = time.perf_counter()
+    store.add(batch)
+    elapsed += time.perf_counter() - start
+    print(f"recorded {store.total:,} findings in {elapsed:.0f}s ({store.total / elapsed:,.0f}/s), "
+          f"{os.path.getsize(path) / 1e9:.1f} GB")
+
+    some_scan = next(findings(args.findings, args.scans))["scan_id"]
+    listings = [
+        ("all", {}),
+        ("scan", {"scan_id": some_scan}),
+        ("severity=CRITICAL", {"severity": "CRITICAL"}),
+        ("category=CONFIGURATION", {"category": "CONFIGURATION"}),
+        ("category=COMPLIANCE (none)", {"category": "COMPLIANCE"}),
+        ("path_prefix=svc7/pkg12/", {"path_prefix": "svc7/pkg12/"}),
+        ("scan + severity=LOW", {"scan_id": some_scan, "severity": "LOW"}),
+        ("scan + path_prefix=svc7/", {"scan_id": some_scan, "path_prefix": "svc7/"}),
+        ("scan + category=VULNERABILITY", {"scan_id": some_scan, "category": "VULNERABILITY"}),
+        ("severity=CRITICAL + category=SECRET", {"severity": "CRITICAL", "category": "SECRET"}),
+        ("severity=LOW + path_prefix=svc7/", {"severity": "LOW", "path_prefix": "svc7/"}),
+        ("category=SECRET + path_prefix=svc7/", {"category": "SECRET", "path_prefix": "svc7/"}),
+        ("severity=CRITICAL + category=CONFIGURATION", {"severity": "CRITICAL", "category": "CONFIGURATION"}),
+    ]
+    print(f"{'listing (100 per page)':<38} {'page 1 ms':>10} {'max':>7} {'page 50 ms':>11} {'max':>7}")
+    for name, filters in listings:
+        first_ms, first_max, page = timed(lambda: store.query(**filters), args.repeat)
+        for _ in range(48):
+            if not page.more:
+                break
+            page = store.query(**filters, cursor=page.cursor)
+        cursor = page.cursor
+        later_ms, later_max, _ = timed(lambda: store.query(**filters, cursor=cursor), args.repeat)
+        print(f"{name:<38} {first_ms:>10.2f} {first_max:>7.2f} {later_ms:>11.2f} {later_max:>7.2f}")
+    store.close()
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
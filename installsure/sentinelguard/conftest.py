@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Shared InstallSure modules (rate limiting, request metrics, profiling, job events) live in installsure/shared (PYTHONPATH in the image)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "shared", "lib", "python")))
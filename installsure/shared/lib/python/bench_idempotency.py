@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Load test: clients that time out and retry job submissions, with and without
+Idempotency-Key. Each logical submission is sent once, then retried
+`--retries` times while the first is still in flight (a client timeout
+shorter than the job's admission time) and again after it has answered.
+Also measures the per-request cost of the key lookup.
+Usage: python bench_idempotency.py [--submissions 2000] [--retries 3] [--admit-ms 50] [--groups 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from idempotency import IdempotencyCache, fingerprint
+
+
+def make_body(i, groups):
+    return json.dumps({"project_id": f"p{i}", "estimator": "new",
+                       "groups": [{"id": f"g{j}", "params": {"a": j, "b": i}} for j in range(groups)]}).encode()
+
+
+async def storm(args, keyed):
+    cache = IdempotencyCache(max_entries=args.submissions * 2)
+    jobs = []
+
+    async def submit(body):
+        # Stands in for the endpoint: validating, persisting and queueing a job
+        await asyncio.sleep(args.admit_ms / 1000)
+        jobs.append(body)
+        return {"job_id": f"job-{len(jobs)}"}
+
+    async def client(i):
+        body = make_body(i, args.groups)
+        key = f"client-{i}"
+
+        async def send():
+            if keyed:
+                return (await cache.run("bench", key, body, lambda: submit(body)))[0]
+            return await submit(body)
+
+        # The first attempt and its timed-out retries overlap; one more comes after it answered
+        first = [asyncio.ensure_future(send())]
+        for _ in range(args.retries - 1):
+            await asyncio.sleep(random.uniform(0, args.admit_ms / 2000))
+            first.append(asyncio.ensure_future(send()))
+        results = await asyncio.gather(*first)
+        results.append(await send())
+        return len({r["job_id"] for r in results})
+
+    start = time.perf_counter()
+    distinct = await asyncio.gather(*(client(i) for i in range(args.submissions)))
+    return {"jobs": len(jobs), "elapsed": time.perf_counter() - start,
+            "clients_seeing_dupes": sum(1 for d in distinct if d > 1), "cache": cache}
+
+
+def lookup_cost(args):
+    """Microseconds per keyed replay (fingerprint + claim) for one body size"""
+    body = make_body(0, args.groups)
+    cache = IdempotencyCache()
+    cache.claim("bench", "k", fingerprint(body))
+    n = 20_000
+    start = time.perf_counter()
+    for _ in range(n):
+        fingerprint(body)
+    hashing = (time.perf_counter() - start) / n * 1e6
+    digest = fingerprint(body)
+    start = time.perf_counter()
+    for _ in range(n):
+        cache.claim("bench", "k", digest)
+    claim = (time.perf_counter() - start) / n * 1e6
+    return hashing, claim
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--retries", type=int, default=3, help="overlapping attempts per submission")
+    parser.add_argument("--admit-ms", type=float, default=50, help="time the endpoint takes to accept a job")
+    parser.add_argument("--groups", type=int, default=200, help="takeoff groups per request body")
+    args = parser.parse_args()
+
+    attempts = args.submissions * (args.retries + 1)
+    print(f"{args.submissions:,} submissions, {attempts:,} requests "
+          f"({args.retries} overlapping + 1 late retry each), {args.groups} groups/body")
+    print(f"{'':8} {'jobs':>8} {'dup jobs':>9} {'clients w/ dupes':>17} {'wall':>7}")
+    for keyed in (False, True):
+        random.seed(1)
+        result = asyncio.run(storm(args, keyed))
+        name = "keyed" if keyed else "no key"
+        print(f"{name:8} {result['jobs']:>8,} {result['jobs'] - args.submissions:>9,} "
+              f"{result['clients_seeing_dupes']:>17,} {result['elapsed']:>6.2f}s")
+        if keyed:
+            cache = result["cache"]
+            print(f"         coalesced in flight {cache.coalesced:,}, replayed after {cache.replayed:,}")
+    hashing, claim = lookup_cost(args)
+    print(f"lookup cost: fingerprint {hashing:.1f} us + claim {claim:.2f} us per keyed request")
+
+
+if __name__ == "__main__":
+    main()
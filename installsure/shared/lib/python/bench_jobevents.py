@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Load test: job status push (JobEventBus + sse_events) vs clients polling the
+status endpoint, with many clients watching jobs that change state from a
+worker thread. Both sides run in-process on one event loop, so the numbers
+count requests and measure the bus and SSE framing, not HTTP.
+Usage: python bench_jobevents.py [--subscribers 10000] [--jobs 100] [--transitions 20] [--poll-interval 1.0]
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import threading
+import time
+
+from jobevents import JobEventBus, sse_events
+
+
+def terminal(event):
+    return event["status"] == "COMPLETED"
+
+
+def worker(bus, state, jobs, transitions, interval):
+    """Move every job through `transitions` states, publishing each change"""
+    for n in range(1, transitions + 1):
+        time.sleep(interval)
+        for job in jobs:
+            event = {"status": "COMPLETED" if n == transitions else "RUNNING", "n": n, "t": time.perf_counter()}
+            state[job] = event
+            bus.publish(job, event)
+
+
+async def push_client(bus, state, job, received, counts):
+    counts["requests"] += 1
+    async for chunk in sse_events(bus, job, lambda: state[job], terminal):
+        counts["bytes"] += len(chunk)
+        # Parsed after the run: the clients share the server's CPU here
+        received.append((time.perf_counter(), chunk))
+
+
+async def poll_client(state, job, interval, latencies, counts):
+    seen = 0
+    await asyncio.sleep(random.uniform(0, interval))  # clients do not poll in step
+    while True:
+        counts["requests"] += 1
+        body = json.dumps(state[job]).encode()
+        counts["bytes"] += len(body)
+        event = json.loads(body)
+        if event["n"] > seen:
+            latencies.append(time.perf_counter() - event["t"])
+            # Changes between two polls are never seen at all
+            counts["missed"] += event["n"] - seen - 1
+            seen = event["n"]
+        if terminal(event):
+            return
+        await asyncio.sleep(interval)
+
+
+async def run(mode, args):
+    bus = JobEventBus()
+    jobs = [f"job-{i}" for i in range(args.jobs)]
+    state = {job: {"status": "RUNNING", "n": 0, "t": 0.0} for job in jobs}
+    received, latencies, counts = [], [], {"requests": 0, "bytes": 0, "missed": 0}
+    start = time.perf_counter()
+    if mode == "push":
+        clients = [push_client(bus, state, jobs[i % len(jobs)], received, counts) for i in range(args.subscribers)]
+    else:
+        clients = [poll_client(state, jobs[i % len(jobs)], args.poll_interval, latencies, counts)
+                   for i in range(args.subscribers)]
+    tasks = [asyncio.ensure_future(client) for client in clients]
+    await asyncio.sleep(0)  # let every client subscribe before the first change
+    subscribed = time.perf_counter() - start
+    thread = threading.Thread(target=worker, args=(bus, state, jobs, args.transitions, args.interval))
+    thread.start()
+    await asyncio.gather(*tasks)
+    thread.join()
+    for at, chunk in received:
+        event = json.loads(chunk.split(b"data: ", 1)[1])
+        if event["n"]:
+            latencies.append(at - event["t"])
+    return {"elapsed": time.perf_counter() - start, "subscribed": subscribed, "latencies": sorted(latencies),
+            "dropped": bus.dropped, **counts}
+
+
+def pct(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--transitions", type=int, default=20, help="state changes per job")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between state changes")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    changes = args.subscribers * args.transitions
+    print(f"{args.subscribers:,} clients on {args.jobs} jobs, {args.transitions} changes/job "
+          f"every {args.interval:g}s ({changes:,} changes to deliver)")
+    print(f"{'':5} {'requests':>10} {'MB sent':>8} {'seen':>8} {'missed':>8} {'lat p50':>9} "
+          f"{'lat p99':>9} {'wall':>7} {'max RSS':>8}")
+    for mode in ("push", "poll"):
+        result = asyncio.run(run(mode, args))
+        lat = result["latencies"]
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{mode:5} {result['requests']:>10,} {result['bytes'] / 1e6:>8.1f} {len(lat):>8,} "
+              f"{result['missed'] + result['dropped']:>8,} {pct(lat, .5) * 1000:>7.1f}ms "
+              f"{pct(lat, .99) * 1000:>7.1f}ms {result['elapsed']:>6.1f}s {rss:>6.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
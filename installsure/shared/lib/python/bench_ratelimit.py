@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: list-of-timestamps limiter (previous check_rate_limit) vs the
+sliding-window-counter RateLimiter, with many distinct clients.
+Usage: python bench_ratelimit.py [--clients 100000] [--requests 1000000] [--limit 1000]
+"""
+import argparse
+import random
+import time
+
+from ratelimit import MemoryBackend, RateLimiter
+
+
+def list_limiter(limit, window):
+    """The per-IP timestamp list the secure services used before."""
+    storage = {}
+
+    def hit(key, now):
+        storage[key] = [t for t in storage.get(key, []) if now - t < window]
+        if len(storage[key]) >= limit:
+            return False
+        storage[key].append(now)
+        return True
+    return hit, storage
+
+
+def run(hit, keys, times):
+    start = time.perf_counter()
+    for key, now in zip(keys, times):
+        hit(key, now)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--window", type=float, default=3600.0)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    # Skewed traffic: a few hot clients near the limit, a long tail of others
+    keys = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+            for i in (min(int(rnd.paretovariate(1.2)) - 1, args.clients - 1) if rnd.random() < 0.5
+                      else rnd.randrange(args.clients) for _ in range(args.requests))]
+    span = args.window * 3
+    times = [span * i / args.requests for i in range(args.requests)]
+
+    old_hit, old_storage = list_limiter(args.limit, args.window)
+    old_s = run(old_hit, keys, times)
+
+    backend = MemoryBackend()
+    limiter = RateLimiter(args.limit, args.window, backend)
+    new_s = run(lambda key, now: limiter.hit(key, now), keys, times)
+
+    # One more client after two idle windows: stale state should be gone
+    later = span + 2 * args.window
+    old_hit("late-client", later)
+    limiter.hit("late-client", later)
+
+    print(f"{args.requests:,} requests from up to {args.clients:,} clients over {span / 3600:.0f} h, "
+          f"limit {args.limit}/{args.window:.0f}s")
+    print(f"  timestamp lists  {old_s / args.requests * 1e9:8.0f} ns/request, "
+          f"{len(old_storage):,} keys retained after 2 idle windows")
+    print(f"  sliding counter  {new_s / args.requests * 1e9:8.0f} ns/request, "
+          f"{len(backend):,} keys retained after 2 idle windows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: traffic capture and old/new replay throughput. Times the
+CaptureMiddleware overhead per request, then replays a captured log through
+three old/new app pairs: a bare ASGI app (the harness's own ceiling), an
+async FastAPI route and a sync FastAPI route (which FastAPI runs on its
+thread pool). Each replayed record is one request to each app. Replay
+scales with worker processes, so the per-worker rate says how many cores a
+day of traffic needs; the target is checked against this box's cores.
+Usage: python bench_replay.py [--records 20000] [--workers N] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from replay import CaptureMiddleware, replay
+
+TARGET_RPS = 20_000  # "tens of thousands of requests per second on one box"
+
+
+class Item(BaseModel):
+    name: str
+    qty: int = 1
+
+
+async def bare_app(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+def fastapi_app(sync):
+    app = FastAPI()
+    if sync:
+        @app.post("/v1/items")
+        def create(item: Item):
+            return {"name": item.name, "total": item.qty * 2}
+    else:
+        @app.post("/v1/items")
+        async def create(item: Item):
+            return {"name": item.name, "total": item.qty * 2}
+    return app
+
+
+# Old and new sides are separate instances, as they would be in a real replay
+bare_old, bare_new = bare_app, bare_app
+async_old, async_new = fastapi_app(False), fastapi_app(False)
+sync_old, sync_new = fastapi_app(True), fastapi_app(True)
+PAIRS = [("bare ASGI", "bare"), ("async route", "async"), ("sync route", "sync")]
+
+
+async def drive(app, n):
+    """Microseconds per POST sent straight into an ASGI app"""
+    body = b'{"name":"stud","qty":3}'
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": "/v1/items", "raw_path": b"/v1/items",
+             "query_string": b"", "root_path": "", "scheme": "http", "http_version": "1.1",
+             "headers": [(b"content-type", b"application/json"), (b"authorization", b"Bearer t")],
+             "server": ("bench", 80), "client": ("127.0.0.1", 1)}
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "traffic.ndjson")
+        capture = CaptureMiddleware(async_old, log)
+        plain = asyncio.run(drive(async_old, args.records))
+        captured = asyncio.run(drive(capture, args.records))
+        capture.close()
+        print(f"capture: {plain:.1f} us/req plain, {captured:.1f} us/req captured "
+              f"({captured - plain:+.1f} us), {args.records:,} records logged")
+
+        print(f"replay of {args.records:,} records, {args.workers} worker(s) x {args.concurrency} in flight")
+        print(f"{'pair':12} {'records/s':>10} {'per worker':>11} {'app req/s':>10}")
+        rates = {}
+        for label, name in PAIRS:
+            report = replay(log, f"bench_replay:{name}_old", f"bench_replay:{name}_new",
+                            workers=args.workers, concurrency=args.concurrency)
+            assert report.requests == args.records and report.mismatch_count == 0, report
+            rates[name] = report.requests_per_sec
+            print(f"{label:12} {rates[name]:>10,.0f} {rates[name] / args.workers:>11,.0f} "
+                  f"{2 * rates[name]:>10,.0f}")
+
+    cores = os.cpu_count() or 1
+    for label, name in PAIRS[1:]:
+        needed = math.ceil(TARGET_RPS / (rates[name] / args.workers))
+        met = "met" if rates[name] >= TARGET_RPS else "NOT met"
+        print(f"target {TARGET_RPS:,} records/s on the {label} pair: {met} here; "
+              f"needs ~{needed} cores at this per-worker rate ({cores} on this box)")
+
+
+if __name__ == "__main__":
+    main()
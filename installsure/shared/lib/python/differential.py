@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Differential fuzzing engine for InstallSure services.
+Generalizes the hand-written JarvisOps/SentinelGuard validators: inputs are
+generated from a service's Pydantic request model, the old and new targets
+(plain callables or FastAPI apps) run side by side in parallel workers, and
+responses are compared after a declarative normalization compiled once.
+Fields the model's own validators reject are redrawn, so generated inputs
+reach the handlers instead of stopping at validation.
+Failing inputs are minimized before they are reported.
+"""
+import enum
+import importlib
+import math
+import os
+import random
+import re
+import string
+import time
+import typing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, ValidationError
+
+MAX_FAILURES = 10
+PLAIN = string.ascii_letters + string.digits
+
+# Named patterns a NormalizationSpec can mask inside string values
+PATTERNS = {
+    "uuid": r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
+    "timestamp": r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?",
+}
+
+
+@dataclass(frozen=True)
+class NormalizationSpec:
+    """Declarative description of response fields that may legitimately differ"""
+    fields: Dict[str, str] = field(default_factory=dict)    # top-level key -> mask
+    patterns: Dict[str, str] = field(default_factory=dict)  # PATTERNS name -> mask
+    drop: Tuple[str, ...] = ()                              # keys removed at any depth
+    deep_fields: bool = False                               # mask `fields` at any depth
+
+    def compile(self) -> Callable[[Any], Any]:
+        """Build the normalizer once; it walks each response a single time."""
+        top_fields = dict(self.fields)
+        nested_fields = top_fields if self.deep_fields else {}
+        drop = frozenset(self.drop)
+        regex = None
+        masks = {}
+        if self.patterns:
+            regex = re.compile("|".join(f"(?P<{name}>{PATTERNS[name]})" for name in self.patterns))
+            masks = dict(self.patterns)
+
+        def mask_string(value: str) -> str:
+            return regex.sub(lambda m: masks[m.lastgroup], value) if regex else value
+
+        def normalize(value: Any, fields: Dict[str, str] = top_fields) -> Any:
+            if isinstance(value, dict):
+                out = {}
+                for key, item in value.items():
+                    if key in drop:
+                        continue
+                    out[key] = fields[key] if key in fields else normalize(item, nested_fields)
+                return out
+            if isinstance(value, list):
+                return [normalize(item, nested_fields) for item in value]
+            if isinstance(value, str):
+                return mask_string(value)
+            return value
+
+        return normalize
+
+
+class InputGenerator:
+    """Random request payloads shaped by a Pydantic model's fields and constraints
+
+    Validators are code a schema cannot describe, so each payload is checked
+    against the model and the fields it rejects are redrawn, up to `retries`
+    times; the later redraws use plain alphanumeric text, which format
+    checks usually accept. Fields no random draw will satisfy (IDs that must be UUIDs, paths
+    that must exist) need an override: a function of the Random instance.
+    """
+
+    def __init__(self, model: type, overrides: Optional[Dict[str, Callable]] = None,
+                 invalid_rate: float = 0.1, retries: int = 20):
+        self.model = model
+        self.overrides = overrides or {}
+        self.invalid_rate = invalid_rate
+        self.retries = retries
+
+    def generate(self, rnd: random.Random) -> Dict[str, Any]:
+        payload, fixed = {}, set()
+        for name, info in self.model.model_fields.items():
+            if not info.is_required() and rnd.random() < 0.3:
+                continue
+            if name in self.overrides:
+                payload[name] = self.overrides[name](rnd)
+                fixed.add(name)
+            elif rnd.random() < self.invalid_rate:
+                payload[name] = self._invalid(rnd, info)
+                fixed.add(name)
+            else:
+                payload[name] = self._field(rnd, info)
+        # Overridden and deliberately invalid fields are left as drawn
+        for attempt in range(self.retries):
+            rejected = self._rejected(payload) - fixed
+            if not rejected:
+                break
+            alphabet = string.printable if attempt < self.retries // 2 else PLAIN
+            for name in rejected:
+                payload[name] = self._field(rnd, self.model.model_fields[name], alphabet)
+        return payload
+
+    def _field(self, rnd: random.Random, info, alphabet: str = string.printable) -> Any:
+        return self._value(rnd, info.annotation, _constraints(info.metadata, info.annotation), alphabet)
+
+    def _rejected(self, payload: Dict[str, Any]) -> Set[str]:
+        try:
+            self.model.model_validate(payload)
+        except ValidationError as e:
+            return {error["loc"][0] for error in e.errors()
+                    if error["loc"] and error["loc"][0] in payload and error["loc"][0] in self.model.model_fields}
+        return set()
+
+    def _value(self, rnd: random.Random, annotation: Any, limits: Dict[str, Any],
+               alphabet: str = string.printable) -> Any:
+        origin = typing.get_origin(annotation)
+        args = typing.get_args(annotation)
+        if origin is Union:
+            options = [a for a in args if a is not type(None)]
+            if type(None) in args and rnd.random() < 0.1:
+                return None
+            return self._value(rnd, rnd.choice(options), limits, alphabet)
+        if origin in (list, List):
+            low, high = limits.get("min_length", 0), min(limits.get("max_length", 5), 5)
+            item = args[0] if args else str
+            return [self._value(rnd, item, {}, alphabet) for _ in range(rnd.randint(low, max(low, high)))]
+        if origin in (dict, Dict) or annotation in (dict, Dict):
+            return {_text(rnd, 1, 10, alphabet): self._value(rnd, rnd.choice([str, int, bool]), {}, alphabet)
+                    for _ in range(rnd.randint(0, 3))}
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return InputGenerator(annotation, invalid_rate=self.invalid_rate).generate(rnd)
+        if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+            return rnd.choice(list(annotation)).value
+        if "allowed_schemes" in limits:
+            scheme = rnd.choice(limits["allowed_schemes"] or ["https"])
+            return f"{scheme}://{_text(rnd, 1, 12, string.ascii_lowercase)}.example/{_text(rnd, 0, 20)}"
+        if annotation is bool:
+            return rnd.random() < 0.5
+        if annotation is int:
+            return rnd.randint(limits.get("ge", -1000), limits.get("le", 1000))
+        if annotation is float:
+            return rnd.uniform(limits.get("ge", -1000.0), limits.get("le", 1000.0))
+        if "pattern" in limits:
+            choices = _alternatives(limits["pattern"])
+            if choices:
+                return rnd.choice(choices)
+        low = limits.get("min_length", 0)
+        high = min(limits.get("max_length", 40), low + 40)
+        return _text(rnd, low, high, alphabet)
+
+    def _invalid(self, rnd: random.Random, info) -> Any:
+        limits = _constraints(info.metadata, info.annotation)
+        if "max_length" in limits and info.annotation is str:
+            return "x" * (limits["max_length"] + 1)
+        return rnd.choice([None, 12345, "", [], {"unexpected": True}, "<script>"])
+
+
+@dataclass
+class Target:
+    """One side of the comparison: a callable, or a route on a FastAPI app.
+
+    `obj` is the callable/app itself (it must be importable by reference to
+    cross process boundaries) or a "module:attribute" import path.
+    """
+    obj: Any
+    method: Optional[str] = None
+    path: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def bind(self) -> Callable[[Dict], Any]:
+        obj = resolve(self.obj)
+        if self.path is None:
+            def call(payload):
+                try:
+                    return obj(payload)
+                except Exception as e:
+                    return {"exception": type(e).__name__}
+            return call
+
+        from fastapi.testclient import TestClient
+        client = TestClient(obj, raise_server_exceptions=False)
+        method = (self.method or "POST").upper()
+
+        def request(payload):
+            response = client.request(method, self.path, json=payload, headers=self.headers)
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            return {"status_code": response.status_code, "body": body}
+        return request
+
+    def normalized(self, normalize: Callable[[Any], Any]) -> Callable[[Dict], Any]:
+        """bind(), normalizing each response (for an app route, the response body)"""
+        run = self.bind()
+        if self.path is None:
+            return lambda payload: normalize(run(payload))
+
+        def request(payload):
+            response = run(payload)
+            return {**response, "body": normalize(response["body"])}
+        return request
+
+
+@dataclass
+class FuzzReport:
+    """Outcome of a differential run"""
+    examples: int
+    seconds: float
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def examples_per_sec(self) -> float:
+        return self.examples / self.seconds if self.seconds else 0.0
+
+
+def run_shard(old: Target, new: Target, model: Any, spec: NormalizationSpec, seed: int,
+              shard: int, examples: int, overrides: Optional[Dict[str, Callable]] = None,
+              invalid_rate: float = 0.1) -> Tuple[int, list]:
+    """Fuzz one shard in the current process; returns (count, failing payloads)."""
+    generator = InputGenerator(resolve(model), overrides, invalid_rate)
+    normalize = spec.compile()
+    check_old, check_new = old.normalized(normalize), new.normalized(normalize)
+    rnd = random.Random(f"{seed}:{shard}")
+    failures = []
+    for i in range(examples):
+        payload = generator.generate(rnd)
+        if check_old(payload) != check_new(payload):
+            failures.append(payload)
+            if len(failures) >= MAX_FAILURES:
+                return i + 1, failures
+    return examples, failures
+
+
+def fuzz(old: Target, new: Target, model: Any, spec: NormalizationSpec = NormalizationSpec(),
+         examples: int = 10_000, workers: Optional[int] = None, seed: int = 0,
+         shard_size: int = 1_000, overrides: Optional[Dict[str, Callable]] = None,
+         invalid_rate: float = 0.1) -> FuzzReport:
+    """Compare old and new over generated inputs across a process pool.
+
+    `model` and `overrides` cross into workers by reference, so they must be
+    module-level objects (or "module:attribute" paths for the model).
+    `invalid_rate` is the share of fields given a deliberately invalid value.
+    """
+    sizes = [shard_size] * (examples // shard_size)
+    if examples % shard_size:
+        sizes.append(examples % shard_size)
+
+    start = time.perf_counter()
+    checked, failing = 0, []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_shard, old, new, model, spec, seed, shard, size, overrides, invalid_rate)
+                   for shard, size in enumerate(sizes)]
+        for future in futures:
+            count, shard_failures = future.result()
+            checked += count
+            failing.extend(shard_failures)
+    seconds = time.perf_counter() - start
+
+    normalize = spec.compile()
+    run_old, run_new = old.bind(), new.bind()
+    check_old, check_new = old.normalized(normalize), new.normalized(normalize)
+    failures = []
+    for payload in failing[:MAX_FAILURES]:
+        minimal = minimize(payload, lambda p: check_old(p) != check_new(p))
+        failures.append({"input": minimal, "old": run_old(minimal), "new": run_new(minimal)})
+    return FuzzReport(examples=checked, seconds=seconds, failures=failures)
+
+
+def minimize(payload: Any, fails: Callable[[Any], bool]) -> Any:
+    """Greedily shrink a failing payload while it keeps failing."""
+    current = payload
+    progress = True
+    while progress:
+        progress = False
+        for candidate in _shrink(current):
+            if fails(candidate):
+                current = candidate
+                progress = True
+                break
+    return current
+
+
+def _shrink(value: Any):
+    """Yield strictly smaller variants of a value, most aggressive first."""
+    if isinstance(value, dict):
+        for key in value:
+            yield {k: v for k, v in value.items() if k != key}
+        for key, item in value.items():
+            for smaller in _shrink(item):
+                yield {**value, key: smaller}
+    elif isinstance(value, list):
+        if value:
+            yield value[:len(value) // 2]
+            yield value[1:]
+        for i, item in enumerate(value):
+            for smaller in _shrink(item):
+                yield value[:i] + [smaller] + value[i + 1:]
+    elif isinstance(value, str) and value:
+        yield value[:len(value) // 2]
+        yield value[1:]
+    elif isinstance(value, bool):
+        if value:
+            yield False
+    elif isinstance(value, int) and value:
+        yield 0
+        yield value // 2
+
+
+def _constraints(metadata: list, annotation: Any = None) -> Dict[str, Any]:
+    # Exclusive bounds become inclusive ones: the next integer, or the next float
+    floats = float in (annotation, *typing.get_args(annotation))
+    limits = {}
+    for item in metadata:
+        for name in ("min_length", "max_length", "ge", "le", "pattern", "allowed_schemes"):
+            if getattr(item, name, None) is not None:
+                limits[name] = getattr(item, name)
+        if getattr(item, "gt", None) is not None:
+            limits["ge"] = math.nextafter(item.gt, math.inf) if floats else item.gt + 1
+        if getattr(item, "lt", None) is not None:
+            limits["le"] = math.nextafter(item.lt, -math.inf) if floats else item.lt - 1
+    return limits
+
+
+def _alternatives(pattern: str) -> List[str]:
+    """Literal choices of a '^(a|b|c)$' style pattern, if it is one."""
+    match = re.fullmatch(r"\^?\(([\w|-]+)\)\$?", pattern)
+    return match.group(1).split("|") if match else []
+
+
+def _text(rnd: random.Random, low: int, high: int, alphabet: str = string.printable) -> str:
+    return "".join(rnd.choices(alphabet, k=rnd.randint(low, max(low, high))))
+
+
+def resolve(obj: Any) -> Any:
+    if isinstance(obj, str) and ":" in obj:
+        module, _, attr = obj.partition(":")
+        return getattr(importlib.import_module(module), attr)
+    return obj
+
+
+def uuid_override(rnd: random.Random) -> str:
+    """Override for fields validated as UUIDs, which a model's schema cannot express."""
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
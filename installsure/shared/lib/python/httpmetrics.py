@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Request metrics for the InstallSure services: per-route latency histograms,
+response counts by status class and an in-flight gauge, recorded by a pure
+ASGI middleware and exported as JSON (for /metrics) and Prometheus text.
+
+instrument(app, service) mounts the middleware and adds
+GET /metrics/prometheus. A request is labelled with its route template
+("/v1/jobs/{job_id}", not the concrete path) and timed until its response
+starts, so a streamed response (SSE, large downloads) counts its time to
+first byte rather than the life of the stream. WebSockets are not recorded.
+
+Latencies go into HDR-style log-linear histograms of integer microseconds.
+Values below SUB_BUCKETS (128 us) get a bucket each. Above that, each power
+of two is split into SUB_BUCKETS / 2 = 64 linear sub-buckets. Any recorded
+value is reported within 1/64 (1.6%) of itself, from 1 us up to about 71
+minutes, in a fixed 1728-slot array.
+
+The request path only appends (route, status, latency) to a per-thread
+buffer, without a lock. Every FLUSH_EVERY samples the owning thread swaps
+its buffer out and folds it into its histograms under a per-thread lock.
+Only the owner ever swaps the buffer, so an append can never land in a list
+that has already been folded. A scrape, from any thread, merges the threads'
+histograms and adds a snapshot copy of each unfolded buffer.
+"""
+import threading
+from time import perf_counter_ns
+from typing import Any, Dict, List, Tuple
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS  # values below this are exact; each power of two above has half as many
+MAX_VALUE = (1 << 32) - 1  # larger values are recorded as this (about 71 minutes)
+
+# Bucket bounds (seconds) for the Prometheus export
+PROMETHEUS_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99), ("p999_ms", 0.999))
+UNMATCHED = "unmatched"  # requests no route matched, kept as one series
+FLUSH_EVERY = 256  # samples a thread buffers before folding them into its histograms
+
+
+def bucket_index(us: int) -> int:
+    if us < SUB_BUCKETS:
+        return us
+    if us > MAX_VALUE:
+        us = MAX_VALUE
+    shift = us.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (us >> shift)
+
+
+BUCKETS = bucket_index(MAX_VALUE) + 1
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """Lowest and highest microsecond value that land in a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    sub = index - (shift << (SUB_BUCKET_BITS - 1))
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """Log-linear histogram of microsecond values"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, us: int) -> None:
+        self.counts[bucket_index(us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def merge(self, other: "Histogram") -> None:
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, fraction: float) -> int:
+        """Value (us) at or below which `fraction` of the recorded values lie"""
+        if not self.count:
+            return 0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                low, high = bucket_bounds(i)
+                return min(self.max, (low + high) // 2)
+        return self.max
+
+    def count_at_or_below(self, us: int) -> int:
+        last = bucket_index(us)
+        return sum(self.counts[:last + 1])
+
+
+class RouteStats:
+    """One route's latencies and responses by status class (index 1..5 for 1xx..5xx)"""
+
+    __slots__ = ("latency", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = [0] * 6
+
+    def merge(self, other: "RouteStats") -> None:
+        self.latency.merge(other.latency)
+        for i, n in enumerate(other.statuses):
+            self.statuses[i] += n
+
+
+class _Shard:
+    """One thread's unfolded samples and folded per-route statistics"""
+
+    __slots__ = ("buffer", "routes", "lock")
+
+    def __init__(self):
+        self.buffer: List[Tuple[str, str, int, int]] = []
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.lock = threading.Lock()  # folding and scraping; appends never take it
+
+
+class HttpMetrics:
+    """Per-route request metrics, buffered per thread and folded in batches"""
+
+    def __init__(self, service: str, flush_every: int = FLUSH_EVERY):
+        self.service = service
+        self.in_flight = 0
+        self.flush_every = flush_every
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = self._local.shard = _Shard()
+        with self._shards_lock:
+            self._shards.append(shard)
+        return shard
+
+    def record(self, method: str, route: str, status: int, us: int) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        buffer = shard.buffer
+        buffer.append((method, route, status, us))
+        if len(buffer) >= self.flush_every:
+            _fold(shard)
+
+    def routes(self) -> Dict[Tuple[str, str], RouteStats]:
+        """Merged statistics per (method, route)"""
+        merged: Dict[Tuple[str, str], RouteStats] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            with shard.lock:
+                # Copied, not swapped: the owner thread may be appending to it
+                pending = list(shard.buffer)
+                for key, stats in shard.routes.items():
+                    merged.setdefault(key, RouteStats()).merge(stats)
+            _add(merged, pending)
+        return merged
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON metrics: overall p95 latency and 5xx rate, and per-route detail"""
+        routes = self.routes()
+        overall = RouteStats()
+        detail = {}
+        for (method, route), stats in sorted(routes.items(), key=lambda item: item[0][::-1]):
+            overall.merge(stats)
+            detail[f"{method} {route}"] = _route_summary(stats)
+        requests = overall.latency.count
+        return {
+            "latency_p95_ms": overall.latency.quantile(0.95) / 1000,
+            "error_rate": overall.statuses[5] / requests if requests else 0.0,
+            "requests": requests,
+            "in_flight": self.in_flight,
+            "routes": detail,
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition (format 0.0.4)"""
+        service = _label(self.service)
+        lines = [
+            "# HELP http_request_duration_seconds Time from request to response start.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        requests = []
+        for (method, route), stats in sorted(self.routes().items(), key=lambda item: item[0][::-1]):
+            labels = f'service="{service}",method="{_label(method)}",route="{_label(route)}"'
+            latency = stats.latency
+            for bound in PROMETHEUS_BOUNDS:
+                below = latency.count_at_or_below(int(bound * 1_000_000))
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {below}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {latency.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {latency.total / 1_000_000}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {latency.count}")
+            for status_class, n in enumerate(stats.statuses):
+                if n:
+                    requests.append(f'http_requests_total{{{labels},status="{status_class}xx"}} {n}')
+        lines += ["# HELP http_requests_total Responses by status class.", "# TYPE http_requests_total counter"]
+        lines += requests
+        lines += [
+            "# HELP http_requests_in_flight Requests being handled, including open streams.",
+            "# TYPE http_requests_in_flight gauge",
+            f'http_requests_in_flight{{service="{service}"}} {self.in_flight}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _fold(shard: _Shard) -> None:
+    """Move a thread's buffered samples into its histograms; only that thread calls this"""
+    with shard.lock:
+        samples, shard.buffer = shard.buffer, []
+        _add(shard.routes, samples)
+
+
+def _add(routes: Dict[Tuple[str, str], RouteStats], samples: List[Tuple[str, str, int, int]]) -> None:
+    for method, route, status, us in samples:
+        stats = routes.get((method, route))
+        if stats is None:
+            stats = routes[(method, route)] = RouteStats()
+        latency = stats.latency
+        if us < SUB_BUCKETS:
+            index = us
+        elif us <= MAX_VALUE:
+            shift = us.bit_length() - SUB_BUCKET_BITS  # bucket_index(), inlined
+            index = (shift << (SUB_BUCKET_BITS - 1)) + (us >> shift)
+        else:
+            index = BUCKETS - 1
+        latency.counts[index] += 1
+        latency.count += 1
+        latency.total += us
+        if us > latency.max:
+            latency.max = us
+        stats.statuses[min(status // 100, 5)] += 1
+
+
+def _route_summary(stats: RouteStats) -> Dict[str, Any]:
+    latency = stats.latency
+    summary = {"count": latency.count, "errors": stats.statuses[5], "client_errors": stats.statuses[4],
+               "mean_ms": latency.total / latency.count / 1000 if latency.count else 0.0}
+    for name, fraction in QUANTILES:
+        summary[name] = latency.quantile(fraction) / 1000
+    summary["max_ms"] = latency.max / 1000
+    return summary
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request into an HttpMetrics
+
+    With the app's `router`, requests answered before routing (rate limited,
+    rejected by other middleware) are still labelled with their route.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics, router=None):
+        self.app = app
+        self.metrics = metrics
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        start = perf_counter_ns()
+        status = 500  # unless a response starts
+        elapsed = 0
+
+        async def send_and_time(message):
+            nonlocal status, elapsed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = perf_counter_ns() - start
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_and_time)
+        finally:
+            metrics.in_flight -= 1
+            # The router leaves the matched route in the scope
+            route = scope.get("route")
+            if route is None and self.router is not None:
+                route = _match_route(self.router, scope)
+            metrics.record(scope["method"], getattr(route, "path", UNMATCHED), status,
+                           (elapsed or perf_counter_ns() - start) // 1000)
+
+
+def _match_route(router, scope):
+    from starlette.routing import Match
+
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def instrument(app, service: str) -> HttpMetrics:
+    """Record request metrics for a FastAPI app and serve GET /metrics/prometheus
+
+    Call after the app's other middleware so the timing covers them too.
+    """
+    from fastapi.responses import PlainTextResponse
+
+    metrics = HttpMetrics(service)
+    app.add_middleware(MetricsMiddleware, metrics=metrics, router=app.router)
+
+    @app.get("/metrics/prometheus", response_class=PlainTextResponse, include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+    return metrics
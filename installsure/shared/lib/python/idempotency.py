@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Idempotency keys for the InstallSure endpoints that start jobs.
+
+A client that sends `Idempotency-Key: <key>` with a job-submitting request
+can retry it safely. The first request with a key runs and its response is
+kept for `ttl` seconds; a later request with the same key and body gets
+that response back, marked `Idempotent-Replayed: true`, and no new job is
+created. A duplicate that arrives while the first request is still running
+waits for it and shares its response instead of racing it. Requests are
+matched on their raw body bytes; reusing a key with a different body is a
+client error (422).
+
+Only successful responses are kept: a retry after an error runs again, and
+duplicates that were waiting on the failed request get its error.
+
+Keys are scoped per route, and per tenant where requests are authenticated.
+The cache is per process and bounded: past max_entries the least recently
+used response is forgotten.
+"""
+import asyncio
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request body"""
+
+
+def fingerprint(body: bytes) -> str:
+    # The raw bytes rather than the parsed JSON: re-serializing a large body
+    # canonically costs far more than hashing it
+    return hashlib.sha256(body).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires")
+
+    def __init__(self, fingerprint: str, future: Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires = float("inf")  # set when the response is stored
+
+
+class IdempotencyCache:
+    """Bounded TTL map of (scope, key) -> response, with in-flight coalescing
+
+    Thread-safe; responses are shared through concurrent.futures.Future so
+    duplicates can wait from a worker thread or the event loop.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 24 * 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replayed = 0  # duplicates answered from a stored response
+        self.coalesced = 0  # duplicates that waited on an in-flight request
+        self.conflicts = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def claim(self, scope: str, key: str, digest: str) -> Tuple[Future, bool]:
+        """The future holding the response for a key, and whether the caller must produce it
+
+        Raises IdempotencyConflict if the key was used with another body.
+        """
+        k = (scope, key)
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(k)
+            if entry is not None and entry.expires <= now:
+                del self._entries[k]
+                entry = None
+            if entry is not None:
+                if entry.fingerprint != digest:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(key)
+                self._entries.move_to_end(k)
+                if entry.future.done():
+                    self.replayed += 1
+                else:
+                    self.coalesced += 1
+                return entry.future, False
+            entry = self._entries[k] = _Entry(digest, Future())
+            while len(self._entries) > self.max_entries:
+                # An evicted in-flight request still completes; it only stops coalescing
+                self._entries.popitem(last=False)
+            return entry.future, True
+
+    def resolve(self, scope: str, key: str, future: Future, result: Any) -> None:
+        """Store the response produced for a claimed key"""
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is not None and entry.future is future:
+                entry.expires = self._clock() + self.ttl
+        if not future.done():
+            future.set_result(result)
+
+    def reject(self, scope: str, key: str, future: Future, error: BaseException) -> None:
+        """Forget a claimed key whose request failed, passing the error to any waiters"""
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is not None and entry.future is future:
+                del self._entries[(scope, key)]
+        if not future.done():
+            future.set_exception(error)
+
+    async def run(self, scope: str, key: str, body: bytes, produce: Callable[[], Any]) -> Tuple[Any, bool]:
+        """produce()'s result, computed at most once per key; returns (result, replayed)
+
+        `produce` is a plain or coroutine function.
+        """
+        future, owner = self.claim(scope, key, fingerprint(body))
+        if not owner:
+            # Shielded: a waiter that is cancelled must not cancel the shared future under the owner
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = produce()
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            self.reject(scope, key, future, e)
+            raise
+        except BaseException:
+            # Cancelled: waiters get a retryable error rather than the cancellation
+            self.reject(scope, key, future, HTTPException(
+                status_code=409, detail="The original request with this Idempotency-Key was interrupted; retry"))
+            raise
+        self.resolve(scope, key, future, result)
+        return result, False
+
+
+async def idempotent(cache: IdempotencyCache, request: Request, response: Response,
+                     produce: Callable[[], Any], tenant: str = "") -> Any:
+    """Run an endpoint body under the request's Idempotency-Key, if it sent one
+
+    `produce` is a plain or coroutine function returning the response body.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        result = produce()
+        return await result if inspect.isawaitable(result) else result
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+    # FastAPI has already read the body to parse it, so this is the cached bytes
+    body = await request.body()
+    try:
+        result, replayed = await cache.run(f"{tenant}:{request.url.path}", key, body, produce)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used with a different request")
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
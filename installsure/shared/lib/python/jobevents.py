@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+In-process pub/sub of job state changes, for pushing status to clients
+over server-sent events or WebSockets instead of having them poll.
+
+Job engines call JobEventBus.publish(job_id, status) from any thread after
+recording a transition. Subscribers live on the event loop: publish() makes
+one call_soon_threadsafe hop per event (none when nobody is watching the
+job), and the loop appends the event to each subscriber's buffer. Buffers
+are bounded; an event arriving at a full buffer pushes out the oldest one.
+Events are full status snapshots, so a slow client skips intermediate
+states but always ends on the latest one. They must not be changed once
+published: every subscriber shares the same object.
+
+sse_events() and stream_websocket() turn a subscription into a stream that
+starts with the job's current status, sends each change, keeps idle
+connections alive, and ends after a terminal status.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+
+HEARTBEAT_SECONDS = 15.0
+
+
+class Subscription:
+    """One subscriber's bounded buffer of events for a job"""
+
+    __slots__ = ("bus", "job_id", "dropped", "_buffer", "_waiter", "_deadline", "_timer", "_closed")
+
+    def __init__(self, bus: "JobEventBus", job_id: str, buffer_size: int):
+        self.bus = bus
+        self.job_id = job_id
+        self.dropped = 0
+        self._buffer: Deque[Dict] = deque(maxlen=buffer_size)
+        self._waiter: Optional[asyncio.Future] = None
+        self._deadline = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+
+    def _put(self, event: Dict) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            self.bus.dropped += 1
+        self._buffer.append(event)
+        _wake(self._waiter)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """The next event, or None if `timeout` seconds pass without one"""
+        if not self._buffer:
+            # A bare future rather than asyncio.wait_for, which starts a task per
+            # wait, and one timer that is pushed back rather than one per wait
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            if timeout is not None:
+                self._deadline = loop.time() + timeout
+                if self._timer is None:
+                    self._timer = loop.call_at(self._deadline, self._expire)
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+            if not self._buffer:
+                return None
+        return self._buffer.popleft()
+
+    def _expire(self) -> None:
+        self._timer = None
+        if self._waiter is None:
+            return  # next() arms a new timer
+        loop = self._waiter.get_loop()
+        if loop.time() >= self._deadline:
+            _wake(self._waiter)
+        else:
+            self._timer = loop.call_at(self._deadline, self._expire)
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.bus._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _wake(waiter: Optional[asyncio.Future]) -> None:
+    if waiter is not None and not waiter.done():
+        waiter.set_result(None)
+
+
+class JobEventBus:
+    """Fan-out of job status events to subscribers on one event loop"""
+
+    def __init__(self, buffer_size: int = 16):
+        self.buffer_size = buffer_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, job_id: str) -> Subscription:
+        """Subscribe to a job's events; call from the event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Subscribers from an earlier loop (a server restart, a test) are gone
+            self._loop, self._loop_thread = loop, threading.get_ident()
+            self._subscribers = {}
+        subscription = Subscription(self, job_id, self.buffer_size)
+        self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def watching(self, job_id: str) -> bool:
+        """Whether anyone is subscribed to a job, so callers can skip building events."""
+        # Unlocked read: a subscriber added concurrently reads the current
+        # status itself after subscribing, so it cannot miss a change
+        return bool(self._subscribers.get(job_id))
+
+    def publish(self, job_id: str, event: Dict) -> None:
+        """Send a status event to a job's subscribers; safe from any thread."""
+        if not self.watching(job_id):
+            return
+        self.published += 1
+        if threading.get_ident() == self._loop_thread:
+            self._deliver(job_id, event)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, job_id, event)
+        except RuntimeError:
+            pass  # the loop has closed; nobody is left to deliver to
+
+    def _deliver(self, job_id: str, event: Dict) -> None:
+        subscribers = self._subscribers.get(job_id, ())
+        for subscription in subscribers:
+            subscription._put(event)
+        self.delivered += len(subscribers)
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.job_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.job_id]
+
+
+async def _events(bus: JobEventBus, job_id: str, snapshot: Callable[[], Optional[Dict]],
+                  terminal: Callable[[Dict], bool], heartbeat: float) -> AsyncIterator[Optional[Dict]]:
+    """Current status, then each change; None marks an idle heartbeat."""
+    # Subscribe before reading the status, so no change can fall between the two
+    with bus.subscribe(job_id) as subscription:
+        event = snapshot()
+        if event is None:
+            return
+        yield event
+        while not terminal(event):
+            latest = await subscription.next(heartbeat)
+            if latest is None:
+                yield None
+                continue
+            event = latest
+            yield event
+
+
+async def sse_events(bus: JobEventBus, job_id: str, snapshot: Callable[[], Optional[Dict]],
+                     terminal: Callable[[Dict], bool], heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """Server-sent event stream ("event: status") of a job's status
+
+    `snapshot` returns the job's current status (None if it is unknown).
+    """
+    async for event in _events(bus, job_id, snapshot, terminal, heartbeat):
+        if event is None:
+            yield b": keepalive\n\n"
+        else:
+            yield _sse_frame(event)
+
+
+_last_frame: Tuple[Optional[Dict], bytes] = (None, b"")
+
+
+def _sse_frame(event: Dict) -> bytes:
+    # Every subscriber to a job is handed the same event object, and they run
+    # one after another, so remembering the last frame encodes each event once
+    global _last_frame
+    if _last_frame[0] is not event:
+        data = json.dumps(event, separators=(",", ":")).encode()
+        _last_frame = (event, b"event: status\ndata: " + data + b"\n\n")
+    return _last_frame[1]
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def stream_websocket(websocket: Any, bus: JobEventBus, job_id: str, snapshot: Callable[[], Optional[Dict]],
+                           terminal: Callable[[Dict], bool], heartbeat: float = HEARTBEAT_SECONDS) -> None:
+    """Send a job's status as JSON messages on an accepted WebSocket, then close it"""
+    events = _events(bus, job_id, snapshot, terminal, heartbeat)
+    try:
+        async for event in events:
+            await websocket.send_json({"type": "heartbeat"} if event is None else {"type": "status", **event})
+    finally:
+        # A failed send leaves the generator suspended; close it to unsubscribe now
+        await events.aclose()
+    await websocket.close()
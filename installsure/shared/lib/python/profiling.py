@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Opt-in sampling profiler for the InstallSure services.
+
+When profiling is enabled, a request is profiled if it is picked at random
+at the configured sample rate, or if it carries `X-Profile: 1` and the header
+is enabled (PROFILING_HEADER_ENABLED). The header is off by default: any
+client can send it, and each profiled request starts the sampler thread.
+`X-Profile: 0` always opts a request out. While
+any profiled request is in flight, a sampler thread reads every thread's
+Python stack (sys._current_frames) each `interval` seconds and counts the
+stacks that are doing work, skipping threads parked in the event loop's
+selector, a lock or condition wait, or an idle worker pool. This covers the
+event loop and the threadpool that runs sync handlers. Samples are charged
+to the profiled requests in flight. When several requests overlap, each is
+charged the whole sample, so keep the sample rate low enough that they
+rarely do.
+
+Each profiled request gets an `X-Profile-Id` response header. Its stacks are
+kept in a bounded list of recent profiles and added to its route's running
+total. Both can be fetched as collapsed stacks (flamegraph.pl, speedscope,
+inferno) or as a speedscope JSON file from the admin routes that
+install_profiling() adds.
+
+The middleware is mounted only when profiling is enabled (PROFILING_ENABLED
+or PROFILING_SAMPLE_RATE), so with profiling off requests run exactly as
+before. With profiling on, unsampled requests pay for one header lookup and
+one random() call. Python only switches threads every
+sys.getswitchinterval() (5 ms by default), so samples land at most that
+often however small `interval` is.
+"""
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PROFILE_HEADER = b"x-profile"  # ASGI header names are lowercase bytes
+PROFILE_ID_HEADER = "X-Profile-Id"
+MAX_DEPTH = 128
+RECENT_PROFILES = 100
+
+# (file name, function) of the frame a thread is blocked in when it is idle
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),  # concurrent.futures worker waiting for work
+    ("_base.py", "result"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+}
+
+Frame = Tuple[str, str, int]  # function, file, first line
+Stack = Tuple[Frame, ...]  # outermost first
+
+
+class Profile:
+    """Stacks sampled while one request, or a route's requests, ran"""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.requests = 0
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: "outer;...;inner count" per line"""
+        lines = []
+        for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            names = ";".join(f"{function} ({os.path.basename(file)}:{line})" for function, file, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self) -> Dict[str, Any]:
+        """A speedscope file (https://www.speedscope.app/file-format-schema.json)"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "installsure-profiling",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": self.name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights),
+                "samples": samples, "weights": weights,
+            }],
+        }
+
+
+class _Active:
+    __slots__ = ("id", "method", "path", "started", "stacks")
+
+    def __init__(self, profile_id: str, method: str, path: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+
+
+class SamplingProfiler:
+    """Samples thread stacks while profiled requests are in flight"""
+
+    def __init__(self, interval: float = 0.005, sample_rate: float = 0.0, keep: int = RECENT_PROFILES,
+                 header: bool = False):
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.header = header
+        self._active: Dict[str, _Active] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+        self.recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._keep = keep
+        self.routes: Dict[str, Profile] = {}
+
+    def wants(self, headers: Iterable[Tuple[bytes, bytes]]) -> bool:
+        """Whether to profile a request, by its X-Profile header (if honoured) or at random"""
+        for name, value in headers:
+            if name == PROFILE_HEADER:
+                if value in (b"0", b""):
+                    return False
+                if self.header:
+                    return True
+                break
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, method: str, path: str) -> _Active:
+        active = _Active(f"{os.getpid()}-{next(self._ids)}", method, path)
+        with self._lock:
+            self._active[active.id] = active
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return active
+
+    def end(self, active: _Active, route: str, status: int) -> None:
+        elapsed = time.perf_counter() - active.started
+        with self._lock:
+            del self._active[active.id]
+            key = f"{active.method} {route}"
+            total = self.routes.get(key)
+            if total is None:
+                total = self.routes[key] = Profile(key, self.interval)
+            total.stacks.update(active.stacks)
+            total.requests += 1
+            self.recent[active.id] = {
+                "id": active.id, "method": active.method, "route": route, "path": active.path,
+                "status": status, "duration_ms": elapsed * 1000, "samples": sum(active.stacks.values()),
+                "stacks": active.stacks,
+            }
+            while len(self.recent) > self._keep:
+                self.recent.popitem(last=False)
+
+    def profile(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            entry = self.recent.get(profile_id)
+            if entry is None:
+                return None
+            profile = Profile(f"{entry['method']} {entry['path']} ({profile_id})", self.interval)
+            profile.stacks = Counter(entry["stacks"])
+            profile.requests = 1
+            return profile
+
+    def route_profile(self, route: Optional[str] = None) -> Profile:
+        """One route's accumulated profile ("METHOD /template"), or all routes'"""
+        with self._lock:
+            merged = Profile(route or "all routes", self.interval)
+            for key, profile in self.routes.items():
+                if route is None or key == route:
+                    merged.stacks.update(profile.stacks)
+                    merged.requests += profile.requests
+            return merged
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "sample_rate": self.sample_rate,
+                "in_flight": len(self._active),
+                "recent": [{k: v for k, v in entry.items() if k != "stacks"} for entry in reversed(self.recent.values())],
+                "routes": [{"route": key, "requests": p.requests, "samples": p.samples}
+                           for key, p in sorted(self.routes.items())],
+            }
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+            # Park until a profiled request arrives; give up the thread after a quiet spell
+            if not self._wake.wait(timeout=10):
+                with self._lock:
+                    if not self._active:
+                        self._thread = None
+                        return
+                continue
+            time.sleep(self.interval)
+            stacks = [stack for tid, frame in sys._current_frames().items()
+                      if tid != me and (stack := _stack(frame)) is not None]
+            if not stacks:
+                continue
+            with self._lock:
+                for active in self._active.values():
+                    active.stacks.update(stacks)
+
+
+def _stack(frame) -> Optional[Stack]:
+    """A thread's stack, outermost frame first, or None if the thread is idle"""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    stack: List[Frame] = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests SamplingProfiler.wants()"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wants(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        profiler = self.profiler
+        active = profiler.begin(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (PROFILE_ID_HEADER.lower().encode(), active.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            profiler.end(active, route, status)
+
+
+def _env_enabled() -> Tuple[bool, float]:
+    rate = float(os.environ.get("PROFILING_SAMPLE_RATE", "0") or 0)
+    return os.environ.get("PROFILING_ENABLED", "0") not in ("", "0") or rate > 0, rate
+
+
+def install_profiling(app, dependencies: Optional[List[Any]] = None,
+                      enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                      interval: Optional[float] = None, header: Optional[bool] = None) -> Optional[SamplingProfiler]:
+    """Mount the profiling middleware if enabled and add the /admin/profiles routes
+
+    Unset arguments come from PROFILING_ENABLED, PROFILING_SAMPLE_RATE,
+    PROFILING_INTERVAL and PROFILING_HEADER_ENABLED (whether X-Profile: 1
+    profiles a request). `dependencies` guard the admin routes (an auth check).
+    Returns the profiler, or None when profiling is off.
+    """
+    from fastapi import HTTPException, Query
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+    env_enabled, env_rate = _env_enabled()
+    enabled = env_enabled if enabled is None else enabled
+    sample_rate = env_rate if sample_rate is None else sample_rate
+    interval = interval or float(os.environ.get("PROFILING_INTERVAL", "0.005"))
+    if header is None:
+        header = os.environ.get("PROFILING_HEADER_ENABLED", "0") not in ("", "0")
+    profiler = SamplingProfiler(interval=interval, sample_rate=sample_rate, header=header) if enabled else None
+    if profiler is not None:
+        app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    def require_profiler() -> SamplingProfiler:
+        if profiler is None:
+            raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_ENABLED=1)")
+        return profiler
+
+    def render(profile: Profile, format: str):
+        if format == "speedscope":
+            return JSONResponse(profile.speedscope(), headers={
+                "Content-Disposition": 'attachment; filename="profile.speedscope.json"'})
+        return PlainTextResponse(profile.collapsed())
+
+    formats = "^(collapsed|speedscope)$"
+
+    @app.get("/admin/profiles", dependencies=dependencies or [], include_in_schema=False)
+    def list_profiles():
+        """Recent profiled requests and per-route sample totals"""
+        return require_profiler().summary()
+
+    @app.get("/admin/profiles/routes", dependencies=dependencies or [], include_in_schema=False)
+    def route_profile(route: Optional[str] = Query(None, description='e.g. "POST /v1/scan/repo"; all routes if unset'),
+                      format: str = Query("collapsed", pattern=formats)):
+        """Stacks accumulated over every profiled request to a route"""
+        return render(require_profiler().route_profile(route), format)
+
+    @app.get("/admin/profiles/{profile_id}", dependencies=dependencies or [], include_in_schema=False)
+    def request_profile(profile_id: str, format: str = Query("collapsed", pattern=formats)):
+        """Stacks sampled during one profiled request (its X-Profile-Id)"""
+        profile = require_profiler().profile(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return render(profile, format)
+
+    return profiler
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Sliding-window-counter rate limiting shared by the secure InstallSure services.
+
+Each key keeps two counters, one for the current fixed window and one for the
+previous window. The request rate is estimated as
+
+    previous * (1 - elapsed_fraction_of_current_window) + current
+
+so every check is O(1) regardless of the limit. The in-memory backend keeps
+keys in least-recently-used order and evicts keys idle for two windows as it
+goes; the Redis backend keeps the counters in Redis (any server speaking
+RESP) with key expiry, so several replicas share one budget.
+
+The Redis connection is opened on first use and reopened before a command
+if the server has closed it, so a Redis restart costs one reconnect. A
+command that fails after it was sent is never resent, as that would count
+the request twice. If Redis cannot be reached or replies with an error, the
+Redis backend fails open: requests are allowed (and a warning logged) and
+Redis is left alone for retry_interval seconds, so an outage does not stall
+every request on a connect timeout.
+"""
+import logging
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Decision for one request"""
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the estimate drops below the limit (0 if allowed)
+
+
+class MemoryBackend:
+    """Process-local counters with idle-key eviction"""
+
+    def __init__(self, max_keys: int = 1_000_000):
+        self.max_keys = max_keys
+        # key -> [window index, previous count, current count]
+        self._counters: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def hit(self, key: str, window_index: int, weight: float, limit: int) -> Tuple[bool, int, int]:
+        """Count a request if the estimate allows it; returns (allowed, previous, current)."""
+        with self._lock:
+            counters = self._counters
+            entry = counters.get(key)
+            if entry is None:
+                entry = counters[key] = [window_index, 0, 0]
+            else:
+                counters.move_to_end(key)
+                if entry[0] != window_index:
+                    # Roll forward: the old current window becomes the previous one,
+                    # unless more than one window has passed.
+                    entry[1] = entry[2] if entry[0] == window_index - 1 else 0
+                    entry[2] = 0
+                    entry[0] = window_index
+
+            allowed = entry[1] * weight + entry[2] + 1 <= limit
+            if allowed:
+                entry[2] += 1
+
+            # Least recently used keys sit at the front; anything idle for two
+            # windows has no remaining weight and can go (amortized O(1)).
+            while counters:
+                oldest_key, oldest = next(iter(counters.items()))
+                if oldest[0] < window_index - 1 or len(counters) > self.max_keys:
+                    del counters[oldest_key]
+                else:
+                    break
+            return allowed, entry[1], entry[2]
+
+
+class RespError(RuntimeError):
+    """An error reply from the server, e.g. -READONLY or -WRONGTYPE"""
+
+
+class RespConnection:
+    """Minimal pipelined client for the Redis serialization protocol (RESP2)"""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, timeout: float = 1.0,
+                 password: Optional[str] = None, username: Optional[str] = None, db: int = 0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._setup: List[Tuple] = []
+        if password is not None:
+            self._setup.append(("AUTH", username, password) if username else ("AUTH", password))
+        if db:
+            self._setup.append(("SELECT", db))
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str) -> "RespConnection":
+        """redis://[[username]:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = parsed.path.lstrip("/")
+        return cls(parsed.hostname or "localhost", parsed.port or 6379,
+                   password=unquote(parsed.password) if parsed.password is not None else None,
+                   username=unquote(parsed.username) if parsed.username else None,
+                   db=int(db) if db else 0)
+
+    def pipeline(self, *commands: Tuple) -> List:
+        """Send several commands in one write and read all replies.
+
+        Connects on first use, and reconnects first if the server has closed
+        the idle connection (e.g. Redis restarted). Every reply is read before
+        an error reply is raised as RespError, so the connection stays in step.
+        Any other failure drops the connection and raises OSError; nothing is
+        resent, since the server may already have run the commands.
+        """
+        payload = b"".join(self._encode(command) for command in commands)
+        with self._lock:
+            try:
+                if self._sock is not None and self._closed_by_server():
+                    self._disconnect()
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(payload)
+                replies = [self._read() for _ in commands]
+            except BaseException:
+                # Replies may be left half-read on the socket; never reuse it
+                self._disconnect()
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection(self.address, timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self._setup:
+            self._sock.sendall(b"".join(self._encode(command) for command in self._setup))
+            for command in self._setup:
+                reply = self._read()
+                if isinstance(reply, RespError):
+                    # Rejected credentials or database: the server is as good as unreachable
+                    raise ConnectionError(f"{command[0]} failed: {reply}")
+
+    def _closed_by_server(self) -> bool:
+        """An idle connection only turns readable when the server closed it (or sent junk)."""
+        return bool(select.select([self._sock], [], [], 0)[0])
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(command: Tuple) -> bytes:
+        parts = [str(part).encode() if not isinstance(part, bytes) else part for part in command]
+        out = [b"*%d\r\n" % len(parts)]
+        for part in parts:
+            out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+        return b"".join(out)
+
+    def _read(self):
+        """Read one reply; error replies are returned as RespError, not raised."""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._read() for _ in range(size)]
+        raise ConnectionError(f"unexpected RESP reply {line!r}")
+
+
+class RedisBackend:
+    """Counters in Redis, shared by every replica; keys expire after two windows"""
+
+    def __init__(self, connection: RespConnection, window: float, prefix: str = "ratelimit",
+                 retry_interval: float = 5.0, clock=time.monotonic):
+        self.connection = connection
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self._ttl_ms = int(window * 2000)
+        self._clock = clock
+        self.failures = 0  # requests allowed unchecked because Redis was unreachable
+        self._down = False
+        self._retry_at = 0.0
+
+    def hit(self, key: str, window_index: int, weight: float, limit: int) -> Tuple[bool, int, int]:
+        if self._down and self._clock() < self._retry_at:
+            # Still backing off: don't block the request on another connect attempt
+            self.failures += 1
+            return True, 0, 0
+        current_key = f"{self.prefix}:{key}:{window_index}"
+        try:
+            current, _, previous = self.connection.pipeline(
+                ("INCR", current_key),
+                ("PEXPIRE", current_key, self._ttl_ms),
+                ("GET", f"{self.prefix}:{key}:{window_index - 1}"),
+            )
+        except (OSError, RespError) as e:
+            # Fail open: an unreachable limiter must not take the service down with it
+            self.failures += 1
+            self._retry_at = self._clock() + self.retry_interval
+            if not self._down:
+                self._down = True
+                logger.warning(f"Rate limiting disabled for {self.retry_interval:g}s at a time, "
+                               f"Redis at {self.connection.address} failed: {e}")
+            return True, 0, 0
+        if self._down:
+            self._down = False
+            logger.warning(f"Rate limiting restored, Redis at {self.connection.address} reachable")
+        previous = int(previous or 0)
+        if previous * weight + current <= limit:
+            return True, previous, current
+        # Denied requests do not consume budget
+        try:
+            self.connection.pipeline(("DECR", current_key))
+        except (OSError, RespError):
+            pass
+        return False, previous, current - 1
+
+
+class RateLimiter:
+    """Allow at most `limit` requests per key per sliding `window` seconds"""
+
+    def __init__(self, limit: int, window: float, backend=None):
+        if limit < 1 or window <= 0:
+            raise ValueError("limit and window must be positive")
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window_index = int(now // self.window)
+        elapsed = now / self.window - window_index
+        weight = 1.0 - elapsed
+        allowed, previous, current = self.backend.hit(key, window_index, weight, self.limit)
+        if allowed:
+            return RateLimitResult(True, max(0, int(self.limit - previous * weight - current)), 0.0)
+        return RateLimitResult(False, 0, self._retry_after(elapsed, previous, current))
+
+    def _retry_after(self, elapsed: float, previous: int, current: int) -> float:
+        """Seconds until one more request fits under the sliding estimate."""
+        room = self.limit - 1
+        if current <= room and previous:
+            # The previous window's share decays enough within this window
+            return (1.0 - (room - current) / previous - elapsed) * self.window
+        # Otherwise this window's count has to decay once it becomes "previous"
+        return (1.0 - elapsed + max(0.0, 1.0 - room / current)) * self.window
+
+
+def make_backend(redis_url: Optional[str], window: float):
+    """Redis backend when a URL is configured, otherwise in-memory."""
+    if redis_url:
+        return RedisBackend(RespConnection.from_url(redis_url), window)
+    return MemoryBackend()
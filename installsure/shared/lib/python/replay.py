@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Traffic capture and in-process replay for InstallSure FastAPI services.
+CaptureMiddleware records requests reaching any of the apps as NDJSON;
+install_capture() mounts it when CAPTURE_PATH is set.
+replay() sends a captured log through an old and a new ASGI app in-process
+(httpx ASGITransport, so middleware, validation and serialization all run),
+normalizes both responses and reports mismatches and requests/sec.
+Credential headers are redacted in the log; pass --header to replay with a
+test credential instead.
+Usage: python replay.py traffic.ndjson old_module:app new_module:app
+           [--workers N] [--concurrency 64] [--mask uuid --mask timestamp] [--field id]
+           [--header "Authorization: Bearer test-token-123"]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from differential import NormalizationSpec, resolve
+
+MAX_MISMATCHES = 20
+# Headers that are per-connection or would change between capture and replay
+_SKIP_HEADERS = {b"host", b"content-length", b"connection"}
+# Headers carrying credentials, whose values are never written to the log
+_REDACT_HEADERS = {b"authorization", b"cookie", b"x-api-key"}
+REDACTED = "<REDACTED>"
+
+
+class CaptureMiddleware:
+    """ASGI middleware appending each HTTP request to an NDJSON traffic log."""
+
+    def __init__(self, app, log_path: str):
+        self.app = app
+        self._file = open(log_path, "a", buffering=1024 * 1024)
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.app(scope, receive, self._closing_on_shutdown(send))
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # Buffer the body up front so requests the app never reads (GETs,
+        # early rejections) are captured too, then hand it back unchanged.
+        chunks, more_body = [], True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        self._record(scope, body)
+
+        replayed = False
+
+        async def buffered_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return await self.app(scope, buffered_receive, send)
+
+    def _record(self, scope, body: bytes) -> None:
+        record = {
+            "ts": time.time(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "headers": [[k.decode("latin-1"), REDACTED if k in _REDACT_HEADERS else v.decode("latin-1")]
+                        for k, v in scope["headers"] if k not in _SKIP_HEADERS],
+            "body": base64.b64encode(body).decode("ascii"),
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _closing_on_shutdown(self, send):
+        async def closing_send(message):
+            await send(message)
+            if message["type"] in ("lifespan.shutdown.complete", "lifespan.shutdown.failed"):
+                self.close()
+        return closing_send
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def install_capture(app, path: Optional[str] = None) -> Optional[str]:
+    """Mount CaptureMiddleware when capture is on and return the log path
+
+    `path` defaults to CAPTURE_PATH; capture is off (None) when neither is
+    set. A "{pid}" in the path becomes the process id, so each server worker
+    appends to its own log instead of interleaving writes with the others.
+    """
+    path = path or os.environ.get("CAPTURE_PATH")
+    if not path:
+        return None
+    path = path.replace("{pid}", str(os.getpid()))
+    app.add_middleware(CaptureMiddleware, log_path=path)
+    return path
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of a replay run"""
+    requests: int
+    seconds: float
+    mismatches: List[Dict[str, Any]] = field(default_factory=list)
+    mismatch_count: int = 0
+
+    @property
+    def requests_per_sec(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+def load_log(path: str, shard: int = 0, shards: int = 1) -> Iterator[Dict[str, Any]]:
+    """Yield this shard's records (every shards-th line) from a traffic log."""
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if i % shards == shard and line.strip():
+                yield json.loads(line)
+
+
+def diff(old: Any, new: Any, path: str = "$") -> List[str]:
+    """Paths at which two normalized responses differ."""
+    if type(old) is not type(new):
+        return [path]
+    if isinstance(old, dict):
+        paths = [f"{path}.{k}" for k in old.keys() ^ new.keys()]
+        for key in old.keys() & new.keys():
+            paths.extend(diff(old[key], new[key], f"{path}.{key}"))
+        return paths
+    if isinstance(old, list):
+        if len(old) != len(new):
+            return [path]
+        paths = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            paths.extend(diff(a, b, f"{path}[{i}]"))
+        return paths
+    return [] if old == new else [path]
+
+
+async def _replay_shard_async(log_path: str, shard: int, shards: int, old_app: str, new_app: str,
+                              spec: NormalizationSpec, concurrency: int,
+                              headers: Optional[Dict[str, str]] = None) -> Tuple[int, int, list]:
+    import httpx
+
+    normalize = spec.compile()
+    # Requests go straight to the ASGI transports: the client layer (auth,
+    # redirects, cookies, hooks) has nothing to do here and roughly doubles
+    # per-request cost. One Request is built per record and sent to both.
+    transports = [httpx.ASGITransport(app=resolve(target)) for target in (old_app, new_app)]
+    records = load_log(log_path, shard, shards)
+    count, mismatch_count, mismatches = 0, 0, []
+    replaced = {name.lower() for name in headers or ()}
+
+    async def send(transport, request):
+        response = await transport.handle_async_request(request)
+        content = await response.aread()
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = content.decode("utf-8", "replace")
+        return {"status_code": response.status_code, "body": normalize(body)}
+
+    async def worker():
+        nonlocal count, mismatch_count
+        for record in records:
+            request_headers = [(k, v) for k, v in record["headers"] if k not in replaced]
+            request_headers.extend((headers or {}).items())
+            request = httpx.Request(
+                record["method"], f"http://replay{record['path']}",
+                params=record["query"] or None,
+                headers=request_headers, content=base64.b64decode(record["body"])
+            )
+            old, new = await asyncio.gather(send(transports[0], request), send(transports[1], request))
+            count += 1
+            if old != new:
+                mismatch_count += 1
+                if len(mismatches) < MAX_MISMATCHES:
+                    mismatches.append({"request": {k: record[k] for k in ("method", "path", "query")},
+                                       "paths": diff(old, new), "old": old, "new": new})
+
+    # Workers share one iterator, so each record is replayed exactly once
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return count, mismatch_count, mismatches
+
+
+def replay_shard(log_path: str, shard: int, shards: int, old_app: str, new_app: str,
+                 spec: NormalizationSpec, concurrency: int,
+                 headers: Optional[Dict[str, str]] = None) -> Tuple[int, int, list]:
+    """Replay one shard of the log in the current process."""
+    return asyncio.run(_replay_shard_async(log_path, shard, shards, old_app, new_app, spec, concurrency, headers))
+
+
+def replay(log_path: str, old_app: str, new_app: str, spec: NormalizationSpec = NormalizationSpec(),
+           workers: Optional[int] = None, concurrency: int = 64,
+           headers: Optional[Dict[str, str]] = None) -> ReplayReport:
+    """Replay a traffic log through two apps given as "module:attribute" paths.
+
+    Each worker process takes every n-th record and keeps `concurrency`
+    requests in flight. Use workers=1, concurrency=1 when the traffic is
+    order-dependent (e.g. create-then-read sequences). `headers` replace
+    the captured ones of the same name, e.g. the redacted Authorization.
+    """
+    shards = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if shards == 1:
+        results = [replay_shard(log_path, 0, 1, old_app, new_app, spec, concurrency, headers)]
+    else:
+        with ProcessPoolExecutor(max_workers=shards) as pool:
+            results = list(pool.map(replay_shard, [log_path] * shards, range(shards), [shards] * shards,
+                                    [old_app] * shards, [new_app] * shards, [spec] * shards,
+                                    [concurrency] * shards, [headers] * shards))
+    seconds = time.perf_counter() - start
+    return ReplayReport(
+        requests=sum(r[0] for r in results),
+        seconds=seconds,
+        mismatch_count=sum(r[1] for r in results),
+        mismatches=[m for r in results for m in r[2]][:MAX_MISMATCHES],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log")
+    parser.add_argument("old_app")
+    parser.add_argument("new_app")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mask", action="append", default=[], help="named pattern: uuid, timestamp")
+    parser.add_argument("--field", action="append", default=[], help="response key to mask")
+    parser.add_argument("--deep-fields", action="store_true", help="mask --field keys at any depth")
+    parser.add_argument("--drop", action="append", default=[], help="response key to ignore")
+    parser.add_argument("--header", action="append", default=[], help='"Name: value" sent with every request')
+    args = parser.parse_args()
+
+    spec = NormalizationSpec(fields={f: "<MASKED>" for f in args.field},
+                             patterns={p: f"<{p.upper()}>" for p in args.mask},
+                             drop=tuple(args.drop), deep_fields=args.deep_fields)
+    headers = dict(map(str.strip, header.split(":", 1)) for header in args.header)
+    report = replay(args.log, args.old_app, args.new_app, spec, args.workers, args.concurrency, headers)
+    print(f"{report.requests:,} requests in {report.seconds:.1f} s "
+          f"({report.requests_per_sec:,.0f} req/s), {report.mismatch_count:,} mismatches")
+    for mismatch in report.mismatches:
+        print(json.dumps(mismatch))
+    return 1 if report.mismatch_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Tests for the differential fuzzing engine
+"""
+from typing import Dict, Optional
+import uuid
+
+from fastapi import FastAPI
+from pydantic import BaseModel, Field, validator
+
+from differential import (
+    InputGenerator, NormalizationSpec, Target, _constraints, fuzz, minimize, uuid_override
+)
+
+class OrderRequest(BaseModel):
+    item: str = Field(..., min_length=1, max_length=20)
+    kind: str = Field(..., pattern="^(wall|slab|roof)$")
+    quantity: int = Field(..., ge=0, le=500)
+    notes: Optional[Dict] = Field(default_factory=dict)
+
+def price_old(payload):
+    return {"id": str(uuid.uuid4()), "total": payload.get("quantity", 0) * 2}
+
+def price_new(payload):
+    return {"id": str(uuid.uuid4()), "total": payload.get("quantity", 0) + payload.get("quantity", 0)}
+
+def price_buggy(payload):
+    quantity = payload.get("quantity", 0)
+    return {"id": str(uuid.uuid4()), "total": quantity * 2 if quantity != 7 else 0}
+
+app_old = FastAPI()
+app_new = FastAPI()
+
+@app_old.post("/v1/order")
+def order_old(request: OrderRequest):
+    return {"order_id": str(uuid.uuid4()), "kind": request.kind}
+
+@app_new.post("/v1/order")
+async def order_new(request: OrderRequest):
+    return {"order_id": str(uuid.uuid4()), "kind": request.kind}
+
+class TagRequest(BaseModel):
+    tag: str = Field(..., min_length=1, max_length=30)
+    ratio: float = Field(..., gt=0, lt=1)
+    parent: Optional[str] = None
+
+    @validator("tag")
+    def validate_tag(cls, v):
+        if not v.replace("-", "").isalnum():
+            raise ValueError("Invalid tag format")
+        return v
+
+    @validator("parent")
+    def validate_parent(cls, v):
+        if v is not None:
+            uuid.UUID(v)
+        return v
+
+ORDER_SPEC = NormalizationSpec(patterns={"uuid": "<UUID>"})
+
+def test_normalizer_masks_fields_patterns_and_drops():
+    normalize = NormalizationSpec(
+        fields={"plan_id": "ID"}, patterns={"uuid": "<UUID>", "timestamp": "<TS>"}, drop=("debug",)
+    ).compile()
+    response = {
+        "plan_id": "abc", "debug": 1,
+        "log": [f"job {uuid.uuid4()} at 2026-10-17T12:00:00.123Z"],
+    }
+    assert normalize(response) == {"plan_id": "ID", "log": ["job <UUID> at <TS>"]}
+
+def test_fields_are_masked_at_the_top_level_unless_deep():
+    response = {"id": "a", "child": {"id": "b"}, "items": [{"id": "c"}]}
+    assert NormalizationSpec(fields={"id": "ID"}).compile()(response) == {
+        "id": "ID", "child": {"id": "b"}, "items": [{"id": "c"}]}
+    assert NormalizationSpec(fields={"id": "ID"}, deep_fields=True).compile()(response) == {
+        "id": "ID", "child": {"id": "ID"}, "items": [{"id": "ID"}]}
+
+def test_generator_respects_model_constraints():
+    import random
+    generator = InputGenerator(OrderRequest, invalid_rate=0.0)
+    rnd = random.Random(1)
+    for _ in range(200):
+        OrderRequest(**generator.generate(rnd))
+
+def test_generator_redraws_fields_validators_reject():
+    import random
+    rnd = random.Random(1)
+    generator = InputGenerator(TagRequest, {"parent": uuid_override}, invalid_rate=0.0)
+    for _ in range(300):
+        request = TagRequest(**generator.generate(rnd))
+        assert 0 < request.ratio < 1
+    # Deliberately invalid fields are left invalid
+    generator = InputGenerator(TagRequest, invalid_rate=1.0)
+    assert all(TagRequest.model_fields.keys() & generator._rejected(generator.generate(rnd)) for _ in range(50))
+
+def test_exclusive_float_bounds_are_the_next_float():
+    limits = _constraints(TagRequest.model_fields["ratio"].metadata, float)
+    assert 0 < limits["ge"] < 1e-300 and 1 - 1e-15 < limits["le"] < 1
+    assert _constraints(OrderRequest.model_fields["quantity"].metadata, int) == {"ge": 0, "le": 500}
+
+def test_equivalent_callables():
+    report = fuzz(Target(price_old), Target(price_new), OrderRequest, ORDER_SPEC,
+                  examples=2_000, workers=2, shard_size=500)
+    assert report.examples == 2_000
+    assert report.failures == []
+    assert report.examples_per_sec > 0
+
+def mostly_seven(rnd):
+    return 7 if rnd.random() < 0.5 else rnd.randint(0, 500)
+
+def test_divergence_is_minimized():
+    report = fuzz(Target(price_old), Target(price_buggy), OrderRequest, ORDER_SPEC,
+                  examples=5_000, workers=2, shard_size=1_000,
+                  overrides={"quantity": mostly_seven})
+    assert report.failures
+    assert report.failures[0]["input"] == {"quantity": 7}
+
+def test_fastapi_apps_through_validation():
+    # Apps cross into worker processes by import path
+    report = fuzz(Target("test_differential:app_old", "POST", "/v1/order"),
+                  Target("test_differential:app_new", "POST", "/v1/order"),
+                  OrderRequest, ORDER_SPEC, examples=300, workers=1, shard_size=300)
+    assert report.failures == []
+
+def test_minimize_shrinks_dicts_and_strings():
+    fails = lambda p: "x" in p.get("s", "")
+    assert minimize({"s": "abcxdef", "n": 42, "extra": [1, 2]}, fails) == {"s": "x"}
+
+def test_uuid_override_is_valid():
+    import random
+    uuid.UUID(uuid_override(random.Random(0)))
@@ -11,6 +11,8 @@ from typing import Dict, Any, List
 from dataclasses import dataclass
 from datetime import datetime
 
+from differential import NormalizationSpec
+
 @dataclass
 class ServiceRequest:
     """Standardized service request format"""
@@ -27,6 +29,12 @@ class ServiceResponse:
     headers: Dict[str, str]
     timestamp: datetime
 
+# Normalizers are compiled once and reused for every response
+_JARVIS_NORMALIZE = NormalizationSpec(
+    fields={"plan_id": "NORMALIZED_ID", "job_id": "NORMALIZED_ID"}
+).compile()
+_SENTINEL_NORMALIZE = NormalizationSpec(fields={"id": "NORMALIZED_SCAN_ID"}).compile()
+
 # Translation validation for JarvisOps service
 class JarvisOpsValidator:
     """Validates JarvisOps service equivalence"""
@@ -66,16 +74,8 @@ class JarvisOpsValidator:
     
     @staticmethod
     def _normalize_response(response: Dict) -> Dict:
-        """Normalize response for comparison"""
-        normalized = response.copy()
-        
-        # Remove non-deterministic fields
-        if "plan_id" in normalized:
-            normalized["plan_id"] = "NORMALIZED_ID"
-        if "job_id" in normalized:
-            normalized["job_id"] = "NORMALIZED_ID"
-            
-        return normalized
+        """Normalize response for comparison (non-deterministic IDs masked)"""
+        return _JARVIS_NORMALIZE(response)
 
 # Translation validation for SentinelGuard service
 class SentinelGuardValidator:
@@ -103,15 +103,9 @@ class SentinelGuardValidator:
     @staticmethod
     def _scan_response_equivalent(old: Dict, new: Dict) -> bool:
         """Check if scan responses are equivalent"""
-        old_norm = old.copy()
-        new_norm = new.copy()
+        old_norm = _SENTINEL_NORMALIZE(old)
+        new_norm = _SENTINEL_NORMALIZE(new)
         
-        # Normalize scan IDs
-        if "id" in old_norm:
-            old_norm["id"] = "NORMALIZED_SCAN_ID"
-        if "id" in new_norm:
-            new_norm["id"] = "NORMALIZED_SCAN_ID"
-            
         return json.dumps(old_norm, sort_keys=True) == json.dumps(new_norm, sort_keys=True)
 
 # Property-based testing with Hypothesis
@@ -0,0 +1,99 @@
+"""
+Tests for the shared request metrics middleware and histograms
+"""
+import random
+import threading
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from httpmetrics import BUCKETS, FLUSH_EVERY, Histogram, HttpMetrics, bucket_bounds, bucket_index, instrument
+
+def test_buckets_cover_the_range_within_precision():
+    previous = -1
+    for index in range(BUCKETS):
+        low, high = bucket_bounds(index)
+        assert low == previous + 1
+        assert high - low <= max(0, low / 64)
+        previous = high
+    assert previous == 2 ** 32 - 1
+    assert bucket_index(10 ** 12) == BUCKETS - 1
+
+def test_quantiles():
+    rnd = random.Random(7)
+    values = sorted(int(rnd.lognormvariate(8, 1.5)) for _ in range(50_000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    for fraction in (0.5, 0.95, 0.99, 0.999):
+        exact = values[round(fraction * len(values)) - 1]
+        assert histogram.quantile(fraction) == pytest.approx(exact, rel=0.02)
+    assert histogram.quantile(1.0) == histogram.max == values[-1]
+    assert Histogram().quantile(0.5) == 0
+
+def test_threads_are_merged():
+    metrics = HttpMetrics("svc", flush_every=10)
+    def work():
+        for i in range(1005):
+            metrics.record("GET", "/a", 500 if i % 5 == 0 else 200, i)
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    summary = metrics.summary()
+    assert summary["requests"] == 4020
+    assert summary["routes"]["GET /a"]["errors"] == 4 * 201
+    assert summary["error_rate"] == pytest.approx(0.2, abs=0.001)
+
+def test_scrapes_never_take_a_threads_buffer():
+    metrics = HttpMetrics("svc")
+    metrics.record("GET", "/a", 200, 10)
+    # record() has read its buffer and is about to append when another thread scrapes
+    buffer = metrics._local.shard.buffer
+    scrape = threading.Thread(target=metrics.summary)
+    scrape.start()
+    scrape.join()
+    buffer.append(("GET", "/a", 200, 20))
+    assert metrics.summary()["requests"] == 2
+    for i in range(FLUSH_EVERY):
+        metrics.record("GET", "/a", 200, i)
+    assert metrics.summary()["requests"] == 2 + FLUSH_EVERY
+    assert len(metrics._local.shard.buffer) < FLUSH_EVERY
+
+def test_middleware_records_routes_and_errors():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        if item_id < 0:
+            raise RuntimeError("boom")
+        return {"id": item_id}
+
+    metrics = instrument(app, "svc")
+    client = TestClient(app, raise_server_exceptions=False)
+    for i in range(1, 6):
+        assert client.get(f"/items/{i}").status_code == 200
+    assert client.get("/items/0").status_code == 404
+    assert client.get("/items/-1").status_code == 500
+    assert client.get("/nowhere").status_code == 404
+
+    summary = metrics.summary()
+    routes = summary["routes"]
+    assert routes["GET /items/{item_id}"]["count"] == 7
+    assert routes["GET /items/{item_id}"]["client_errors"] == 1
+    assert routes["GET /items/{item_id}"]["errors"] == 1
+    assert routes["GET unmatched"]["count"] == 1
+    assert summary["error_rate"] == pytest.approx(1 / 8)
+    assert summary["in_flight"] == 0
+    assert summary["latency_p95_ms"] > 0
+
+    text = client.get("/metrics/prometheus").text
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_count{service="svc",method="GET",route="/items/{item_id}"} 7' in text
+    assert 'http_requests_total{service="svc",method="GET",route="/items/{item_id}",status="5xx"} 1' in text
+    assert 'http_request_duration_seconds_bucket{service="svc",method="GET",route="/items/{item_id}",le="+Inf"} 7' in text
+    assert 'http_requests_in_flight{service="svc"} 1' in text  # the scrape itself
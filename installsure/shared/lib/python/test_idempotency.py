@@ -0,0 +1,122 @@
+"""
+Tests for the shared Idempotency-Key cache
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.testclient import TestClient
+
+from idempotency import IdempotencyCache, IdempotencyConflict, idempotent
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_replay_and_conflict():
+    async def main():
+        cache = IdempotencyCache()
+        calls = []
+        produce = lambda: calls.append(1) or {"job_id": len(calls)}
+        assert await cache.run("s", "k", b'{"x": 1}', produce) == ({"job_id": 1}, False)
+        assert await cache.run("s", "k", b'{"x": 1}', produce) == ({"job_id": 1}, True)
+        assert await cache.run("other", "k", b'{"x": 1}', produce) == ({"job_id": 2}, False)
+        with pytest.raises(IdempotencyConflict):
+            await cache.run("s", "k", b'{"x": 2}', produce)
+        assert (cache.replayed, cache.conflicts) == (1, 1)
+    run(main())
+
+def test_concurrent_duplicates_coalesce():
+    async def main():
+        cache = IdempotencyCache()
+        release = asyncio.Event()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            await release.wait()
+            return {"job_id": "j"}
+
+        first = asyncio.ensure_future(cache.run("s", "k", b"", produce))
+        await asyncio.sleep(0)
+        duplicates = [asyncio.ensure_future(cache.run("s", "k", b"", produce)) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, *duplicates)
+        assert len(calls) == 1
+        assert results[0] == ({"job_id": "j"}, False)
+        assert all(result == ({"job_id": "j"}, True) for result in results[1:])
+        assert cache.coalesced == 10
+    run(main())
+
+def test_failures_reach_waiters_and_are_forgotten():
+    async def main():
+        cache = IdempotencyCache()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise HTTPException(status_code=429, detail="busy")
+
+        first = asyncio.ensure_future(cache.run("s", "k", b"", fail))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.run("s", "k", b"", fail))
+        await asyncio.sleep(0)
+        release.set()
+        for task in (first, waiter):
+            with pytest.raises(HTTPException):
+                await task
+        assert len(cache) == 0
+        assert await cache.run("s", "k", b"", lambda: "ok") == ("ok", False)
+    run(main())
+
+def test_cancelled_waiter_leaves_the_response_shared():
+    async def main():
+        cache = IdempotencyCache()
+        release = asyncio.Event()
+
+        async def produce():
+            await release.wait()
+            return {"job_id": "j"}
+
+        first = asyncio.ensure_future(cache.run("s", "k", b"", produce))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.run("s", "k", b"", produce))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        assert await first == ({"job_id": "j"}, False)
+        assert await cache.run("s", "k", b"", produce) == ({"job_id": "j"}, True)
+    run(main())
+
+def test_ttl_and_size_bound():
+    async def main():
+        now = [0.0]
+        cache = IdempotencyCache(max_entries=3, ttl=10, clock=lambda: now[0])
+        for i in range(5):
+            await cache.run("s", str(i), b"", lambda: i)
+        assert len(cache) == 3
+        assert await cache.run("s", "0", b"", lambda: "again") == ("again", False)
+        now[0] = 11
+        assert await cache.run("s", "4", b"", lambda: "expired") == ("expired", False)
+    run(main())
+
+def test_idempotent_endpoint():
+    app = FastAPI()
+    cache = IdempotencyCache()
+    calls = []
+
+    @app.post("/jobs")
+    async def submit(request: Request, response: Response, body: dict):
+        return await idempotent(cache, request, response, lambda: calls.append(body) or {"job": len(calls)})
+
+    client = TestClient(app)
+    assert client.post("/jobs", json={"a": 1}).json() == {"job": 1}
+    first = client.post("/jobs", json={"a": 1}, headers={"Idempotency-Key": "k"})
+    again = client.post("/jobs", json={"a": 1}, headers={"Idempotency-Key": "k"})
+    assert first.json() == again.json() == {"job": 2}
+    assert again.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+    assert client.post("/jobs", json={"a": 2}, headers={"Idempotency-Key": "k"}).status_code == 422
+    assert client.post("/jobs", json={"a": 1}, headers={"Idempotency-Key": ""}).status_code == 400
+    assert len(calls) == 2
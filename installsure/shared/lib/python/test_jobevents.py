@@ -0,0 +1,83 @@
+"""
+Tests for the shared job event bus and its SSE/WebSocket streams
+"""
+import asyncio
+import threading
+
+from jobevents import JobEventBus, sse_events, stream_websocket
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_fan_out_from_other_threads():
+    async def main():
+        bus = JobEventBus()
+        subs = [bus.subscribe("job") for _ in range(100)]
+        other = bus.subscribe("other")
+        publisher = threading.Thread(target=lambda: [bus.publish("job", {"n": i}) for i in range(3)])
+        publisher.start()
+        publisher.join()
+        received = [[(await s.next(1))["n"] for _ in range(3)] for s in subs]
+        assert received == [[0, 1, 2]] * 100
+        assert await other.next(0.01) is None
+        for s in subs + [other]:
+            s.close()
+        assert bus.subscribers == 0
+        assert not bus.watching("job")
+    run(main())
+
+def test_full_buffer_keeps_latest_events():
+    async def main():
+        bus = JobEventBus(buffer_size=4)
+        with bus.subscribe("job") as sub:
+            for i in range(10):
+                bus.publish("job", {"n": i})
+            assert [(await sub.next(1))["n"] for _ in range(4)] == [6, 7, 8, 9]
+            assert sub.dropped == 6 and bus.dropped == 6
+    run(main())
+
+def test_unwatched_publish_is_skipped():
+    bus = JobEventBus()
+    bus.publish("job", {"n": 1})  # no loop bound, nobody subscribed
+    assert bus.published == 0
+
+def test_sse_stream_from_snapshot_to_terminal():
+    async def main():
+        bus = JobEventBus()
+        state = {"state": "RUNNING"}
+
+        async def finish():
+            await asyncio.sleep(0.01)
+            bus.publish("job", {"state": "RUNNING", "progress": 50})
+            bus.publish("job", {"state": "COMPLETED"})
+
+        asyncio.get_running_loop().create_task(finish())
+        chunks = [c async for c in sse_events(bus, "job", lambda: dict(state),
+                                               lambda e: e["state"] == "COMPLETED", heartbeat=0.005)]
+        data = [c for c in chunks if c.startswith(b"event:")]
+        assert data[0] == b'event: status\ndata: {"state":"RUNNING"}\n\n'
+        assert data[-1] == b'event: status\ndata: {"state":"COMPLETED"}\n\n'
+        assert b": keepalive\n\n" in chunks
+        assert bus.subscribers == 0
+    run(main())
+
+def test_unknown_job_stream_is_empty():
+    async def main():
+        bus = JobEventBus()
+        assert [c async for c in sse_events(bus, "job", lambda: None, lambda e: True)] == []
+        assert bus.subscribers == 0
+    run(main())
+
+def test_websocket_unsubscribes_when_send_fails():
+    class Broken:
+        async def send_json(self, message):
+            raise ConnectionError("client went away")
+
+    async def main():
+        bus = JobEventBus()
+        try:
+            await stream_websocket(Broken(), bus, "job", lambda: {"state": "RUNNING"}, lambda e: False)
+        except ConnectionError:
+            pass
+        assert bus.subscribers == 0
+    run(main())
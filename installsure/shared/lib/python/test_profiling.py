@@ -0,0 +1,78 @@
+"""
+Tests for the shared sampling profiler
+"""
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from profiling import Profile, ProfilingMiddleware, install_profiling
+
+def burn_cpu(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+def make_app(**kwargs):
+    app = FastAPI()
+
+    @app.get("/work/{n}")
+    def work(n: int):
+        burn_cpu(0.1)
+        return {"n": n}
+
+    return app, install_profiling(app, interval=0.002, **kwargs)
+
+def test_disabled_mounts_nothing():
+    app, profiler = make_app(enabled=False)
+    assert profiler is None
+    assert not any(m.cls is ProfilingMiddleware for m in app.user_middleware)
+    client = TestClient(app)
+    response = client.get("/work/1", headers={"X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+    assert client.get("/admin/profiles").status_code == 404
+
+def test_header_is_ignored_unless_enabled():
+    app, profiler = make_app(enabled=True)
+    client = TestClient(app)
+    assert "X-Profile-Id" not in client.get("/work/1", headers={"X-Profile": "1"}).headers
+    assert client.get("/admin/profiles").json()["recent"] == []
+
+def test_header_profiles_a_request():
+    app, profiler = make_app(enabled=True, header=True)
+    client = TestClient(app)
+    assert "X-Profile-Id" not in client.get("/work/1").headers
+    response = client.get("/work/2", headers={"X-Profile": "1"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    listing = client.get("/admin/profiles").json()
+    assert [p["id"] for p in listing["recent"]] == [profile_id]
+    assert listing["recent"][0]["route"] == "/work/{n}" and listing["recent"][0]["samples"] > 0
+    assert listing["routes"][0]["route"] == "GET /work/{n}"
+
+    collapsed = client.get(f"/admin/profiles/{profile_id}").text
+    assert any("burn_cpu" in line.rsplit(" ", 1)[0] for line in collapsed.splitlines())
+    assert int(collapsed.splitlines()[0].rsplit(" ", 1)[1]) > 0
+
+    speedscope = client.get(f"/admin/profiles/{profile_id}", params={"format": "speedscope"}).json()
+    frames = speedscope["shared"]["frames"]
+    sampled = speedscope["profiles"][0]
+    assert sampled["type"] == "sampled" and len(sampled["samples"]) == len(sampled["weights"])
+    assert "burn_cpu" in {frames[i]["name"] for stack in sampled["samples"] for i in stack}
+
+    route = client.get("/admin/profiles/routes", params={"route": "GET /work/{n}"}).text
+    assert "burn_cpu" in route
+    assert client.get("/admin/profiles/unknown").status_code == 404
+
+def test_sample_rate():
+    app, profiler = make_app(enabled=True, sample_rate=1.0)
+    client = TestClient(app)
+    assert "X-Profile-Id" in client.get("/work/1").headers
+    assert "X-Profile-Id" not in client.get("/work/1", headers={"X-Profile": "0"}).headers
+
+def test_collapsed_format():
+    profile = Profile("p", 0.01)
+    profile.stacks[(("main", "/app/a.py", 1), ("handler", "/app/b.py", 10))] = 3
+    profile.stacks[(("main", "/app/a.py", 1),)] = 1
+    assert profile.collapsed() == "main (a.py:1);handler (b.py:10) 3\nmain (a.py:1) 1\n"
+    assert profile.speedscope()["profiles"][0]["endValue"] == 0.04
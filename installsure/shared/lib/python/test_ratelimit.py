@@ -0,0 +1,216 @@
+"""
+Tests for the shared sliding-window rate limiter
+"""
+import socketserver
+import threading
+import time
+
+import pytest
+
+from ratelimit import MemoryBackend, RateLimiter, RedisBackend, RespConnection, make_backend
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Local stand-in for Redis implementing the commands the limiter uses"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, password=None):
+        super().__init__(("127.0.0.1", port), RespHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.password = password
+        self.commands = []
+        self.connections = []
+        self.readonly = False  # refuse writes like a replica would
+        self.delay = 0.0  # seconds to sit on each reply
+
+    def stop(self):
+        """Stop listening and drop every client, as a Redis restart would"""
+        self.shutdown()
+        self.server_close()
+        for connection in self.connections:
+            connection.close()
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.server.connections.append(self.connection)
+        self.authenticated = self.server.password is None
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2].decode())
+            reply = self.execute(*args)
+            time.sleep(self.server.delay)
+            self.wfile.write(reply)
+
+    def execute(self, command, *args):
+        data, lock = self.server.data, self.server.lock
+        self.server.commands.append((command, *args))
+        if command == "AUTH":
+            self.authenticated = args[-1] == self.server.password
+            return b"+OK\r\n" if self.authenticated else b"-WRONGPASS invalid password\r\n"
+        if not self.authenticated:
+            return b"-NOAUTH Authentication required\r\n"
+        if command == "SELECT":
+            return b"+OK\r\n"
+        if self.server.readonly and command in ("INCR", "DECR", "PEXPIRE"):
+            return b"-READONLY You can't write against a read only replica.\r\n"
+        with lock:
+            if command in ("INCR", "DECR"):
+                data[args[0]] = int(data.get(args[0], 0)) + (1 if command == "INCR" else -1)
+                return b":%d\r\n" % data[args[0]]
+            if command == "GET":
+                value = data.get(args[0])
+                if value is None:
+                    return b"$-1\r\n"
+                value = str(value).encode()
+                return b"$%d\r\n%s\r\n" % (len(value), value)
+            if command == "PEXPIRE":
+                return b":1\r\n"
+        return b"-ERR unknown command\r\n"
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def resp_server():
+    server = serve(RespStandIn())
+    yield server
+    server.stop()
+
+def test_limit_within_window():
+    limiter = RateLimiter(limit=3, window=60)
+    assert [limiter.hit("a", now=600.0).allowed for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit("b", now=600.0).allowed
+
+def test_previous_window_decays():
+    limiter = RateLimiter(limit=10, window=60)
+    for _ in range(10):
+        assert limiter.hit("a", now=659.0).allowed
+    # Just into the next window the previous ten still weigh ~10
+    denied = limiter.hit("a", now=661.0)
+    assert not denied.allowed
+    assert 0 < denied.retry_after <= 60
+    # Halfway through, half of them remain; five more fit
+    results = [limiter.hit("a", now=690.0).allowed for _ in range(6)]
+    assert results == [True] * 5 + [False]
+
+def test_retry_after_is_sufficient():
+    limiter = RateLimiter(limit=5, window=10)
+    for _ in range(5):
+        limiter.hit("a", now=103.0)
+    denied = limiter.hit("a", now=104.0)
+    assert not limiter.hit("a", now=104.0 + denied.retry_after - 0.01).allowed
+    assert limiter.hit("a", now=104.0 + denied.retry_after + 0.01).allowed
+
+def test_idle_keys_are_evicted():
+    backend = MemoryBackend()
+    limiter = RateLimiter(limit=5, window=10, backend=backend)
+    for i in range(1000):
+        limiter.hit(f"client-{i}", now=100.0)
+    assert len(backend) == 1000
+    limiter.hit("late", now=125.0)
+    assert len(backend) == 1
+
+def test_max_keys_bound():
+    backend = MemoryBackend(max_keys=100)
+    limiter = RateLimiter(limit=5, window=10, backend=backend)
+    for i in range(1000):
+        limiter.hit(f"client-{i}", now=100.0)
+    assert len(backend) == 100
+
+def test_redis_backend_matches_memory(resp_server):
+    connection = RespConnection(*resp_server.server_address)
+    redis = RateLimiter(limit=10, window=60, backend=RedisBackend(connection, window=60))
+    memory = RateLimiter(limit=10, window=60)
+    schedule = [659.0] * 12 + [661.0] * 3 + [690.0] * 8 + [800.0] * 2
+    for now in schedule:
+        assert redis.hit("ip", now=now) == memory.hit("ip", now=now)
+    connection.close()
+
+def test_redis_connects_lazily_and_fails_open():
+    # Nothing listens here: building the backend must not fail, and requests are allowed
+    probe = RespStandIn()
+    port = probe.server_address[1]
+    probe.server_close()
+    backend = make_backend(f"redis://127.0.0.1:{port}", 60)
+    limiter = RateLimiter(limit=1, window=60, backend=backend)
+    assert [limiter.hit("ip", now=600.0).allowed for _ in range(3)] == [True] * 3
+    assert backend.failures == 3
+
+def test_redis_reconnects_after_restart(resp_server):
+    host, port = resp_server.server_address
+    connection = RespConnection(host, port)
+    limiter = RateLimiter(limit=3, window=60, backend=RedisBackend(connection, window=60))
+    assert limiter.hit("ip", now=600.0).allowed
+    resp_server.stop()
+    restarted = serve(RespStandIn(port))
+    restarted.data = resp_server.data
+    # The dead connection is replaced within the same request
+    assert [limiter.hit("ip", now=600.0).allowed for _ in range(3)] == [True, True, False]
+    assert limiter.backend.failures == 0
+    connection.close()
+    restarted.stop()
+
+def test_error_reply_fails_open_and_keeps_replies_in_step(resp_server):
+    connection = RespConnection(*resp_server.server_address)
+    backend = RedisBackend(connection, window=60, retry_interval=0)
+    limiter = RateLimiter(limit=2, window=60, backend=backend)
+    resp_server.readonly = True
+    assert limiter.hit("ip", now=600.0).allowed and backend.failures == 1
+    resp_server.readonly = False
+    # Had the GET reply been left unread, these would read the wrong replies
+    assert [limiter.hit("ip", now=600.0).allowed for _ in range(3)] == [True, True, False]
+    assert resp_server.data["ratelimit:ip:10"] == 2
+    connection.close()
+
+def test_slow_reply_is_not_resent(resp_server):
+    connection = RespConnection(*resp_server.server_address, timeout=0.2)
+    backend = RedisBackend(connection, window=60, retry_interval=0)
+    limiter = RateLimiter(limit=5, window=60, backend=backend)
+    resp_server.delay = 0.5
+    assert limiter.hit("ip", now=600.0).allowed and backend.failures == 1
+    time.sleep(1.0)
+    assert [command for command, *_ in resp_server.commands].count("INCR") == 1
+    resp_server.delay = 0.0
+    # A fresh connection; the late replies on the old one are never read
+    assert limiter.hit("ip", now=600.0).remaining == 3
+    connection.close()
+
+def test_backs_off_after_a_failure():
+    probe = RespStandIn()
+    host, port = probe.server_address
+    probe.server_close()
+    now = [0.0]
+    backend = RedisBackend(RespConnection(host, port), window=60, retry_interval=5, clock=lambda: now[0])
+    limiter = RateLimiter(limit=1, window=60, backend=backend)
+    assert limiter.hit("ip", now=600.0).allowed
+    server = serve(RespStandIn(port))
+    # Within the back-off Redis is not tried, even though it is back
+    assert limiter.hit("ip", now=600.0).allowed and backend.failures == 2
+    assert server.connections == []
+    now[0] = 5.0
+    assert [limiter.hit("ip", now=600.0).allowed for _ in range(2)] == [True, False]
+    assert backend.failures == 2
+    backend.connection.close()
+    server.stop()
+
+def test_redis_url_credentials_and_db():
+    server = serve(RespStandIn(password="s3cret"))
+    host, port = server.server_address
+    backend = make_backend(f"redis://:s3cret@{host}:{port}/2", 60)
+    assert RateLimiter(limit=1, window=60, backend=backend).hit("ip", now=600.0).allowed
+    assert server.commands[:2] == [("AUTH", "s3cret"), ("SELECT", "2")]
+    wrong = make_backend(f"redis://user:wrong@{host}:{port}", 60)
+    assert RateLimiter(limit=1, window=60, backend=wrong).hit("ip", now=600.0).allowed
+    assert wrong.failures == 1 and ("AUTH", "user", "wrong") in server.commands
+    backend.connection.close()
+    server.stop()
@@ -0,0 +1,111 @@
+"""
+Tests for traffic capture and in-process replay
+"""
+import os
+import uuid
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+
+from differential import NormalizationSpec
+from replay import CaptureMiddleware, diff, install_capture, load_log, replay
+
+class Item(BaseModel):
+    name: str = Field(..., min_length=1)
+    qty: int = 1
+
+def make_app(total):
+    app = FastAPI()
+
+    @app.post("/items")
+    def create(item: Item):
+        return {"id": str(uuid.uuid4()), "total": total(item.qty)}
+
+    @app.get("/items/{name}")
+    def read(name: str, verbose: bool = False):
+        return {"name": name, "verbose": verbose}
+
+    @app.get("/private")
+    def private(authorization: str = Header("")):
+        if authorization != "Bearer replay-token":
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+    return app
+
+old_app = make_app(lambda qty: qty * 2)
+new_app = make_app(lambda qty: qty + qty)
+drifted_app = make_app(lambda qty: qty * 2 if qty < 10 else qty * 3)
+public_app = FastAPI()
+public_app.get("/private")(lambda: {"ok": True})
+
+def capture(tmp_path, requests, headers=None):
+    log = tmp_path / "traffic.ndjson"
+    app = make_app(lambda qty: qty)
+    middleware = CaptureMiddleware(app, str(log))
+    client = TestClient(middleware)
+    for method, path, body in requests:
+        client.request(method, path, json=body, headers=headers)
+    middleware.flush()
+    return str(log)
+
+TRAFFIC = [("POST", "/items", {"name": "stud", "qty": q}) for q in range(20)] + [
+    ("GET", "/items/plate?verbose=true", None),
+    ("POST", "/items", {"name": ""}),  # validation error on both sides
+]
+
+def test_capture_records_requests(tmp_path):
+    records = list(load_log(capture(tmp_path, TRAFFIC)))
+    assert len(records) == len(TRAFFIC)
+    assert records[20]["path"] == "/items/plate"
+    assert records[20]["query"] == "verbose=true"
+
+def test_capture_redacts_credentials(tmp_path):
+    headers = {"Authorization": "Bearer secret-token-123", "Cookie": "session=abc", "X-API-Key": "k-123",
+               "X-Request-Id": "r1"}
+    log = capture(tmp_path, [("GET", "/private", None)], headers)
+    with open(log) as f:
+        text = f.read()
+    assert "secret-token-123" not in text and "session=abc" not in text and "k-123" not in text
+    recorded = dict(next(load_log(log))["headers"])
+    assert recorded["authorization"] == recorded["cookie"] == recorded["x-api-key"] == "<REDACTED>"
+    assert recorded["x-request-id"] == "r1"
+    # Replays supply their own credentials in place of the redacted ones
+    report = replay(log, "test_replay:old_app", "test_replay:public_app", workers=1, concurrency=1,
+                    headers={"Authorization": "Bearer replay-token"})
+    assert report.mismatch_count == 0
+    assert replay(log, "test_replay:old_app", "test_replay:public_app", workers=1).mismatch_count == 1
+
+def test_log_closed_on_shutdown(tmp_path):
+    middleware = CaptureMiddleware(make_app(lambda qty: qty), str(tmp_path / "traffic.ndjson"))
+    with TestClient(middleware) as client:
+        client.get("/items/plate")
+    assert middleware._file.closed
+    assert len(list(load_log(str(tmp_path / "traffic.ndjson")))) == 1
+
+def test_install_capture_follows_capture_path(tmp_path, monkeypatch):
+    monkeypatch.delenv("CAPTURE_PATH", raising=False)
+    app = make_app(lambda qty: qty)
+    assert install_capture(app) is None
+    assert not app.user_middleware
+    monkeypatch.setenv("CAPTURE_PATH", str(tmp_path / "traffic-{pid}.ndjson"))
+    path = install_capture(app)
+    assert path == str(tmp_path / f"traffic-{os.getpid()}.ndjson")
+    with TestClient(app) as client:
+        client.get("/items/plate")
+    assert [r["path"] for r in load_log(path)] == ["/items/plate"]
+
+def test_replay_equivalent_apps(tmp_path):
+    report = replay(capture(tmp_path, TRAFFIC), "test_replay:old_app", "test_replay:new_app",
+                    NormalizationSpec(fields={"id": "<ID>"}), workers=2, concurrency=4)
+    assert report.requests == len(TRAFFIC)
+    assert report.mismatch_count == 0
+
+def test_replay_reports_mismatches(tmp_path):
+    report = replay(capture(tmp_path, TRAFFIC), "test_replay:old_app", "test_replay:drifted_app",
+                    NormalizationSpec(patterns={"uuid": "<UUID>"}), workers=1, concurrency=8)
+    assert report.mismatch_count == 10
+    assert all(m["paths"] == ["$.body.total"] for m in report.mismatches)
+
+def test_diff_paths():
+    assert diff({"a": [1, {"b": 2}]}, {"a": [1, {"b": 3}], "c": 0}) == ["$.c", "$.a[1].b"]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compiled per-group sums for estimate_batch().
+
+When numba is installed, group_sums() makes one pass over the value and
+group columns and accumulates each group in column order, the same order
+sum() walks a dict. Integer columns are summed exactly in int64. Without
+numba, or for value columns it does not handle, it returns None and the
+estimators fall back to their NumPy implementations.
+"""
+import numpy as np
+
+_kernel = None
+
+
+def _compile():
+    global _kernel
+    if _kernel is None:
+        try:
+            import numba
+        except ImportError:
+            _kernel = False
+            return None
+
+        @numba.njit(nogil=True, cache=True)
+        def accumulate(values, groups, sums, counts):
+            for i in range(values.size):
+                group = groups[i]
+                if group < 0 or group >= sums.size:
+                    return i
+                sums[group] += values[i]
+                counts[group] += 1
+            return -1
+
+        _kernel = accumulate
+    return _kernel or None
+
+
+def available():
+    """True if group_sums() can run compiled."""
+    return _compile() is not None
+
+
+def group_sums(values, groups, num_groups):
+    """
+    Sum values per group.
+    Args:
+        values: 1-D NumPy array of parameter values
+        groups: 1-D intp array, same length, giving each value's group
+        num_groups: number of groups
+    Returns:
+        (sums, counts) arrays of length num_groups, or None if the kernel
+        is unavailable or the value dtype is not a signed integer, an
+        unsigned integer narrower than 64 bits, or a float
+    """
+    kind, size = values.dtype.kind, values.dtype.itemsize
+    if not (kind in "if" or (kind == "u" and size < 8)):
+        return None
+    kernel = _compile()
+    if kernel is None:
+        return None
+    sums = np.zeros(num_groups, dtype=np.float64 if kind == "f" else np.int64)
+    counts = np.zeros(num_groups, dtype=np.int64)
+    if kernel(values, groups, sums, counts) >= 0:
+        raise ValueError("group index out of range")
+    return sums, counts
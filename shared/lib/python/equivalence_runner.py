@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Sharded equivalence runner for estimator_old vs estimator_new.
+Generates the same kind of inputs as test_equivalence (text keys, integer
+values 0-100) from seeded RNGs, one shard per task across a process pool,
+and compares results structurally instead of via json.dumps.
+Usage: python equivalence_runner.py [--examples 10000000] [--workers N] [--seed 0]
+"""
+import argparse
+import importlib
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+SHARD_SIZE = 100_000
+MAX_KEYS = 12
+MAX_FAILURES = 10
+
+# Mostly ASCII, with some multi-byte code points like Hypothesis' text()
+_ALPHABET = (
+    [chr(c) for c in range(0x20, 0x7f)]
+    + [chr(c) for c in range(0xa0, 0x250)]
+    + [chr(c) for c in (0x3b1, 0x416, 0x4e2d, 0x1f600, 0x0)]
+)
+
+
+@dataclass
+class RunReport:
+    """Outcome of an equivalence run"""
+    examples: int
+    seconds: float
+    failures: List[Tuple[str, Dict[str, int]]] = field(default_factory=list)
+
+    @property
+    def examples_per_sec(self) -> float:
+        return self.examples / self.seconds if self.seconds else 0.0
+
+
+def generate_params(rnd: random.Random) -> Dict[str, int]:
+    """One params dict: 0-MAX_KEYS keys of 1-15 characters, values 0-100."""
+    params = {}
+    for _ in range(rnd.randint(0, MAX_KEYS)):
+        key = "".join(rnd.choices(_ALPHABET, k=rnd.randint(1, 15)))
+        params[key] = rnd.randint(0, 100)
+    return params
+
+
+def equivalent(a: Any, b: Any) -> bool:
+    """Structural equality that, like json.dumps, tells 1 and 1.0 apart."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(equivalent(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(equivalent(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def run_shard(seed: int, shard: int, examples: int,
+              old_name: str = "estimator_old", new_name: str = "estimator_new") -> Tuple[int, list]:
+    """Check `examples` generated inputs; return (count, failing examples)."""
+    old = importlib.import_module(old_name).estimate
+    new = importlib.import_module(new_name).estimate
+    rnd = random.Random(f"{seed}:{shard}")
+    failures = []
+    for i in range(examples):
+        params = generate_params(rnd)
+        if not equivalent(old(params), new(params)):
+            failures.append((f"seed={seed} shard={shard} example={i}", params))
+            if len(failures) >= MAX_FAILURES:
+                return i + 1, failures
+    return examples, failures
+
+
+def run(examples: int, workers: int = None, seed: int = 0, shard_size: int = SHARD_SIZE) -> RunReport:
+    """Run `examples` comparisons split into shards over a process pool."""
+    sizes = [shard_size] * (examples // shard_size)
+    if examples % shard_size:
+        sizes.append(examples % shard_size)
+
+    start = time.perf_counter()
+    checked, failures = 0, []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_shard, seed, shard, size) for shard, size in enumerate(sizes)]
+        for future in futures:
+            count, shard_failures = future.result()
+            checked += count
+            failures.extend(shard_failures)
+    return RunReport(examples=checked, seconds=time.perf_counter() - start,
+                     failures=failures[:MAX_FAILURES])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--examples", type=int, default=10_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    report = run(args.examples, args.workers, args.seed, args.shard_size)
+    print(f"{report.examples:,} examples in {report.seconds:.1f} s "
+          f"({report.examples_per_sec:,.0f} examples/s, {args.workers or os.cpu_count()} workers)")
+    for where, params in report.failures:
+        print(f"NOT EQUIVALENT at {where}: {params!r}")
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
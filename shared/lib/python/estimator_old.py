@@ -24,3 +24,73 @@ def estimate(params):
         "total": total + overhead,
         "parameter_count": len(params)
     }
+
+def estimate_batch(values, groups, num_groups=None):
+    """
+    Original estimation logic over many parameter sets at once.
+    Args:
+        values: 1-D array-like of integer parameter values (NumPy array, Arrow column, list)
+        groups: 1-D array-like, same length as values, giving the parameter set index of each value
+        num_groups: number of parameter sets; defaults to max(groups) + 1
+    Returns:
+        dict of NumPy columns indexed by parameter set. Row i matches estimate() of
+        the dict holding the values of group i, in column order; where that dict
+        would be empty, "error" is True and the numeric columns are zero.
+    """
+    import numpy as np
+    from batch_kernel import group_sums
+
+    values = np.asarray(values)
+    groups = np.asarray(groups, dtype=np.intp)
+    if values.ndim != 1 or values.shape != groups.shape:
+        raise ValueError("values and groups must be 1-D columns of equal length")
+    if num_groups is None:
+        num_groups = int(groups.max()) + 1 if groups.size else 0
+
+    compiled = group_sums(values, groups, num_groups)
+    if compiled is not None:
+        total, counts = compiled
+        overhead = total * 0.1
+        return {
+            "base_estimate": total,
+            "overhead": overhead,
+            "total": total + overhead,
+            "parameter_count": counts,
+            "error": counts == 0
+        }
+
+    counts = np.bincount(groups, minlength=num_groups)
+    if counts.size > num_groups:
+        raise ValueError("group index out of range")
+
+    # bincount accumulates each group left to right in column order, the
+    # same order sum() walks the dict, so float sums match bit for bit.
+    # Integer sums are exact in float64 while they stay below 2**53.
+    is_int = values.dtype.kind in "biu"
+    if not is_int or _fits_float64(values):
+        total = np.bincount(groups, weights=values, minlength=num_groups)
+        if is_int:
+            total = total.astype(np.int64)
+    else:
+        order = np.argsort(groups, kind="stable")
+        prefix = np.zeros(values.size + 1, dtype=np.int64)
+        np.cumsum(values[order], out=prefix[1:])
+        ends = np.cumsum(counts)
+        total = prefix[ends] - prefix[ends - counts]
+
+    overhead = total * 0.1
+
+    return {
+        "base_estimate": total,
+        "overhead": overhead,
+        "total": total + overhead,
+        "parameter_count": counts.astype(np.int64, copy=False),
+        "error": counts == 0
+    }
+
+def _fits_float64(values):
+    """True if every partial sum of the integer column is exactly representable as float64."""
+    if not values.size:
+        return True
+    bound = max(abs(int(values.max())), abs(int(values.min())))
+    return bound * values.size < 2 ** 53
@@ -1,6 +1,9 @@
 from hypothesis import given, strategies as st
 import json
 import importlib
+from unittest import mock
+
+import pytest
 
 # Expect these pure functions to exist (old & new impls)
 old = importlib.import_module('estimator_old').estimate
@@ -10,3 +13,64 @@ new = importlib.import_module('estimator_new').estimate
                        values=st.integers(min_value=0, max_value=100)))
 def test_equivalence(params):
     assert json.dumps(old(params), sort_keys=True) == json.dumps(new(params), sort_keys=True)
+
+old_batch = importlib.import_module('estimator_old').estimate_batch
+new_batch = importlib.import_module('estimator_new').estimate_batch
+batch_kernel = importlib.import_module('batch_kernel')
+# Compile up front so each example runs on the kernel, not the JIT
+KERNELS = (batch_kernel._compile(), False) if batch_kernel.available() else (False,)
+
+def _columns(param_sets, order):
+    """Flatten dicts into (values, groups) columns, emitting groups in the given order."""
+    values, groups = [], []
+    for i in order:
+        for v in param_sets[i].values():
+            values.append(v)
+            groups.append(i)
+    return values, groups
+
+def _row(batch, i):
+    """Rebuild the estimate() dict for row i of a batch result."""
+    if batch["error"][i]:
+        return {"error": "No parameters provided"}
+    return {
+        "base_estimate": int(batch["base_estimate"][i]),
+        "overhead": float(batch["overhead"][i]),
+        "total": float(batch["total"][i]),
+        "parameter_count": int(batch["parameter_count"][i])
+    }
+
+@given(st.lists(st.dictionaries(keys=st.text(min_size=1, max_size=15),
+                                values=st.integers(min_value=0, max_value=100)), max_size=20),
+       st.randoms())
+def test_batch_equivalence(param_sets, rnd):
+    order = list(range(len(param_sets)))
+    rnd.shuffle(order)
+    values, groups = _columns(param_sets, order)
+    # Once as installed (compiled if numba is present), once on the NumPy fallback
+    for kernel in KERNELS:
+        with mock.patch.object(batch_kernel, "_kernel", kernel):
+            for scalar, batch in ((old, old_batch), (new, new_batch)):
+                result = batch(values, groups, num_groups=len(param_sets))
+                for i, params in enumerate(param_sets):
+                    assert _row(result, i) == scalar(params)
+
+def test_batch_rejects_out_of_range_groups():
+    for kernel in KERNELS:
+        with mock.patch.object(batch_kernel, "_kernel", kernel):
+            for batch in (old_batch, new_batch):
+                for groups in ([0, 2], [0, -1]):
+                    with pytest.raises(ValueError):
+                        batch([1, 2], groups, num_groups=2)
+
+runner = importlib.import_module('equivalence_runner')
+
+def test_sharded_runner():
+    report = runner.run(20_000, workers=2, shard_size=5_000)
+    assert report.examples == 20_000
+    assert report.failures == []
+
+def test_structural_compare_matches_json():
+    assert runner.equivalent({"total": 1, "n": [1, 2]}, {"n": [1, 2], "total": 1})
+    assert not runner.equivalent({"total": 1}, {"total": 1.0})
+    assert not runner.equivalent({"total": 1}, {"total": 1, "extra": None})